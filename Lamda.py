@@ -14,8 +14,11 @@ import base64
 import boto3
 import pymssql  # For database connection
 
+from log_governor import debug_sampled, install_log_governor, summarize
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
+install_log_governor(logger)
 
 # Initialize AWS clients
 s3_client = boto3.client('s3')
@@ -45,7 +48,7 @@ def call_http_api(url, headers=None, json_data=None):
         if json_data:
             # Convert the JSON data to bytes
             data = json.dumps(json_data).encode('utf-8')
-            logger.info(f'data: {data}')
+            logger.info('data: %s', summarize(data))
             logger.info('Calling POST API')
             # Create a POST request
             request = urllib.request.Request(url, data=data, headers=headers or {}, method='POST')
@@ -63,7 +66,7 @@ def call_http_api(url, headers=None, json_data=None):
             try:
                 logger.info('call_http_api ended')
                 parsed_data = json.loads(response_data)
-                logger.info(f'parsed_data: {parsed_data}')
+                logger.info('parsed_data: %s', summarize(parsed_data))
 
                 return parsed_data
             except json.JSONDecodeError:
@@ -86,7 +89,7 @@ def retrieve_file_meta_data_using_api(bucket_name, object_key, file_name, prompt
     encoded_file_path = quote(f"{object_key}")
     # Define the API endpoint
     api_url = " https://gmls40yk6c.execute-api.us-west-2.amazonaws.com/PROD/extractFileMetaDataWithPrompt"
-    logger.info(f'Calling API: {api_url} path: {encoded_file_path}, bucket: {bucket_name}, prompt : {prompt}')
+    logger.info('Calling API: %s path: %s, bucket: %s, prompt : %s', api_url, encoded_file_path, bucket_name, summarize(prompt))
 
     # Create the JSON data for the POST request
     json_data = {
@@ -98,14 +101,14 @@ def retrieve_file_meta_data_using_api(bucket_name, object_key, file_name, prompt
     # Serialize the dictionary to JSON string
     # json_data = json.dumps(request_body_data).encode('utf-8')
 
-    logger.info(f'json_data: {json_data}')
+    logger.info('json_data: %s', summarize(json_data))
     headers = {
         'Content-Type': 'application/json'  # Ensure headers specify JSON content if needed by API
     }
 
     # Call API with POST request
     response_data = call_http_api(api_url, headers=headers, json_data=json_data)
-    logger.info(f'API response_data: {response_data}')
+    logger.info('API response_data: %s', summarize(response_data))
 
     # Determine which JSON config file to use based on the file name
     # config_mapping = {
@@ -227,7 +230,12 @@ def create_combined_prompt(png_images, received_prompt):
         ]
     }
 
-    logger.info(f"prompt: {prompt}")
+    # Page images are base64 in the prompt; only their count and the text part are logged
+    logger.info(
+        "prompt: %d page images (%d base64 chars), text: %s",
+        len(combined_images), sum(len(img["source"]["data"]) for img in combined_images),
+        summarize(combined_prompt_text)
+    )
 
     logger.info("Finished create_combined_prompt method")
     return prompt
@@ -246,13 +254,13 @@ def send_combined_prompt_to_bedrock(prompt):
     # Parse and return the response
     response_body = response['body'].read().decode('utf-8')
 
-    logger.info(f"Raw response_body : {response_body}")
+    logger.info("Raw response_body (%d chars): %s", len(response_body), summarize(response_body))
 
     # Load the JSON to parse and handle the text field
     response_data = json.loads(response_body)
     # Update the "text" field to clean up escape characters
     response_data["content"][0]["text"] = json.loads(response_data["content"][0]["text"])
-    logger.info(f"response_data : {response_data}")
+    debug_sampled(logger, "response_data : %s", summarize(response_data))
 
     logger.info("Finished send_combined_prompt_to_bedrock method")
     return response_data
@@ -262,7 +270,7 @@ def process_file_with_prompt(pdf_data, prompt):
     png_images = convert_pdf_to_png(pdf_data)
     prompts = create_combined_prompt(png_images, prompt)
     responses = send_combined_prompt_to_bedrock(prompts)
-    logger.info("Extracted JSON output: %s", json.dumps(responses, indent=2))
+    logger.info("Extracted JSON output: %s", summarize(responses))
     logger.info("Finished process_file_with_prompt method")
 
     response_dict = dict()
@@ -1,21 +1,22 @@
-import boto3
 import urllib.parse
 import os
-import json
-import openpyxl
-import pandas as pd
 from io import BytesIO
 import logging
-from botocore.config import Config
+from agent_calls import call_agent_with_retries, deadline_from_context
+from agent_stream import AgentJsonStream, iter_completion_text
+from aws_clients import LazyClient
+from log_governor import debug_sampled, install_log_governor, summarize
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
+install_log_governor(logger)
 
-s3 = boto3.client('s3')
-bedrock_agent_runtime = boto3.client(
+# boto3 and pandas are imported on first use to keep the Lambda init phase light
+s3 = LazyClient('s3')
+bedrock_agent_runtime = LazyClient(
     'bedrock-agent-runtime',
     region_name="us-west-2",  # change as per your region
-    config=Config(connect_timeout=10, read_timeout=120)
+    config={"connect_timeout": 10, "read_timeout": 120, "retries": {"total_max_attempts": 1}}
 )
 
 AGENT_ID = "QDTSICEWAF"          # Your agent id here
@@ -33,6 +34,8 @@ AGENT_PROMPT = (
 
 def load_file_once(file_bytes, file_extension):
     """Read file fully once and return DataFrame + headers"""
+    import pandas as pd
+
     try:
         if file_extension == '.csv':
             df = pd.read_csv(BytesIO(file_bytes))
@@ -42,7 +45,7 @@ def load_file_once(file_bytes, file_extension):
             raise ValueError(f"Unsupported file type: {file_extension}")
 
         headers = list(df.columns)
-        logger.info(f"Extracted headers: {headers}")
+        logger.info("Extracted %d headers: %s", len(headers), summarize(headers))
         logger.info(f"Input data loaded into DataFrame with shape {df.shape}")
         return df, headers
     except Exception as e:
@@ -50,36 +53,42 @@ def load_file_once(file_bytes, file_extension):
         raise
 
 
-def invoke_agent(headers_csv, template_name):
-    """Call the Bedrock agent with prompt and inputs."""
+def invoke_agent(headers_csv, template_name, deadline=None):
+    """Call the Bedrock agent with prompt and inputs, retrying throttles until the deadline."""
     session_id = f"mapping-{template_name}"
     prompt = AGENT_PROMPT
     payload = f"Template: {template_name}\nInput headers: {headers_csv}\n\n{prompt}"
 
-    logger.info(f"Invoking agent with payload:\n{payload}")
+    logger.info("Invoking agent with payload: %s", summarize(payload))
+    debug_sampled(logger, "Full agent payload: %s", summarize(payload))
+
+    def invoke_once(attempt_session_id):
+        params = {
+            "agentId": AGENT_ID,
+            "agentAliasId": AGENT_ALIAS_ID,
+            "sessionId": attempt_session_id,
+            "inputText": payload
+        }
 
-    params = {
-        "agentId": AGENT_ID,
-        "agentAliasId": AGENT_ALIAS_ID,
-        "sessionId": session_id,
-        "inputText": payload
-    }
+        response = bedrock_agent_runtime.invoke_agent(**params)
+        chunks = []
+        json_stream = AgentJsonStream(expected_type=list, item_type=dict)
+        for text in iter_completion_text(response):
+            chunks.append(text)
+            json_stream.feed(text)
+        return "".join(chunks), json_stream
 
-    response = bedrock_agent_runtime.invoke_agent(**params)
-    full_output = ""
-    for event in response.get("completion", []):
-        if "chunk" in event and "bytes" in event["chunk"]:
-            full_output += event["chunk"]["bytes"].decode("utf-8")
+    full_output, json_stream = call_agent_with_retries(invoke_once, session_id, deadline)
 
-    logger.info(f"Received raw agent response: {full_output}")
+    logger.info("Received raw agent response (%d chars): %s", len(full_output), summarize(full_output))
 
     try:
-        mappings = json.loads(full_output)
+        mappings = json_stream.finish()
         logger.info(f"Parsed agent mappings JSON with {len(mappings)} entries")
         return mappings
     except Exception as e:
         logger.error(f"Error parsing agent output: {e}")
-        logger.error(f"Raw output: {full_output}")
+        logger.error("Raw output: %s", summarize(full_output))
         raise
 
 
@@ -89,10 +98,12 @@ def create_output_excel(mappings, input_data_df):
     """
     Create a new Excel in memory with mapped headers using pandas (faster).
     """
+    import pandas as pd
+
     mapped_headers = [m['mappedheader'] for m in mappings]
     input_headers_map = {m['mappedheader']: m['inputheader'] for m in mappings}
 
-    logger.info(f"Creating output Excel with columns: {mapped_headers}")
+    logger.info("Creating output Excel with %d columns: %s", len(mapped_headers), summarize(mapped_headers))
 
     # Build DataFrame with mapped headers
     df_out = pd.DataFrame()
@@ -113,6 +124,7 @@ def create_output_excel(mappings, input_data_df):
 
 
 def lambda_handler(event, context):
+    deadline = deadline_from_context(context)
     try:
         record = event['Records'][0]
         bucket = record['s3']['bucket']['name']
@@ -149,9 +161,9 @@ def lambda_handler(event, context):
         template_name = HARD_CODED_TEMPLATE
 
         # Invoke agent
-        mappings = invoke_agent(headers_csv, template_name)
+        mappings = invoke_agent(headers_csv, template_name, deadline)
 
-        logger.info(f"Agent mappings: {mappings}")
+        logger.info("Agent mappings: %s", summarize(mappings))
 
         # Read full input data into DataFrame
         # Create output excel as BytesIO stream
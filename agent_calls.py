@@ -0,0 +1,188 @@
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+AGENT_MAX_ATTEMPTS = max(int(os.environ.get("AGENT_MAX_ATTEMPTS", 4)), 1)
+AGENT_BACKOFF_BASE_SECONDS = float(os.environ.get("AGENT_BACKOFF_BASE_SECONDS", 0.5))
+AGENT_BACKOFF_MAX_SECONDS = float(os.environ.get("AGENT_BACKOFF_MAX_SECONDS", 8))
+
+# Hedging: send a duplicate request when the first one is slower than the threshold.
+# AGENT_HEDGE_AFTER_SECONDS > 0 fixes the threshold, otherwise the p95 of recent call
+# latencies in this container is used once AGENT_HEDGE_MIN_SAMPLES calls have completed.
+AGENT_HEDGING = os.environ.get("AGENT_HEDGING", "false").lower() == "true"
+AGENT_HEDGE_AFTER_SECONDS = float(os.environ.get("AGENT_HEDGE_AFTER_SECONDS", 0))
+AGENT_HEDGE_MIN_SAMPLES = int(os.environ.get("AGENT_HEDGE_MIN_SAMPLES", 20))
+
+# Time kept back from the Lambda timeout so a late agent call still ends in a reported failure
+AGENT_DEADLINE_MARGIN_MS = int(os.environ.get("AGENT_DEADLINE_MARGIN_MS", 5000))
+
+RETRYABLE_ERROR_CODES = {
+    "throttlingexception", "throttling", "toomanyrequestsexception",
+    "serviceunavailableexception", "internalserverexception", "badgatewayexception",
+}
+RETRYABLE_EXCEPTION_NAMES = {
+    "ReadTimeoutError", "ConnectTimeoutError", "EndpointConnectionError", "ConnectionClosedError",
+}
+
+# Latencies (seconds) of successful calls in this warm container, for the p95 hedge threshold
+_latencies = deque(maxlen=200)
+_latencies_lock = threading.Lock()
+
+
+class AgentDeadlineExceeded(TimeoutError):
+    """The agent did not answer before the invocation deadline."""
+
+
+# -------------------------------
+# Deadline
+# -------------------------------
+def deadline_from_context(context, margin_ms=AGENT_DEADLINE_MARGIN_MS):
+    """Absolute time.monotonic() deadline from the Lambda context, or None without a context."""
+    if context is None or not hasattr(context, "get_remaining_time_in_millis"):
+        return None
+    return time.monotonic() + max(context.get_remaining_time_in_millis() - margin_ms, 0) / 1000
+
+
+def remaining_seconds(deadline):
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+# -------------------------------
+# Error classification and backoff
+# -------------------------------
+def error_code(error):
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        return str(response.get("Error", {}).get("Code", ""))
+    return ""
+
+
+def is_retryable_error(error):
+    """Throttles, 5xx service errors and connection/read timeouts are retried; anything else is not."""
+    if error_code(error).lower() in RETRYABLE_ERROR_CODES:
+        return True
+    return type(error).__name__ in RETRYABLE_EXCEPTION_NAMES
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the retry after the given (0-based) attempt."""
+    return random.uniform(0, min(AGENT_BACKOFF_MAX_SECONDS, AGENT_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+# -------------------------------
+# Hedge threshold
+# -------------------------------
+def record_latency(seconds):
+    with _latencies_lock:
+        _latencies.append(seconds)
+
+
+def hedge_threshold():
+    """Seconds after which a duplicate request is sent, or None when hedging is off or not yet calibrated."""
+    if not AGENT_HEDGING:
+        return None
+    if AGENT_HEDGE_AFTER_SECONDS > 0:
+        return AGENT_HEDGE_AFTER_SECONDS
+    with _latencies_lock:
+        samples = sorted(_latencies)
+    if len(samples) < AGENT_HEDGE_MIN_SAMPLES:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+# -------------------------------
+# Bounded, hedged, retried call
+# -------------------------------
+def _run_attempt(call, next_session_id, deadline):
+    """
+    Run one attempt of call(session_id), with a hedged duplicate if it passes the hedge threshold.
+    The first successful response wins; an error is raised only once every request has failed.
+    Requests still running when this returns are abandoned, not cancelled.
+    """
+    threshold = hedge_threshold()
+    if threshold is None and deadline is None:
+        started = time.monotonic()
+        result = call(next_session_id())
+        record_latency(time.monotonic() - started)
+        return result
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        started = {executor.submit(call, next_session_id()): time.monotonic()}
+        first_started = min(started.values())
+        hedged = threshold is None
+        error = None
+        while started:
+            timeout = remaining_seconds(deadline)
+            if not hedged:
+                until_hedge = threshold - (time.monotonic() - first_started)
+                timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+            done, _ = wait(list(started), timeout=None if timeout is None else max(timeout, 0),
+                           return_when=FIRST_COMPLETED)
+
+            for future in done:
+                request_started = started.pop(future)
+                if future.exception() is None:
+                    record_latency(time.monotonic() - request_started)
+                    return future.result()
+                error = error or future.exception()
+            if not started:
+                break
+
+            if not hedged and time.monotonic() - first_started >= threshold:
+                logger.info(f"[INFO] Agent call slower than {threshold:.2f}s, sending hedged request")
+                started[executor.submit(call, next_session_id())] = time.monotonic()
+                hedged = True
+            elif deadline is not None and remaining_seconds(deadline) <= 0:
+                raise AgentDeadlineExceeded("Agent call did not complete before the invocation deadline")
+        raise error
+    finally:
+        executor.shutdown(wait=False)
+
+
+def call_agent_with_retries(call, session_id, deadline=None, description="Agent call"):
+    """
+    Call call(session_id) with retries on throttling and transient errors, full-jitter
+    exponential backoff, optional hedging and an absolute deadline (see deadline_from_context).
+    The first request uses session_id; retries and hedged duplicates use derived session ids
+    so concurrent requests never share an agent session.
+    Raises AgentDeadlineExceeded when the deadline leaves no time for a response.
+    """
+    session_count = itertools.count()
+    session_lock = threading.Lock()
+
+    def next_session_id():
+        with session_lock:
+            n = next(session_count)
+        return session_id if n == 0 else f"{session_id}-r{n}"
+
+    for attempt in range(AGENT_MAX_ATTEMPTS):
+        remaining = remaining_seconds(deadline)
+        if remaining is not None and remaining <= 0:
+            raise AgentDeadlineExceeded(f"{description}: no time left before the invocation deadline")
+        try:
+            return _run_attempt(call, next_session_id, deadline)
+        except AgentDeadlineExceeded:
+            raise
+        except Exception as e:
+            if not is_retryable_error(e) or attempt == AGENT_MAX_ATTEMPTS - 1:
+                raise
+            delay = backoff_delay(attempt)
+            remaining = remaining_seconds(deadline)
+            if remaining is not None and delay >= remaining:
+                raise AgentDeadlineExceeded(f"{description}: no time left to retry after {e}") from e
+            logger.info(
+                f"[INFO] {description} failed ({error_code(e) or type(e).__name__}), "
+                f"retrying in {delay:.2f}s (attempt {attempt + 2}/{AGENT_MAX_ATTEMPTS})"
+            )
+            time.sleep(delay)
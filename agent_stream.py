@@ -0,0 +1,106 @@
+import codecs
+import json
+import logging
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def iter_completion_text(response):
+    """Yield decoded text from an invoke_agent completion stream as chunks arrive."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for event in response.get("completion", []):
+        if "chunk" in event and "bytes" in event["chunk"]:
+            text = decoder.decode(event["chunk"]["bytes"])
+            if text:
+                yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+class AgentJsonStream:
+    """
+    Incremental extractor for the JSON an agent returns, fed chunk by chunk.
+
+    Text outside JSON (leading prose, ```json fences, trailing notes) is skipped. The first
+    top-level object or array that parses, is an instance of expected_type and, for arrays,
+    holds only item_type elements becomes the result; other values (e.g. the "[1]" of
+    "see [1] below") are skipped like prose. Only the bracket depth is tracked while chunks
+    arrive; a candidate is parsed once, when its closing bracket is seen, and nothing is
+    handed out before the whole value is complete.
+    """
+
+    def __init__(self, expected_type=None, item_type=None):
+        self.expected_type = expected_type
+        self.item_type = item_type
+        self.result = None
+        self.done = False
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text):
+        """Consume a text chunk; the result is set once a complete, accepted value has been seen."""
+        if self.done:
+            return
+        self._buf += text
+        while self._pos < len(self._buf) and not self.done:
+            ch = self._buf[self._pos]
+            if self._depth == 0:
+                if ch in "[{":
+                    # Start of a top-level candidate: drop everything before it
+                    self._buf = self._buf[self._pos:]
+                    self._pos = 0
+                    self._depth = 1
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                self._depth += 1
+            elif ch in "]}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._close_candidate()
+            self._pos += 1
+
+    def _close_candidate(self):
+        value = self._try_parse(self._buf[:self._pos + 1])
+        if value is not None and self._accepts(value):
+            self.result = value
+            self.done = True
+            return
+        # Not JSON after all (e.g. "[note]" in prose) or not the expected value: keep scanning after it
+        self._buf = self._buf[self._pos + 1:]
+        self._pos = -1
+
+    def _accepts(self, value):
+        if self.expected_type is not None and not isinstance(value, self.expected_type):
+            return False
+        if self.item_type is not None and isinstance(value, list):
+            return all(isinstance(item, self.item_type) for item in value)
+        return True
+
+    @staticmethod
+    def _try_parse(text):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return None
+
+    def finish(self):
+        """Return the parsed result; raises ValueError when the output held no complete JSON."""
+        if not self.done:
+            raise ValueError("No complete JSON found in agent output")
+        return self.result
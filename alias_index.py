@@ -0,0 +1,226 @@
+import csv
+import logging
+import os
+import re
+
+from log_governor import summarize
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+ALIAS_CSV_PATH = os.environ.get(
+    "ALIAS_CSV_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "Agent File Input Headers.csv")
+)
+
+# Standardized headers from 'Output Field Specification' (column 'Field Name'), in spec order
+OUTPUT_FIELD_SPECIFICATION = [
+    "recordType", "dealerCode", "dealerName", "productCode", "coverageCode", "coverageDescription",
+    "productType", "formNumber", "saleDate", "expirationDate", "term", "vin", "make", "model", "year",
+    "trim", "vehicleClass", "vehicleType", "financeType", "odometer", "miles", "expirationMiles",
+    "deductible", "inServiceDate", "financeAmount", "isAfterSale", "vehiclePurchaseDate",
+    "vehiclePurchasePrice", "paymentTypeCode", "customerLastName", "customerFirstName",
+    "customerAddress1", "customerAddress2", "customerCity", "customerState", "customerCountryCode",
+    "customerZip", "customerWorkNumber", "customerHomeNumber", "customerEmail", "cobuyerLastName",
+    "cobuyerFirstName", "cobuyerAddress", "cobuyerCity", "cobuyerState", "cobuyerCountryCode",
+    "cobuyerZip", "cobuyerPhoneNumber", "cobuyerEmail", "lienholder", "lienholderAddress",
+    "lienholderCity", "lienholderState", "lienholderCountryCode", "lienholderZip",
+    "cancelEffectiveDate", "invoiceDate", "cancelPayee", "customerCost", "dealerCost", "currencyCode",
+    "isBusiness",
+]
+
+EXACT_MATCH_SCORE = 100
+FUZZY_MATCH_SCORE = 80
+
+# Warm-container cache: (csv_path, template) -> alias index
+_ALIAS_INDEX_CACHE = {}
+
+
+# -------------------------------
+# Header normalization
+# -------------------------------
+def normalize_header(header):
+    """
+    Normalize a header for alias matching: split camelCase, lowercase,
+    replace punctuation with spaces and collapse whitespace.
+    'customerLastName' -> 'customer last name', 'Dealer_No' -> 'dealer no'
+    """
+    text = str(header).strip()
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    text = re.sub(r"([A-Z]+)([A-Z][a-z])", r"\1 \2", text)
+    text = re.sub(r"[^0-9a-zA-Z]+", " ", text)
+    return " ".join(text.lower().split())
+
+
+def header_key(header):
+    """Lookup key for a header: normalized tokens joined without separators ('Last Name' == 'LastName')."""
+    return normalize_header(header).replace(" ", "")
+
+
+def split_alias_cell(cell):
+    """Alias cells hold comma-separated values; each one is a distinct alias."""
+    if not cell:
+        return []
+    return [alias.strip() for alias in str(cell).split(",") if alias.strip()]
+
+
+# -------------------------------
+# Alias index
+# -------------------------------
+def build_alias_index(alias_cells, spec_fields=None):
+    """
+    Build an alias index from the alias cells of one template column.
+    The standardized header of a cell is the alias that is also a 'Field Name' in the
+    Output Field Specification; cells without such an alias are skipped.
+    Normalized keys that point at more than one standardized header are marked
+    ambiguous (None) so they are left to the agent.
+    """
+    spec_fields = spec_fields or OUTPUT_FIELD_SPECIFICATION
+    spec_by_key = {header_key(f): f for f in spec_fields}
+
+    exact = {}
+    normalized = {}
+    for cell in alias_cells:
+        aliases = split_alias_cell(cell)
+        mapped_header = next(
+            (spec_by_key[header_key(a)] for a in reversed(aliases) if header_key(a) in spec_by_key),
+            None
+        )
+        if not mapped_header:
+            continue
+
+        for alias in aliases:
+            if exact.get(alias, mapped_header) != mapped_header:
+                exact[alias] = None
+            else:
+                exact[alias] = mapped_header
+
+            key = header_key(alias)
+            if not key:
+                continue
+            if normalized.get(key, mapped_header) != mapped_header:
+                normalized[key] = None
+            else:
+                normalized[key] = mapped_header
+
+    return {"exact": exact, "normalized": normalized}
+
+
+def row_spec_field(row, col_idx, spec_by_key):
+    """
+    The standardized header a row of the alias CSV stands for: a 'Field Name' among the aliases
+    of the template's own cell, else among the other cells of the row (None if there is none).
+    """
+    for cell in [row[col_idx]] + row[::-1]:
+        for alias in reversed(split_alias_cell(cell)):
+            if header_key(alias) in spec_by_key:
+                return spec_by_key[header_key(alias)]
+    return None
+
+
+def read_alias_cells(template_name, csv_path=ALIAS_CSV_PATH, spec_fields=None):
+    """
+    The alias cells of a template column of the alias CSV ([] if the file or column is missing).
+    The CSV is row-aligned: a row lists one spec field's aliases per template, and often only
+    one column names the field ('Dealer #' next to '..., dealerCode'). Each non-empty cell is
+    returned as "<cell>, <field>" so build_alias_index indexes it under its row's field.
+    """
+    if not os.path.exists(csv_path):
+        logger.info(f"[INFO] Alias file not found: {csv_path}")
+        return []
+    spec_by_key = {header_key(f): f for f in spec_fields or OUTPUT_FIELD_SPECIFICATION}
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        columns = [c.strip() for c in next(reader, [])]
+        if template_name not in columns:
+            logger.info(f"[INFO] Template {template_name} not found in alias file {csv_path}")
+            return []
+        col_idx = columns.index(template_name)
+        cells = []
+        for row in reader:
+            if col_idx >= len(row) or not row[col_idx].strip():
+                continue
+            field = row_spec_field(row, col_idx, spec_by_key)
+            cells.append(f"{row[col_idx]}, {field}" if field else row[col_idx])
+        return cells
+
+
+def list_alias_templates(csv_path=ALIAS_CSV_PATH):
+    """Template names of the alias CSV (its first row), in file order."""
+    if not os.path.exists(csv_path):
+        return []
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        return [c.strip() for c in next(csv.reader(f), []) if c.strip()]
+
+
+def load_alias_index(template_name, csv_path=ALIAS_CSV_PATH):
+    """Load (once per warm container) the alias index for a template column of the alias CSV."""
+    cache_key = (csv_path, template_name)
+    if cache_key in _ALIAS_INDEX_CACHE:
+        return _ALIAS_INDEX_CACHE[cache_key]
+
+    index = build_alias_index(read_alias_cells(template_name, csv_path))
+    logger.info(f"[INFO] Loaded {len(index['exact'])} aliases for template {template_name}")
+    _ALIAS_INDEX_CACHE[cache_key] = index
+    return index
+
+
+def match_header(header, index):
+    """Return (mappedHeader, confidenceScore) for an input header, or (None, 0) if unknown/ambiguous."""
+    header = str(header).strip()
+    mapped_header = index["exact"].get(header)
+    if mapped_header:
+        return mapped_header, EXACT_MATCH_SCORE
+    if header in index["exact"]:
+        return None, 0
+
+    mapped_header = index["normalized"].get(header_key(header))
+    if mapped_header:
+        return mapped_header, FUZZY_MATCH_SCORE
+    return None, 0
+
+
+def resolve_headers_locally(headers, headers_with_data, template_name, index=None, spec_fields=None, matcher=None):
+    """
+    Map input headers with the local alias index, producing the same records the agent
+    returns: every spec header in spec order, with placeholders (inputHeader "" and
+    confidenceScore 0) for spec headers that no input header maps to.
+
+    Returns (mappings, unresolved). mappings is None when any header with data could
+    not be resolved locally, in which case the agent has to be asked. With a matcher
+    (fuzzy_matcher.FuzzyHeaderMatcher) headers are matched by matcher.match instead of
+    match_header, so misspelled and abbreviated aliases resolve too.
+    """
+    index = index if index is not None else load_alias_index(template_name)
+    spec_fields = spec_fields or OUTPUT_FIELD_SPECIFICATION
+    data_set = set(headers_with_data)
+
+    best = {}  # mappedHeader -> (inputHeader, score)
+    unresolved = []
+    for header in headers:
+        mapped_header, score = matcher.match(header) if matcher is not None else match_header(header, index)
+        if not mapped_header:
+            if header in data_set:
+                unresolved.append(header)
+            continue
+
+        current = best.get(mapped_header)
+        if current is None or score > current[1]:
+            if current is not None and current[0] in data_set:
+                unresolved.append(current[0])
+            best[mapped_header] = (header, score)
+        elif header in data_set:
+            # A stronger header already owns this spec field; let the agent decide
+            unresolved.append(header)
+
+    if unresolved:
+        logger.info("[INFO] %d headers not resolved by local alias index: %s", len(unresolved), summarize(unresolved))
+        return None, unresolved
+
+    # Every header with data is mapped at this point, so no extras follow the spec headers
+    mappings = []
+    for field in spec_fields:
+        input_header, score = best.get(field, ("", 0))
+        mappings.append({"inputHeader": input_header, "mappedHeader": field, "confidenceScore": score})
+
+    return mappings, []
@@ -0,0 +1,60 @@
+import os
+import threading
+
+# "aws" creates boto3 clients; "local" uses the in-process fakes from local_clients.py
+# (filesystem-backed S3 under LOCAL_S3_ROOT and an agent answering from the alias CSV)
+CLIENT_BACKEND = os.environ.get("CLIENT_BACKEND", "aws")
+
+# service name -> factory(**client_kwargs), overriding CLIENT_BACKEND for that service
+_client_factories = {}
+
+
+def register_client_factory(service_name, factory):
+    """Route LazyClients of service_name to factory; clients already created must be reset()."""
+    _client_factories[service_name] = factory
+
+
+def create_client(service_name, config=None, **client_kwargs):
+    factory = _client_factories.get(service_name)
+    if factory is None and CLIENT_BACKEND == "local":
+        from local_clients import LOCAL_CLIENT_FACTORIES
+        factory = LOCAL_CLIENT_FACTORIES[service_name]
+    if factory is not None:
+        return factory(**client_kwargs)
+
+    import boto3
+    if config:
+        from botocore.config import Config
+        client_kwargs["config"] = Config(**config)
+    return boto3.client(service_name, **client_kwargs)
+
+
+class LazyClient:
+    """
+    Stand-in for a boto3 client that imports boto3 and creates the client on first use,
+    keeping boto3/botocore out of the Lambda init phase and off early-rejection paths.
+    Which client is created follows CLIENT_BACKEND and register_client_factory().
+    Safe to share between worker threads.
+    """
+
+    def __init__(self, service_name, config=None, **client_kwargs):
+        self._service_name = service_name
+        self._config = config
+        self._client_kwargs = client_kwargs
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = create_client(self._service_name, self._config, **dict(self._client_kwargs))
+        return self._client
+
+    def reset(self):
+        """Drop the created client; the next call creates one again (e.g. after switching backend)."""
+        with self._lock:
+            self._client = None
+
+    def __getattr__(self, name):
+        return getattr(self.get_client(), name)
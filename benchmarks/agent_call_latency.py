@@ -0,0 +1,177 @@
+"""
+Latency and failure-handling checks for invoke_agent against a local fake agent that
+injects delays and throttles (no AWS access needed).
+
+    python benchmarks/agent_call_latency.py
+    python benchmarks/agent_call_latency.py --calls 200 --slow-rate 0.01
+
+Scenarios: throttles retried with backoff, non-retryable errors raised at once, a slow
+first request overtaken by a hedged duplicate, and a hung agent stopped by the deadline.
+The tail-latency run prints p50/p95/max with and without hedging. Exits 1 on a failed check.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+import agent_calls  # noqa: E402
+import completeworkingfinal as handler  # noqa: E402
+
+MAPPING_JSON = b'[{"inputHeader": "Dealer No", "mappedHeader": "dealerCode", "confidenceScore": 100}]'
+
+
+class FakeClientError(Exception):
+    """Carries a botocore-style error response, like botocore.exceptions.ClientError."""
+
+    def __init__(self, code):
+        super().__init__(f"An error occurred ({code}) when calling the InvokeAgent operation")
+        self.response = {"Error": {"Code": code, "Message": code}}
+
+
+class FakeAgent:
+    """
+    invoke_agent stand-in. Each request first takes the next entry of `script` (an error code
+    to raise or a delay in seconds), then falls back to `delay`, optionally with a `slow_rate`
+    chance of `slow_delay` instead.
+    """
+
+    def __init__(self, script=(), delay=0.01, slow_rate=0.0, slow_delay=1.0, seed=7):
+        self.script = list(script)
+        self.delay = delay
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.random = random.Random(seed)
+        self.session_ids = []
+        self.lock = threading.Lock()
+
+    def invoke_agent(self, **params):
+        with self.lock:
+            self.session_ids.append(params["sessionId"])
+            step = self.script.pop(0) if self.script else None
+            slow = self.random.random() < self.slow_rate
+        if isinstance(step, str):
+            raise FakeClientError(step)
+        time.sleep(step if step is not None else (self.slow_delay if slow else self.delay))
+        return {"completion": [{"chunk": {"bytes": MAPPING_JSON[i:i + 16]}} for i in range(0, len(MAPPING_JSON), 16)]}
+
+
+def configure(hedging=False, hedge_after=0.0, max_attempts=4):
+    agent_calls.AGENT_HEDGING = hedging
+    agent_calls.AGENT_HEDGE_AFTER_SECONDS = hedge_after
+    agent_calls.AGENT_MAX_ATTEMPTS = max_attempts
+    agent_calls.AGENT_BACKOFF_BASE_SECONDS = 0.01
+    agent_calls.AGENT_BACKOFF_MAX_SECONDS = 0.05
+    agent_calls._latencies.clear()
+
+
+def run_call(agent, deadline_seconds=None):
+    handler.bedrock_agent_runtime = agent
+    deadline = None if deadline_seconds is None else time.monotonic() + deadline_seconds
+    start = time.perf_counter()
+    try:
+        result = handler.invoke_agent("payload", "session", deadline=deadline)
+    except Exception as e:
+        result = e
+    return result, time.perf_counter() - start
+
+
+def check(name, condition, detail):
+    print(f"  [{'ok' if condition else 'FAIL'}] {name}: {detail}")
+    return condition
+
+
+def scenario_checks():
+    results = []
+
+    configure()
+    agent = FakeAgent(script=["throttlingException", "ThrottlingException"])
+    result, elapsed = run_call(agent)
+    results.append(check(
+        "throttles are retried", isinstance(result, list) and len(agent.session_ids) == 3,
+        f"{len(agent.session_ids)} requests, sessions {agent.session_ids}, {elapsed * 1000:.0f} ms"
+    ))
+
+    configure(max_attempts=2)
+    agent = FakeAgent(script=["ThrottlingException"] * 5)
+    result, _ = run_call(agent)
+    results.append(check(
+        "attempts are bounded", isinstance(result, FakeClientError) and len(agent.session_ids) == 2,
+        f"{len(agent.session_ids)} requests, raised {type(result).__name__}"
+    ))
+
+    configure()
+    agent = FakeAgent(script=["ValidationException"])
+    result, _ = run_call(agent)
+    results.append(check(
+        "non-retryable errors are raised", isinstance(result, FakeClientError) and len(agent.session_ids) == 1,
+        f"{len(agent.session_ids)} request(s), raised {type(result).__name__}"
+    ))
+
+    configure(hedging=True, hedge_after=0.1)
+    agent = FakeAgent(script=[2.0, 0.02])
+    result, elapsed = run_call(agent)
+    results.append(check(
+        "slow request is hedged", isinstance(result, list) and elapsed < 0.5 and len(agent.session_ids) == 2,
+        f"{elapsed * 1000:.0f} ms, sessions {agent.session_ids}"
+    ))
+
+    configure()
+    agent = FakeAgent(delay=5.0)
+    result, elapsed = run_call(agent, deadline_seconds=0.3)
+    results.append(check(
+        "deadline stops a hung call", isinstance(result, agent_calls.AgentDeadlineExceeded) and elapsed < 0.6,
+        f"{elapsed * 1000:.0f} ms, raised {type(result).__name__}"
+    ))
+
+    configure(max_attempts=10)
+    agent = FakeAgent(script=["ThrottlingException"] * 10)
+    agent_calls.AGENT_BACKOFF_BASE_SECONDS = agent_calls.AGENT_BACKOFF_MAX_SECONDS = 0.2
+    result, elapsed = run_call(agent, deadline_seconds=0.5)
+    results.append(check(
+        "backoff respects the deadline", isinstance(result, agent_calls.AgentDeadlineExceeded) and elapsed < 0.6,
+        f"{len(agent.session_ids)} requests in {elapsed * 1000:.0f} ms, raised {type(result).__name__}"
+    ))
+    return all(results)
+
+
+def tail_latency(calls, slow_rate, hedging):
+    configure(hedging=hedging)
+    agent_calls.AGENT_HEDGE_MIN_SAMPLES = 20
+    agent = FakeAgent(delay=0.02, slow_rate=slow_rate, slow_delay=0.5)
+    latencies = [run_call(agent)[1] for _ in range(calls)]
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "max": latencies[-1],
+        "requests": len(agent.session_ids),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    args = parser.parse_args()
+
+    print("Scenarios:")
+    passed = scenario_checks()
+
+    print(f"Tail latency over {args.calls} calls, {args.slow_rate:.0%} slow (500 ms) responses:")
+    for hedging in (False, True):
+        stats = tail_latency(args.calls, args.slow_rate, hedging)
+        print(
+            f"  hedging={'on ' if hedging else 'off'} p50={stats['p50'] * 1000:6.1f} ms "
+            f"p95={stats['p95'] * 1000:6.1f} ms max={stats['max'] * 1000:6.1f} ms requests={stats['requests']}"
+        )
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Compare the CSV parse engines of load_file_once (CSV_ENGINE "c" and "arrow") on wide and
+tall files: parse time and memory, each case in a fresh interpreter.
+
+    python benchmarks/bench_csv_engine.py
+    python benchmarks/bench_csv_engine.py --shapes 1000000x10 5000x500 --sparsity 0.5
+
+For every rows x columns shape the same synthetic CSV (bench_pipeline.make_frame) is parsed
+by both engines: the full parse, the header probe (nrows=PROBE_ROWS) and a parse of a
+quarter of the columns (usecols, as load_mapped_columns does). Prints wall time, RSS growth
+while parsing and the memory held by the resulting DataFrame, and checks that both engines
+return identical frames. Exits 1 when they differ.
+
+The synthetic files are rectangular. Ragged files (rows with another field count than the
+header) are read by the C parser under either setting: read_csv_arrow checks the rows of the
+first ARROW_RAGGED_SAMPLE_BYTES and hands such files over before parsing, but a ragged row
+further down is only found by the Arrow parse itself, which then fails and the file is
+parsed twice (Arrow, then C).
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+ENGINES = ["c", "arrow"]
+DEFAULT_SHAPES = ["200000x10", "1000000x10", "2000x500", "20000x500"]
+
+
+def run_case(engine, rows, columns, sparsity):
+    import logging
+
+    import pandas as pd
+
+    from bench_pipeline import make_frame, measure
+
+    logging.disable(logging.INFO)
+    os.environ["CSV_ENGINE"] = engine
+    import completeworkingfinal as handler
+
+    file_bytes = make_frame(rows, columns, sparsity).to_csv(index=False).encode("utf-8")
+    gc.collect()
+    stages = {}
+    df, _ = measure(stages, "full", handler.load_file_once, file_bytes, ".csv")
+    frame_mb = df.memory_usage(deep=True).sum() / 2 ** 20
+    digest = int(pd.util.hash_pandas_object(df, index=False).sum()) & 0xFFFFFFFF
+    columns_digest = hash(tuple(df.columns)) & 0xFFFFFFFF
+    del df
+    measure(stages, "probe", handler.load_file_once, file_bytes, ".csv", None, handler.PROBE_ROWS)
+    usecols = list(range(0, columns, 4))
+    measure(stages, "usecols", handler.load_file_once, file_bytes, ".csv", usecols)
+    return {
+        "input_mb": round(len(file_bytes) / 2 ** 20, 1),
+        "frame_mb": round(frame_mb, 1),
+        "digest": [digest, columns_digest],
+        "stages": stages,
+    }
+
+
+def run_case_subprocess(engine, rows, columns, sparsity):
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", json.dumps([engine, rows, columns, sparsity])],
+        cwd=REPO_DIR, capture_output=True, text=True, env={**os.environ, "PYTHONHASHSEED": "0"},
+    )
+    if completed.returncode != 0:
+        return {"error": (completed.stderr.strip().splitlines() or ["worker failed"])[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shapes", nargs="+", default=DEFAULT_SHAPES, help="rows x columns, e.g. 1000000x10")
+    parser.add_argument("--sparsity", type=float, default=0.0)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_case(*json.loads(args.worker))))
+        return
+
+    print(f"{'shape':>12} {'engine':>6} {'input':>8} {'frame':>8}  "
+          f"{'full ms':>8} {'full MB':>8} {'probe ms':>8} {'usecols ms':>10} {'usecols MB':>10}")
+    failures = []
+    for shape in args.shapes:
+        rows, columns = (int(n) for n in shape.lower().split("x"))
+        started = time.perf_counter()
+        results = {engine: run_case_subprocess(engine, rows, columns, args.sparsity) for engine in ENGINES}
+        for engine, result in results.items():
+            if "error" in result:
+                print(f"{shape:>12} {engine:>6} ERROR {result['error']}")
+                failures.append(f"{shape} {engine}: {result['error']}")
+                continue
+            stages = result["stages"]
+            print(f"{shape:>12} {engine:>6} {result['input_mb']:>6.1f}MB {result['frame_mb']:>6.1f}MB  "
+                  f"{stages['full']['seconds'] * 1000:>8.0f} {stages['full']['rss_growth_mb']:>8.1f} "
+                  f"{stages['probe']['seconds'] * 1000:>8.1f} {stages['usecols']['seconds'] * 1000:>10.0f} "
+                  f"{stages['usecols']['rss_growth_mb']:>10.1f}")
+        digests = {json.dumps(r.get("digest")) for r in results.values()}
+        if len(digests) != 1:
+            failures.append(f"{shape}: engines returned different frames")
+        print(f"{'':>12} ({time.perf_counter() - started:.1f}s incl. data generation)")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
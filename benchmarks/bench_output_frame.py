@@ -0,0 +1,93 @@
+"""
+Micro-benchmark for output assembly: column-by-column inserts (previous
+create_output_excel behaviour) vs the single-construction build_output_frame.
+
+    python benchmarks/bench_output_frame.py --rows 200000 --columns 150
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+from completeworkingfinal import build_output_frame  # noqa: E402
+
+
+def build_output_frame_inserts(mappings, input_data_df):
+    """Previous implementation: start empty and insert one column per mapping."""
+    df_out = pd.DataFrame(index=input_data_df.index)
+    seen_mapped = set()
+    for m in mappings:
+        input_header = m.get("inputHeader", "").strip()
+        mapped_header = m.get("mappedHeader", "").strip()
+        col_name = mapped_header if mapped_header else input_header
+        if not col_name or col_name in seen_mapped:
+            continue
+        seen_mapped.add(col_name)
+        if input_header in input_data_df.columns:
+            col_data = input_data_df[input_header]
+            if col_name == "customerCountryCode":
+                col_data = col_data.replace("", pd.NA).fillna("USA")
+            elif col_name == "currencyCode":
+                col_data = col_data.replace("", pd.NA).fillna("USD")
+            df_out[col_name] = col_data
+        else:
+            if col_name == "customerCountryCode":
+                df_out[col_name] = "USA"
+            elif col_name == "currencyCode":
+                df_out[col_name] = "USD"
+            else:
+                df_out[col_name] = ""
+    return df_out
+
+
+def make_case(rows, columns):
+    """Half the output columns come from the input, half are placeholders, plus both default columns."""
+    n_input = columns // 2
+    input_data_df = pd.DataFrame({
+        f"in_{i}": np.full(rows, f"v{i}", dtype=object) for i in range(n_input)
+    })
+    input_data_df["country"] = np.where(np.arange(rows) % 2, "", "CAN").astype(object)
+
+    mappings = [{"inputHeader": f"in_{i}", "mappedHeader": f"out_{i}", "confidenceScore": 100} for i in range(n_input)]
+    mappings += [{"inputHeader": "", "mappedHeader": f"placeholder_{i}", "confidenceScore": 0}
+                 for i in range(columns - n_input)]
+    mappings.append({"inputHeader": "country", "mappedHeader": "customerCountryCode", "confidenceScore": 100})
+    mappings.append({"inputHeader": "", "mappedHeader": "currencyCode", "confidenceScore": 0})
+    return mappings, input_data_df
+
+
+def time_call(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--columns", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    mappings, input_data_df = make_case(args.rows, args.columns)
+    old_time, old_df = time_call(build_output_frame_inserts, mappings, input_data_df, repeat=args.repeat)
+    new_time, new_df = time_call(build_output_frame, mappings, input_data_df, repeat=args.repeat)
+
+    pd.testing.assert_frame_equal(old_df.astype(object), new_df.astype(object), check_dtype=False)
+    print(f"rows={args.rows} columns={new_df.shape[1]}")
+    print(f"  column inserts:      {old_time * 1000:9.1f} ms")
+    print(f"  single construction: {new_time * 1000:9.1f} ms  ({old_time / new_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
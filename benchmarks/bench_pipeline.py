@@ -0,0 +1,343 @@
+"""
+Offline benchmark suite for the file-mapping pipeline, with the local S3 and agent stand-ins.
+
+    python benchmarks/bench_pipeline.py                       # quick matrix, compared to its baseline
+    python benchmarks/bench_pipeline.py --matrix full --max-cells 50000000
+    python benchmarks/bench_pipeline.py --save-baseline       # record the current numbers as the baseline
+    python benchmarks/bench_pipeline.py --rows 200000 --columns 150 --delimiter "|" --sparsity 0.5 --format csv
+
+Each case generates a synthetic feed (rows x columns, delimiter, sparsity, csv or xlsx) and
+times the pipeline stages in a fresh interpreter, so peak RSS of one case never leaks into
+the next: detect_file_delimiter, load_file_once, extract_headers_with_data,
+scan_headers_with_data, create_output_excel and the end-to-end lambda_handler.
+Sparsity is the share of columns that are entirely empty and of empty cells in the others.
+
+Results are JSON. With a baseline in benchmarks/baselines/ (written by --save-baseline) every
+stage is compared against it and the run exits 1 when a stage is slower or grows RSS by more
+than --tolerance (ignoring differences under --min-ms / --min-mb).
+"""
+import argparse
+import gc
+import io
+import itertools
+import json
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(REPO_DIR, "benchmarks", "baselines")
+
+MATRICES = {
+    "quick": {
+        "rows": [1000, 5000],
+        "columns": [10, 100],
+        "delimiters": [","],
+        "sparsity": [0.0, 0.9],
+        "formats": ["csv", "xlsx"],
+    },
+    "full": {
+        "rows": [1000, 100000, 1000000, 2000000],
+        "columns": [10, 100, 500],
+        "delimiters": [",", "\t", "|", ";", "~"],
+        "sparsity": [0.0, 0.5, 0.9],
+        "formats": ["csv", "xlsx"],
+    },
+}
+DELIMITER_NAMES = {",": "comma", "\t": "tab", "|": "pipe", ";": "semicolon", "~": "tilde"}
+
+BENCH_TEMPLATE = "A10"
+
+# Generating xlsx inputs is far slower than parsing them; larger xlsx cases are skipped
+MAX_XLSX_ROWS = 100000
+STAGE_LABELS = {
+    "detect_file_delimiter": "delim",
+    "load_file_once": "load",
+    "extract_headers_with_data": "hwd",
+    "scan_headers_with_data": "scan",
+    "create_output_excel": "excel",
+    "lambda_handler": "e2e",
+}
+
+
+# -------------------------------
+# Cases
+# -------------------------------
+def case_id(case):
+    delimiter = DELIMITER_NAMES[case["delimiter"]] if case["format"] == "csv" else "na"
+    return f"{case['format']}-r{case['rows']}-c{case['columns']}-{delimiter}-s{case['sparsity']}"
+
+
+def build_cases(matrix, max_cells):
+    cases, skipped = [], []
+    for fmt, rows, columns, sparsity in itertools.product(
+        matrix["formats"], matrix["rows"], matrix["columns"], matrix["sparsity"]
+    ):
+        delimiters = matrix["delimiters"] if fmt == "csv" else [","]
+        for delimiter in delimiters:
+            case = {"format": fmt, "rows": rows, "columns": columns, "delimiter": delimiter, "sparsity": sparsity}
+            if rows * columns > max_cells or (fmt == "xlsx" and rows > MAX_XLSX_ROWS):
+                skipped.append(case_id(case))
+            else:
+                cases.append(case)
+    return cases, skipped
+
+
+# -------------------------------
+# Worker side: synthetic data and stage measurement
+# -------------------------------
+def make_headers(columns):
+    """Spec field names first (resolved by the local alias index where the template knows them), then unknown ones."""
+    from alias_index import OUTPUT_FIELD_SPECIFICATION
+
+    headers = list(OUTPUT_FIELD_SPECIFICATION[:columns])
+    headers += [f"Extra Field {i}" for i in range(columns - len(headers))]
+    return headers
+
+
+def make_frame(rows, columns, sparsity, seed=11):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    headers = make_headers(columns)
+    n_empty_columns = int(round(columns * sparsity))
+    # Spread the empty columns over the file instead of bunching them at the end
+    empty_positions = set(np.linspace(0, columns - 1, n_empty_columns, dtype=int).tolist()) if n_empty_columns else set()
+    base = (np.arange(rows) % 997).astype(str).astype(object)
+
+    data = {}
+    for i, header in enumerate(headers):
+        if i in empty_positions:
+            data[header] = np.full(rows, "", dtype=object)
+            continue
+        values = f"v{i}x" + base
+        if sparsity:
+            values = np.where(rng.random(rows) < sparsity, "", values).astype(object)
+            values[rng.integers(rows)] = f"v{i}x0"  # at least one value, so the column has data
+        data[header] = values
+    return pd.DataFrame(data)
+
+
+def make_file(case):
+    df = make_frame(case["rows"], case["columns"], case["sparsity"])
+    if case["format"] == "xlsx":
+        buffer = io.BytesIO()
+        df.to_excel(buffer, index=False)
+        return buffer.getvalue(), ".xlsx"
+    return df.to_csv(index=False, sep=case["delimiter"]).encode("utf-8"), ".csv"
+
+
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RssSampler:
+    """Samples RSS on a background thread; peak is the highest value seen while running."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def measure(results, stage, func, *args):
+    gc.collect()
+    start_rss = current_rss()
+    with RssSampler() as sampler:
+        start = time.perf_counter()
+        value = func(*args)
+        seconds = time.perf_counter() - start
+    results[stage] = {
+        "seconds": round(seconds, 5),
+        "peak_rss_mb": round(sampler.peak / 2 ** 20, 1),
+        "rss_growth_mb": round(max(sampler.peak - start_rss, 0) / 2 ** 20, 1),
+    }
+    return value
+
+
+def run_case(case):
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+    os.environ["MAPPING_CACHE_LOCATION"] = ""
+    # The template folder routes the feed and the rule lets its name pass filename validation
+    os.environ["FILENAME_RULES"] = json.dumps({BENCH_TEMPLATE: ["feed.*"]})
+    sys.path.insert(0, REPO_DIR)
+    logging.disable(logging.INFO)
+
+    import completeworkingfinal as handler
+    from local_clients import LocalAgentClient, LocalS3Client
+    from mapping_reconciler import MappingReconciler
+    from output_writers import XLSX_MAX_DATA_ROWS
+
+    start = time.perf_counter()
+    file_bytes, ext = make_file(case)
+    info = {"input_bytes": len(file_bytes), "generate_seconds": round(time.perf_counter() - start, 3)}
+    stages = {}
+
+    if ext == ".csv":
+        measure(stages, "detect_file_delimiter", handler.detect_file_delimiter, file_bytes)
+    df, headers = measure(stages, "load_file_once", handler.load_file_once, file_bytes, ext)
+    headers_with_data = measure(stages, "extract_headers_with_data", handler.extract_headers_with_data, df, headers)
+    if ext == ".csv":
+        measure(stages, "scan_headers_with_data", handler.scan_headers_with_data, file_bytes, ext)
+
+    mappings, _ = MappingReconciler(headers, headers_with_data).reconcile([])
+    if case["rows"] <= XLSX_MAX_DATA_ROWS:
+        measure(stages, "create_output_excel", handler.create_output_excel, mappings, df)
+    del df
+    gc.collect()
+
+    local_s3 = LocalS3Client(tempfile.mkdtemp(prefix="bench-s3-"))
+    key = f"input/{BENCH_TEMPLATE}/feed{ext}"
+    local_s3.put_object(Bucket="bench", Key=key, Body=file_bytes)
+    del file_bytes
+    handler.s3 = local_s3
+    handler.bedrock_agent_runtime = LocalAgentClient()
+    handler.OUTPUT_FORMAT = "xlsx" if case["rows"] <= XLSX_MAX_DATA_ROWS else "csv"
+    event = {"Records": [{"s3": {"bucket": {"name": "bench"}, "object": {"key": key}}}]}
+    result = measure(stages, "lambda_handler", handler.lambda_handler, event, None)
+    if result["statusCode"] != 200:
+        raise RuntimeError(f"lambda_handler failed: {result}")
+    info["output_bytes"] = sum(obj["Size"] for obj in local_s3.list_objects_v2(Bucket="bench", Prefix="output/")["Contents"])
+    shutil.rmtree(local_s3.root, ignore_errors=True)
+    return {"case": case, "info": info, "stages": stages}
+
+
+# -------------------------------
+# Driver side: subprocess per case, baselines and regressions
+# -------------------------------
+def run_case_subprocess(case):
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", json.dumps(case)],
+        cwd=REPO_DIR, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        return {"case": case, "error": completed.stderr.strip().splitlines()[-1:] or ["worker failed"]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(result, baseline, tolerance, min_ms, min_mb):
+    """Return regression messages for one case against its baseline entry."""
+    regressions = []
+    for stage, current in result.get("stages", {}).items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous:
+            continue
+        slower = current["seconds"] - previous["seconds"]
+        if slower * 1000 > min_ms and current["seconds"] > previous["seconds"] * (1 + tolerance):
+            regressions.append(f"{stage}: {previous['seconds'] * 1000:.1f} -> {current['seconds'] * 1000:.1f} ms")
+        grown = current["rss_growth_mb"] - previous["rss_growth_mb"]
+        if grown > min_mb and current["rss_growth_mb"] > previous["rss_growth_mb"] * (1 + tolerance):
+            regressions.append(f"{stage}: RSS growth {previous['rss_growth_mb']} -> {current['rss_growth_mb']} MB")
+    return regressions
+
+
+def print_result(result):
+    name = case_id(result["case"])
+    if "error" in result:
+        print(f"{name:<34} ERROR {result['error']}")
+        return
+    cells = "  ".join(
+        f"{STAGE_LABELS[stage]} {values['seconds'] * 1000:8.1f}ms/{values['rss_growth_mb']:6.1f}MB"
+        for stage, values in result["stages"].items()
+    )
+    print(f"{name:<34} {cells}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--matrix", choices=sorted(MATRICES), default="quick")
+    parser.add_argument("--rows", type=int)
+    parser.add_argument("--columns", type=int)
+    parser.add_argument("--delimiter", default=",")
+    parser.add_argument("--sparsity", type=float, default=0.0)
+    parser.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+    parser.add_argument("--max-cells", type=int, default=100_000_000, help="skip cases with more rows x columns")
+    parser.add_argument("--baseline", help="baseline JSON (default: benchmarks/baselines/pipeline_<matrix>.json)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--output", help="also write this run's results to a JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-ms", type=float, default=20.0)
+    parser.add_argument("--min-mb", type=float, default=16.0)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_case(json.loads(args.worker))))
+        return
+
+    if args.rows:
+        cases, skipped = [{
+            "format": args.format, "rows": args.rows, "columns": args.columns or 50,
+            "delimiter": args.delimiter, "sparsity": args.sparsity
+        }], []
+        matrix_name = "custom"
+    else:
+        cases, skipped = build_cases(MATRICES[args.matrix], args.max_cells)
+        matrix_name = args.matrix
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f"pipeline_{matrix_name}.json")
+    baseline = {}
+    if os.path.exists(baseline_path) and not args.save_baseline:
+        with open(baseline_path) as f:
+            baseline = {entry["id"]: entry for entry in json.load(f)["results"]}
+
+    print(f"{len(cases)} cases ({len(skipped)} skipped over --max-cells or the xlsx row cap)")
+    print("per stage: wall time / RSS growth; " + ", ".join(f"{label}={stage}" for stage, label in STAGE_LABELS.items()))
+    results, regressions, failed = [], [], False
+    for case in cases:
+        result = run_case_subprocess(case)
+        result["id"] = case_id(case)
+        results.append(result)
+        print_result(result)
+        failed = failed or "error" in result
+        if result["id"] in baseline:
+            for message in compare(result, baseline[result["id"]], args.tolerance, args.min_ms, args.min_mb):
+                regressions.append(f"{result['id']} {message}")
+
+    report = {"matrix": matrix_name, "python": sys.version.split()[0], "skipped": skipped, "results": results}
+    targets = [args.output] if args.output else []
+    if args.save_baseline:
+        targets.append(baseline_path)
+    for path in targets:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"Results written to {path}")
+
+    if baseline:
+        print(f"{len(regressions)} regression(s) against {baseline_path}")
+        for message in regressions:
+            print(f"  REGRESSION {message}")
+    elif not args.save_baseline:
+        print(f"No baseline at {baseline_path}; run with --save-baseline to record one")
+    sys.exit(1 if regressions or failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Calibrate FUZZY_MATCH_THRESHOLD of fuzzy_matcher.py against the template alias lists,
+and time the matcher per header.
+
+    python benchmarks/calibrate_fuzzy.py
+    python benchmarks/calibrate_fuzzy.py --templates A8 A10 --max-wrong-rate 0.005
+
+Positives are misspelled or abbreviated variants of each alias (a dropped, doubled or
+swapped letter, a token cut to its first four letters) that exact and key matching miss;
+they should map to the alias's field. Negatives hold one field out at a time: its aliases
+are queried against an index without that field, so any match is a wrong field. For each
+threshold the script prints recall on positives and the wrong-field rate among accepted
+matches, and recommends the lowest threshold whose wrong-field rate stays within
+--max-wrong-rate. Timing uses a synthetic index of --timing-aliases aliases: each header is
+matched with the token similarity cache cleared, best of three runs to leave scheduler noise
+out. Exits 1 when no threshold qualifies or the p95 per header is not at least --margin
+(a share of the budget) under --budget-us, so a slower or busier machine still fits the budget.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from alias_index import header_key, match_header, normalize_header  # noqa: E402
+from fuzzy_matcher import (  # noqa: E402
+    FUZZY_AMBIGUITY_MARGIN, FUZZY_MATCH_THRESHOLD, FuzzyHeaderMatcher, _token_similarity,
+)
+
+THRESHOLDS = [round(0.70 + 0.02 * i, 2) for i in range(14)]
+TIMING_RUNS = 3
+
+
+def variants(alias, rng):
+    """Misspelled and abbreviated forms of an alias."""
+    text = normalize_header(alias)
+    out = set()
+    letters = [i for i, c in enumerate(text) if c.isalpha()]
+    if len(letters) >= 6:
+        i = rng.choice(letters[1:])
+        out.add(text[:i] + text[i + 1:])
+        i = rng.choice(letters[1:])
+        out.add(text[:i] + text[i] + text[i:])
+        i = rng.choice(letters[1:-1])
+        if text[i + 1].isalpha():
+            out.add(text[:i] + text[i + 1] + text[i] + text[i + 2:])
+    tokens = text.split()
+    long_tokens = [t for t in tokens if len(t) >= 7 and t.isalpha()]
+    if len(tokens) >= 2 and long_tokens:
+        token = rng.choice(long_tokens)
+        out.add(" ".join(t[:4] if t == token else t for t in tokens))
+    return [v.title() for v in out if v != text]
+
+
+def decide(matcher, header, threshold):
+    ranked = matcher.rank_fields(header, min_score=THRESHOLDS[0] - FUZZY_AMBIGUITY_MARGIN)
+    if not ranked:
+        return None
+    mapped_header, similarity = ranked[0]
+    if len(ranked) > 1 and ranked[1][1] >= similarity - FUZZY_AMBIGUITY_MARGIN:
+        return None
+    return mapped_header if similarity >= threshold else None
+
+
+def without_field(index, field):
+    return {
+        "exact": {a: f for a, f in index["exact"].items() if f != field},
+        "normalized": {k: f for k, f in index["normalized"].items() if f != field},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--templates", nargs="+")
+    parser.add_argument("--max-wrong-rate", type=float, default=0.01)
+    parser.add_argument("--timing-aliases", type=int, default=5000)
+    parser.add_argument("--budget-us", type=float, default=1000, help="p95 fuzzy match time per header")
+    parser.add_argument("--margin", type=float, default=0.3, help="share of the budget the p95 must stay under it")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    from spec_artifact import load_spec_artifact
+    from template_specs import get_compiled_spec
+
+    artifact = load_spec_artifact()
+    templates = args.templates or (list(artifact["templates"]) if artifact else ["A8"])
+    rng = random.Random(args.seed)
+    counts = {t: {"correct": 0, "wrong": 0, "positives": 0, "negatives_wrong": 0} for t in THRESHOLDS}
+    negatives = 0
+
+    for template_name in templates:
+        index = get_compiled_spec(template_name).alias_index
+        matcher = FuzzyHeaderMatcher(index)
+        fields = sorted({f for f in index["exact"].values() if f})
+        for alias, field in index["exact"].items():
+            if not field:
+                continue
+            for variant in variants(alias, rng):
+                if match_header(variant, index)[0] or header_key(variant) in index["normalized"]:
+                    continue
+                for threshold in THRESHOLDS:
+                    decided = decide(matcher, variant, threshold)
+                    counts[threshold]["positives"] += 1
+                    counts[threshold]["correct"] += decided == field
+                    counts[threshold]["wrong"] += decided is not None and decided != field
+        for field in fields:
+            held_out = FuzzyHeaderMatcher(without_field(index, field))
+            for alias in {a for a, f in index["exact"].items() if f == field}:
+                negatives += 1
+                for threshold in THRESHOLDS:
+                    counts[threshold]["negatives_wrong"] += decide(held_out, alias, threshold) is not None
+
+    print(f"templates: {', '.join(templates)}; positives per threshold: {counts[THRESHOLDS[0]]['positives']}, "
+          f"held-out negatives: {negatives}")
+    print(f"{'threshold':>9} {'recall':>7} {'wrong/accepted':>15} {'held-out matched':>17}")
+    recommended = None
+    for threshold in THRESHOLDS:
+        c = counts[threshold]
+        accepted = c["correct"] + c["wrong"] + c["negatives_wrong"]
+        wrong_rate = (c["wrong"] + c["negatives_wrong"]) / accepted if accepted else 0.0
+        recall = c["correct"] / c["positives"] if c["positives"] else 0.0
+        print(f"{threshold:>9.2f} {recall:>7.1%} {wrong_rate:>15.2%} {c['negatives_wrong']:>17}")
+        if recommended is None and wrong_rate <= args.max_wrong_rate:
+            recommended = threshold
+    print(f"recommended FUZZY_MATCH_THRESHOLD: {recommended} (current {FUZZY_MATCH_THRESHOLD})")
+
+    # Timing on a large synthetic index: words from every template's aliases, recombined
+    words = sorted({w for t in templates for a in get_compiled_spec(t).alias_index["exact"] for w in normalize_header(a).split()})
+    fields = [f"field{i}" for i in range(args.timing_aliases // 10)]
+    exact = {}
+    while len(exact) < args.timing_aliases:
+        exact[" ".join(rng.sample(words, rng.randint(1, 4))).title()] = rng.choice(fields)
+    big = FuzzyHeaderMatcher({"exact": exact, "normalized": {header_key(a): f for a, f in exact.items()}})
+    queries = [v for a in rng.sample(list(exact), 300) for v in variants(a, rng)][:500]
+    timings = []
+    for query in queries:
+        runs = []
+        for _ in range(TIMING_RUNS):
+            _token_similarity.cache_clear()
+            started = time.perf_counter()
+            big.fuzzy_match(query)
+            runs.append((time.perf_counter() - started) * 1e6)
+        timings.append(min(runs))
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95)]
+    limit = args.budget_us * (1 - args.margin)
+    print(f"fuzzy match over {len(big)} aliases: median {statistics.median(timings):.0f} us, "
+          f"p95 {p95:.0f} us, max {timings[-1]:.0f} us ({len(queries)} headers, p95 budget {args.budget_us:.0f} us, "
+          f"limit with {args.margin:.0%} margin {limit:.0f} us)")
+    if p95 > limit:
+        print(f"FAIL p95 {p95:.0f} us over {limit:.0f} us ({args.budget_us:.0f} us budget less {args.margin:.0%} margin)")
+    sys.exit(0 if recommended is not None and p95 <= limit else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Check the local filename validator (filename_validator.py) against the 'Agent File
+Specification' file names of every template, and time it.
+
+    python benchmarks/filename_validation.py
+
+Every specification name must validate for its template. Each date-stamped name is also
+checked with its stamps moved to other valid dates (must pass) and to impossible dates such
+as month 13 (must fail), and names of other templates must not validate unless a glob
+or regex rule of the template covers them. Exits 1 on any mismatch.
+"""
+import datetime
+import os
+import statistics
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+SHIFTED_DATES = [datetime.date(2024, 2, 29), datetime.date(2025, 12, 1), datetime.date(2026, 1, 31)]
+INVALID_DATE = {"%m": "13", "%d": "32", "%B": "Juneuary", "%b": "Jux"}
+
+
+def restamp(name, rule, fill):
+    """The name with each date stamp replaced by fill(stamp, formats)."""
+    match = rule["regex"].fullmatch(name)
+    parts, position = [], 0
+    for group, formats in enumerate(rule["date_formats"], 1):
+        parts.append(name[position:match.start(group)])
+        parts.append(fill(match.group(group), formats))
+        position = match.end(group)
+    parts.append(name[position:])
+    return "".join(parts)
+
+
+def invalid_stamp(stamp, formats):
+    fmt = formats[0]
+    for directive, value in INVALID_DATE.items():
+        if directive in fmt:
+            date = datetime.date(2025, 7, 22).strftime(fmt)
+            marker = datetime.date(2025, 7, 22).strftime(directive)
+            return date.replace(marker, value, 1)
+    return stamp
+
+
+def main():
+    import logging
+    logging.disable(logging.INFO)
+    from filename_validator import rule_matches
+    from spec_artifact import load_spec_artifact
+    from template_specs import get_compiled_spec
+
+    artifact = load_spec_artifact()
+    templates = list(artifact["templates"]) if artifact else []
+    validators = {t: get_compiled_spec(t).file_validator for t in templates}
+    failures = []
+    checks = 0
+    timings = []
+
+    def check(template_name, file_name, expected):
+        nonlocal checks
+        checks += 1
+        started = time.perf_counter()
+        result = validators[template_name].match(file_name)
+        timings.append((time.perf_counter() - started) * 1e6)
+        if (result is not None) != expected:
+            failures.append(f"{template_name}: {file_name!r} -> {result!r}, expected {'match' if expected else 'no match'}")
+
+    for template_name, validator in validators.items():
+        for rule in validator.rules:
+            name = rule["name"]
+            if rule["kind"] not in ("glob", "regex"):
+                check(template_name, name, True)
+                check(template_name, name.upper(), True)
+            if rule["kind"] != "date":
+                continue
+            for date in SHIFTED_DATES:
+                check(template_name, restamp(name, rule, lambda s, f: date.strftime(f[0])), True)
+            check(template_name, restamp(name, rule, invalid_stamp), False)
+
+        for other, other_validator in validators.items():
+            if other == template_name:
+                continue
+            for rule in other_validator.rules:
+                # Globs and regexes are broad on purpose ('hyundai_b2b_*.csv' covers A12's names too)
+                if rule["kind"] in ("exact", "date") and not any(
+                    own["kind"] in ("glob", "regex") and rule_matches(own, rule["name"]) for own in validator.rules
+                ):
+                    check(template_name, rule["name"], False)
+
+    timings.sort()
+    print(f"{sum(len(v) for v in validators.values())} file name rules over {len(validators)} templates, "
+          f"{checks} checks, {len(failures)} failures")
+    print(f"validation per name: median {statistics.median(timings):.1f} us, "
+          f"p95 {timings[int(len(timings) * 0.95)]:.1f} us")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+End-to-end load test of lambda_handler against the local S3 and agent stand-ins
+(CLIENT_BACKEND=local, see local_clients.py); no AWS access needed.
+
+    python benchmarks/load_test.py --files 500 --batch 10 --workers 4
+    python benchmarks/load_test.py --files 200 --agent-latency-ms 300 --throttle-rate 0.05
+    python benchmarks/load_test.py --files 100 --workers 1 --profile 20
+
+Input files are small CSVs whose headers are drawn from the template's aliases in
+'Agent File Input Headers.csv' plus a few unknown headers, with --signatures distinct header
+sets so the mapping cache sees realistic reuse. Files are delivered as SQS batches of --batch
+records, --workers invocations at a time. Prints files/s, invocation latency percentiles and
+agent call counts, plus the mean per-stage times from the handler's metrics records. --profile runs the files one by one on the main thread (cProfile only sees
+the calling thread) and prints the top functions by cumulative time.
+"""
+import argparse
+import cProfile
+import csv
+import io
+import json
+import os
+import pstats
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+
+class LocalContext:
+    """Minimal Lambda context with a fixed timeout per invocation."""
+
+    def __init__(self, timeout_ms):
+        self._deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return max(int((self._deadline - time.monotonic()) * 1000), 0)
+
+
+def template_aliases(template_name):
+    """One alias list per spec field of the template column."""
+    from alias_index import ALIAS_CSV_PATH, split_alias_cell
+
+    with open(ALIAS_CSV_PATH, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        columns = [c.strip() for c in next(reader)]
+        col_idx = columns.index(template_name)
+        return [split_alias_cell(row[col_idx]) for row in reader if col_idx < len(row) and row[col_idx].strip()]
+
+
+def make_signatures(template_name, count, rng):
+    alias_lists = template_aliases(template_name)
+    signatures = []
+    for i in range(count):
+        picked = rng.sample(alias_lists, k=min(len(alias_lists), rng.randint(8, 25)))
+        headers = [rng.choice(aliases) for aliases in picked]
+        headers += [f"Custom Field {i}-{j}" for j in range(rng.randint(0, 3))]
+        signatures.append(list(dict.fromkeys(headers)))
+    return signatures
+
+
+def make_csv(headers, rows, rng):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for r in range(rows):
+        writer.writerow([f"{r}-{rng.randint(0, 999)}" if rng.random() > 0.2 else "" for _ in headers])
+    return buffer.getvalue().encode("utf-8")
+
+
+def make_events(keys, batch, direct=False):
+    """SQS-delivered batches of S3 records, or one direct S3 record per event."""
+    if direct:
+        return [{"Records": [{"s3": {"bucket": {"name": "load"}, "object": {"key": key}}}]} for key in keys]
+    return [
+        {"Records": [
+            {"eventSource": "aws:sqs", "messageId": key, "body": json.dumps(
+                {"Records": [{"s3": {"bucket": {"name": "load"}, "object": {"key": key}}}]}
+            )}
+            for key in keys[start:start + batch]
+        ]}
+        for start in range(0, len(keys), batch)
+    ]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=300)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--signatures", type=int, default=20, help="distinct header sets across the files")
+    parser.add_argument("--batch", type=int, default=10, help="S3 records per SQS-delivered invocation")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent invocations")
+    parser.add_argument("--template", default="A8")
+    parser.add_argument("--output-format", default="csv")
+    parser.add_argument("--agent-latency-ms", type=float, default=0)
+    parser.add_argument("--chunk-bytes", type=int, default=64)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    parser.add_argument("--timeout-ms", type=int, default=900000, help="Lambda timeout given to each invocation")
+    parser.add_argument("--profile", type=int, metavar="N", help="profile the run and print the top N functions")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="local-s3-")
+    os.environ.update({
+        "CLIENT_BACKEND": "local",
+        "LOCAL_S3_ROOT": root,
+        "LOCAL_AGENT_LATENCY_MS": str(args.agent_latency_ms),
+        "LOCAL_AGENT_CHUNK_BYTES": str(args.chunk_bytes),
+        "LOCAL_AGENT_THROTTLE_RATE": str(args.throttle_rate),
+        "MAPPING_CACHE_LOCATION": "",
+        "OUTPUT_FORMAT": args.output_format,
+        # The generated file names pass the local filename validation of the template
+        "FILENAME_RULES": json.dumps({args.template: ["feed_*.csv"]}),
+    })
+    import logging
+    logging.disable(logging.INFO)
+
+    import agent_calls
+    import completeworkingfinal as handler
+    from metrics import MemoryMetricsSink, set_metrics_sink
+
+    metrics_sink = set_metrics_sink(MemoryMetricsSink())
+
+    agent_calls.AGENT_BACKOFF_BASE_SECONDS = 0.05
+
+    try:
+        rng = random.Random(args.seed)
+        signatures = make_signatures(args.template, args.signatures, rng)
+        keys = []
+        for i in range(args.files):
+            # The template folder routes the files (template_router), as in a shared deployment
+            key = f"input/{args.template}/feed_{i:05d}.csv"
+            handler.s3.put_object(Bucket="load", Key=key, Body=make_csv(signatures[i % len(signatures)], args.rows, rng))
+            keys.append(key)
+
+        if args.profile:
+            # Keep all work on the profiled thread: no validation/load overlap, no deadline thread
+            handler.CONCURRENT_STAGES = False
+            args.workers = 1
+        events = make_events(keys, args.batch, direct=bool(args.profile))
+
+        def invoke(event):
+            started = time.perf_counter()
+            response = handler.lambda_handler(event, None if args.profile else LocalContext(args.timeout_ms))
+            if "batchItemFailures" not in response and response["statusCode"] != 200:
+                response["batchItemFailures"] = [response]
+            return time.perf_counter() - started, response
+
+        profiler = cProfile.Profile() if args.profile else None
+        if profiler:
+            profiler.enable()
+        started = time.perf_counter()
+        if args.profile:
+            outcomes = [invoke(event) for event in events]
+        else:
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                outcomes = list(executor.map(invoke, events))
+        elapsed = time.perf_counter() - started
+        if profiler:
+            profiler.disable()
+
+        latencies = [seconds for seconds, _ in outcomes]
+        failures = sum(len(response.get("batchItemFailures", [])) for _, response in outcomes)
+        agent = handler.bedrock_agent_runtime.get_client()
+        outputs = handler.s3.list_objects_v2(Bucket="load", Prefix="output/")["KeyCount"]
+
+        print(f"{args.files} files in {len(events)} invocations, {args.workers} concurrent: "
+              f"{elapsed:.2f}s, {args.files / elapsed:.1f} files/s")
+        print(f"invocation latency: p50 {statistics.median(latencies) * 1000:.0f} ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms, max {max(latencies) * 1000:.0f} ms")
+        print(f"agent calls: {agent.calls} ({agent.throttled} throttled); outputs written: {outputs}; "
+              f"failed records: {failures}")
+        stage_names = sorted({name for record in metrics_sink.records for name in record if name.endswith("Ms")})
+        stage_means = {
+            name: statistics.mean(record.get(name, 0) for record in metrics_sink.records) for name in stage_names
+        }
+        print("mean per file: " + ", ".join(
+            f"{name} {ms:.1f}" for name, ms in sorted(stage_means.items(), key=lambda item: -item[1])
+        ))
+
+        if profiler:
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.profile)
+        sys.exit(1 if failures or outputs != args.files else 0)
+    finally:
+        set_metrics_sink(None)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
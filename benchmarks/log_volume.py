@@ -0,0 +1,111 @@
+"""
+Check that the handler's log volume per file stays bounded however wide the input is
+(CLIENT_BACKEND=local, no AWS access needed).
+
+    python benchmarks/log_volume.py
+    python benchmarks/log_volume.py --columns 50 200 1000 --budget-bytes 16384
+
+Each case processes one CSV whose headers are long unknown names (so the mapping payload
+goes to the agent and every header list is as large as it gets) and counts the bytes the
+root logger writes for it. A last case logs a Bedrock prompt with base64 page images the
+way Lamda.py builds it, which must not reach the log. Exits 1 when a file's log exceeds
+--budget-bytes or base64 content shows up in the log.
+"""
+import argparse
+import base64
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+
+def make_csv(columns, rows, rng):
+    headers = [f"Dealer Supplied Custom Attribute Number {i} " + "x" * 40 for i in range(columns)]
+    lines = [",".join(headers)]
+    for r in range(rows):
+        lines.append(",".join(str(rng.randint(0, 999)) for _ in headers))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def capture_logs():
+    buffer = io.StringIO()
+    handler = logging.StreamHandler(buffer)
+    handler.setFormatter(logging.Formatter("[%(levelname)s] %(asctime)s %(message)s"))
+    logging.getLogger().addHandler(handler)
+    return buffer, handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--columns", type=int, nargs="+", default=[10, 100, 500, 2000])
+    parser.add_argument("--rows", type=int, default=20)
+    parser.add_argument("--budget-bytes", type=int, default=12288, help="max log bytes per file")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="local-s3-")
+    os.environ.update({
+        "CLIENT_BACKEND": "local",
+        "LOCAL_S3_ROOT": root,
+        "MAPPING_CACHE_LOCATION": "",
+        "OUTPUT_FORMAT": "csv",
+        "METRICS_SINK": "off",
+        "FILENAME_RULES": json.dumps({"A8": ["wide_*.csv"]}),
+    })
+    import completeworkingfinal as handler
+    from log_governor import summarize
+
+    rng = random.Random(5)
+    failures = []
+    try:
+        print(f"{'columns':>8} {'status':>6} {'log lines':>9} {'log bytes':>10}")
+        for columns in args.columns:
+            key = f"input/A8/wide_{columns}.csv"
+            handler.s3.put_object(Bucket="load", Key=key, Body=make_csv(columns, args.rows, rng))
+            buffer, log_handler = capture_logs()
+            try:
+                result = handler.process_record({"s3": {"bucket": {"name": "load"}, "object": {"key": key}}})
+            finally:
+                logging.getLogger().removeHandler(log_handler)
+            output = buffer.getvalue()
+            size = len(output.encode("utf-8"))
+            print(f"{columns:>8} {result['statusCode']:>6} {output.count(chr(10)):>9} {size:>10}")
+            if result["statusCode"] != 200:
+                failures.append(f"{columns} columns: status {result['statusCode']}")
+            if size > args.budget_bytes:
+                failures.append(f"{columns} columns: {size} log bytes > {args.budget_bytes}")
+
+        # A multi-page image prompt as built by Lamda.create_combined_prompt
+        image = base64.b64encode(os.urandom(300000)).decode("ascii")
+        prompt = {"messages": [{"role": "user", "content": [
+            {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": image}}
+        ] * 3 + [{"type": "text", "text": "Extract the form fields"}]}]}
+        buffer, log_handler = capture_logs()
+        try:
+            handler.logger.info("prompt: %s", summarize(prompt))
+            handler.logger.info(f"unguarded prompt: {prompt}")
+        finally:
+            logging.getLogger().removeHandler(log_handler)
+        output = buffer.getvalue()
+        print(f"image prompt of {len(image) * 3} base64 chars logged as {len(output.encode('utf-8'))} bytes")
+        if image[:200] in output:
+            failures.append("base64 image data reached the log")
+        if len(output.encode("utf-8")) > args.budget_bytes:
+            failures.append(f"image prompt: {len(output)} log bytes > {args.budget_bytes}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("OK" if not failures else f"{len(failures)} failures")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Import-time profile of the Lambda handler modules, with a startup budget check.
+
+    python benchmarks/profile_imports.py                      # report completeworkingfinal
+    python benchmarks/profile_imports.py --module Main --top 15
+    python benchmarks/profile_imports.py --budget-ms 150      # exit 1 when init regresses
+
+Each run imports the module in a fresh interpreter with `-X importtime`, so the numbers
+are cold-start costs. The check fails (exit code 1) when the median init time exceeds
+--budget-ms, when a module listed in --forbid is imported at init time, or when an
+early rejection (unsupported file type) imports one of them.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["pandas", "numpy", "boto3", "botocore", "openpyxl", "pyarrow"]
+
+REJECTION_SCRIPT = """
+import json, sys
+import {module} as handler_module
+event = {{"Records": [{{"s3": {{"bucket": {{"name": "bucket"}}, "object": {{"key": "input/report.pdf"}}}}}}]}}
+result = handler_module.lambda_handler(event, None)
+print(json.dumps({{"result": result, "modules": sorted(m for m in sys.modules if "." not in m)}}))
+"""
+
+
+def run_python(args):
+    env = dict(os.environ, AWS_DEFAULT_REGION=os.environ.get("AWS_DEFAULT_REGION", "us-west-2"))
+    return subprocess.run([sys.executable] + args, cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True)
+
+
+def profile_import(module):
+    """Return (total_ms, {top-level package: self_ms summed over its modules}) for one cold import."""
+    completed = run_python(["-X", "importtime", "-c", f"import {module}"])
+    total_us = 0
+    packages = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        total_us += int(self_us)
+        top_level = name.strip().split(".")[0]
+        packages[top_level] = packages.get(top_level, 0) + int(self_us) / 1000
+    return total_us / 1000, packages
+
+
+def check_rejection_path(module):
+    """Run an unsupported-file-type event and return (result, heavy modules it imported)."""
+    completed = run_python(["-c", REJECTION_SCRIPT.format(module=module)])
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+    return report["result"], [m for m in HEAVY_MODULES if m in report["modules"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="completeworkingfinal")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail when median init time exceeds this")
+    parser.add_argument("--forbid", default="pandas,boto3,openpyxl,pyarrow",
+                        help="comma-separated modules that must not be imported at init or on rejection")
+    args = parser.parse_args()
+
+    runs = [profile_import(args.module) for _ in range(args.runs)]
+    median_ms = statistics.median(total for total, _ in runs)
+    packages = {
+        name: statistics.median(p.get(name, 0) for _, p in runs)
+        for name in set().union(*(p.keys() for _, p in runs))
+    }
+
+    print(f"{args.module}: median init {median_ms:.1f} ms over {args.runs} runs")
+    for name, cost in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {cost:9.1f} ms  {name}")
+
+    failures = []
+    forbidden = [m for m in args.forbid.split(",") if m]
+    loaded_at_init = [m for m in forbidden if m in packages]
+    if loaded_at_init:
+        failures.append(f"imported at init: {', '.join(loaded_at_init)}")
+
+    result, loaded_on_rejection = check_rejection_path(args.module)
+    print(f"early rejection: statusCode {result.get('statusCode')}, heavy modules: {loaded_on_rejection or 'none'}")
+    loaded_on_rejection = [m for m in loaded_on_rejection if m in forbidden]
+    if loaded_on_rejection:
+        failures.append(f"imported on early rejection: {', '.join(loaded_on_rejection)}")
+
+    if args.budget_ms is not None and median_ms > args.budget_ms:
+        failures.append(f"init {median_ms:.1f} ms exceeds budget {args.budget_ms:.1f} ms")
+
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Size of every registered prompt version: static instruction bytes/tokens and the
+rendered payload for a synthetic file with --headers input headers.
+
+    python benchmarks/prompt_sizes.py --headers 60
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alias_index import OUTPUT_FIELD_SPECIFICATION  # noqa: E402
+from prompts import PROMPTS, PROMPT_VERSIONS, estimate_tokens  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--headers", type=int, default=60)
+    parser.add_argument("--template", default="A10")
+    args = parser.parse_args()
+
+    headers = [f"{field} {i}" for i, field in zip(range(args.headers), OUTPUT_FIELD_SPECIFICATION * 10)]
+    values = {
+        "template": args.template,
+        "file_name": "hyundai_b2b_20250916.csv",
+        "headers": headers,
+        "headers_with_data": headers[: len(headers) * 2 // 3],
+    }
+
+    print(f"{'prompt':<22}{'version':<9}{'static B':>10}{'static tok':>12}{'rendered B':>12}{'rendered tok':>14}")
+    for (name, version), prompt in sorted(PROMPTS.items()):
+        text = prompt.render(**{field: values[field] for field in prompt.fields})
+        active = " *" if PROMPT_VERSIONS.get(name) == version else ""
+        print(f"{name:<22}{version + active:<9}{prompt.static_bytes:>10}{prompt.static_tokens:>12}"
+              f"{len(text.encode('utf-8')):>12}{estimate_tokens(text):>14}")
+    print("* active version")
+
+
+if __name__ == "__main__":
+    main()
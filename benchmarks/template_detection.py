@@ -0,0 +1,93 @@
+"""
+Measure template detection from headers (template_detector.py) on synthetic files built
+from each template's alias list, and time it per file.
+
+    python benchmarks/template_detection.py
+    python benchmarks/template_detection.py --files 500 --unknown 5 --max-wrong-rate 0.005
+
+Each file takes --min-fields to --max-fields random spec fields of one template, names each
+with a random alias of that template and adds --unknown headers no template knows. A guess
+is correct, wrong (another template) or abstained (not confident, left to routing defaults).
+Templates whose alias list is contained in another's cannot be told apart and should abstain
+with the right template among the guess's candidates. Exits 1 when the wrong rate over all
+files exceeds --max-wrong-rate.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=200, help="files per template")
+    parser.add_argument("--min-fields", type=int, default=5)
+    parser.add_argument("--max-fields", type=int, default=30)
+    parser.add_argument("--unknown", type=int, default=3, help="unknown headers per file")
+    parser.add_argument("--max-wrong-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    from template_detector import get_template_detector
+    from template_specs import get_compiled_spec
+
+    started = time.perf_counter()
+    detector = get_template_detector()
+    print(f"detector: {len(detector)} aliases over {len(detector.templates)} templates, "
+          f"built in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    rng = random.Random(args.seed)
+    timings = []
+    totals = {"correct": 0, "wrong": 0, "abstained": 0, "in_candidates": 0}
+    print(f"{'template':>8} {'correct':>8} {'wrong':>6} {'abstained':>9} {'in candidates':>13}  most confused with")
+    for template_name in detector.templates:
+        aliases_by_field = {}
+        for alias, field in get_compiled_spec(template_name).alias_index["exact"].items():
+            if field:
+                aliases_by_field.setdefault(field, []).append(alias)
+        fields = sorted(aliases_by_field)
+        counts = {"correct": 0, "wrong": 0, "abstained": 0, "in_candidates": 0}
+        confused = {}
+        for i in range(args.files):
+            picked = rng.sample(fields, min(len(fields), rng.randint(args.min_fields, args.max_fields)))
+            headers = [rng.choice(aliases_by_field[f]) for f in picked]
+            headers += [f"Custom Attribute {rng.randint(0, 10 ** 6)}" for _ in range(args.unknown)]
+            rng.shuffle(headers)
+
+            t0 = time.perf_counter()
+            guess = detector.detect(headers)
+            timings.append((time.perf_counter() - t0) * 1e6)
+            if guess["template"] is None:
+                counts["abstained"] += 1
+                counts["in_candidates"] += template_name in guess["candidates"]
+            elif guess["template"] == template_name:
+                counts["correct"] += 1
+            else:
+                counts["wrong"] += 1
+                confused[guess["template"]] = confused.get(guess["template"], 0) + 1
+        for outcome, count in counts.items():
+            totals[outcome] += count
+        worst = max(confused.items(), key=lambda item: item[1])[0] if confused else "-"
+        print(f"{template_name:>8} {counts['correct']:>8} {counts['wrong']:>6} {counts['abstained']:>9} "
+              f"{counts['in_candidates']:>13}  {worst}")
+
+    files = totals["correct"] + totals["wrong"] + totals["abstained"]
+    wrong_rate = totals["wrong"] / files if files else 0.0
+    timings.sort()
+    print(f"all: {totals['correct'] / files:.1%} correct, {wrong_rate:.2%} wrong, "
+          f"{totals['abstained'] / files:.1%} abstained, of which {totals['in_candidates']} "
+          f"with the template among the candidates ({files} files)")
+    print(f"detection per file: median {statistics.median(timings):.0f} us, "
+          f"p95 {timings[int(len(timings) * 0.95)]:.0f} us")
+    sys.exit(0 if wrong_rate <= args.max_wrong_rate else 1)
+
+
+if __name__ == "__main__":
+    main()
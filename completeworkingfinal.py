@@ -1,213 +1,80 @@
 import json
-import boto3
 import urllib.parse
 import os
 import logging
+import io
 from io import BytesIO
-import pandas as pd
-from botocore.config import Config
 import uuid
 import csv
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from agent_calls import AgentDeadlineExceeded, call_agent_with_retries, deadline_from_context
+from agent_stream import AgentJsonStream, iter_completion_text
+from alias_index import resolve_headers_locally
+from aws_clients import LazyClient
+from filename_validator import FILENAME_VALIDATION
+from mapping_cache import mapping_cache_key, get_cached_mappings, put_cached_mappings
+from log_governor import debug_sampled, install_log_governor, summarize
+from mapping_reconciler import MappingReconciler
+from metrics import NO_METRICS, FileMetrics
+from output_writers import OUTPUT_EXTENSIONS, S3MultipartWriter, open_output_writer
+from prompts import estimate_tokens, render_prompt
+from template_detector import (
+    TEMPLATE_DETECTION, detect_template, templates_for_file_name, templates_without_file_names
+)
+from template_router import DEFAULT_TEMPLATE, route_template
+from template_specs import OUTPUT_COLUMN_DEFAULTS, check_spec_artifact, get_compiled_spec
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-
-s3 = boto3.client('s3')
-bedrock_agent_runtime = boto3.client(
+# Payloads are logged through log_governor.summarize; the filter cuts anything else oversized
+install_log_governor(logger)
+# A spec artifact older than the spec files fails the cold start (see SPEC_ARTIFACT_STALE)
+check_spec_artifact()
+
+# pandas, boto3 and openpyxl are imported where they are first needed, so the
+# Lambda init phase and early rejections (unsupported type, failed validation) stay light
+s3 = LazyClient('s3')
+bedrock_agent_runtime = LazyClient(
     'bedrock-agent-runtime',
     region_name="us-west-2",
-    config=Config(connect_timeout=10, read_timeout=120)
+    # Retries are done by call_agent_with_retries, which also bounds them by the invocation deadline
+    config={"connect_timeout": 10, "read_timeout": 120, "retries": {"total_max_attempts": 1}}
 )
 
 AGENT_ID = "QDTSICEWAF"
 AGENT_ALIAS_ID = "ICRJF8TMZW"
-HARD_CODED_TEMPLATE = "A10"
-
-AGENT_FILENAME_VALIDATION_PROMPT = (
-    "You will receive a file name and a template name. "
-    "Your task is to validate whether the file name exists for the given template "
-    "With same Agent (Template) multiple files will associated with it, so first look for the file name under column 'File Name' inside 'Agent File Specification' "
-    "in the 'Agent File Specification' sheet under the 'File Name' column.Go through full column to match the file name"
-    "If the file name matches for the template, return JSON: "
-    '{"Validation": "Success", "InputFileName": "<the incoming file name>", "SpecifcationFileName": "<the file name from Agent File Specification>"} '
-    "If not, return JSON: "
-    '{"Validation": "Failed", "InputFileName": "<the incoming file name>", "SpecifcationFileName": "<the file name from Agent File Specification>"} '
-    "Do not return any extra text or explanation."
-)
+# The template of each file is picked by template_router (prefix, file name, metadata, DEFAULT_TEMPLATE)
 
+# Overlap filename validation with S3 download + parsing ("false" runs the steps one after another)
+CONCURRENT_STAGES = os.environ.get("CONCURRENT_STAGES", "true").lower() == "true"
+S3_READ_CHUNK_SIZE = 8 * 1024 * 1024
 
+# CSV/TXT inputs larger than this are streamed in row chunks instead of loaded whole
+STREAMING_THRESHOLD_BYTES = int(os.environ.get("STREAMING_THRESHOLD_BYTES", 256 * 1024 * 1024))
+STREAMING_CHUNK_ROWS = int(os.environ.get("STREAMING_CHUNK_ROWS", 100000))
 
+# Output format: xlsx, csv, csv.gz, parquet or auto (xlsx for small inputs, csv.gz above the size limit);
+# OUTPUT_FORMAT_BY_TEMPLATE overrides it per template, e.g. {"A8": "parquet"}
+OUTPUT_FORMAT = os.environ.get("OUTPUT_FORMAT", "xlsx")
+OUTPUT_FORMAT_BY_TEMPLATE = json.loads(os.environ.get("OUTPUT_FORMAT_BY_TEMPLATE", "{}"))
+AUTO_XLSX_MAX_INPUT_BYTES = int(os.environ.get("AUTO_XLSX_MAX_INPUT_BYTES", 20 * 1024 * 1024))
 
+# Rows parsed across all columns by the CSV/TXT header probe before the mapped-columns parse
+PROBE_ROWS = int(os.environ.get("PROBE_ROWS", 1000))
+# Bytes fetched with a ranged GET to read the header row of an unrouted CSV/TXT for template detection
+HEADER_PROBE_BYTES = int(os.environ.get("HEADER_PROBE_BYTES", 64 * 1024))
 
-# Updated mapping prompt, explicitly instructing not to hallucinate or skip vehicleType (V0 : Working)
-# AGENT_HEADER_MAPPING_PROMPT = (
-#     "Instructions: For each header in Output Field Specification (column 'Field Name', in exact order), attempt to map to one of the input headers using the following logic:\n"
-#     "When reading alias cells, treat comma-separated values as distinct aliases. Always preserve the original inputHeader exactly as received in the file, even if it matches one of the aliases.\n"
-#     "For each input header, find all alias lists for standardized headers under template column \"A8\" in \"Agent File Input Headers\".\n"
-#     "Check if input header exactly or fuzzily matches an alias for a standardized header.\n"
-#     "Confirm the standardized header exists in Output Field Specification under 'Field Name'.\n"
-#     "If found, map input header to this standardized header with confidenceScore 100 for exact, 80 for fuzzy.\n"
-#     "If no standardized header found via aliases, but input header is in 'Input headers with data', self-map it with confidenceScore 0.\n"
-#     "After mapping all standardized headers, add any unmapped standardized headers as placeholders with inputHeader = mappedHeader and confidenceScore 0.\n"
-#     "Append any remaining unmapped input headers with data at the end.\n"
-#     "Do not produce duplicate mappedHeader values in output.\n"
-#     "Output a JSON array ordered exactly as Output Field Specification 'Field Name' list, followed by any extra input headers.\n"
-#     "Respond ONLY with the JSON array, no explanations or extra text."
-# )
-
-#(V1: Working with one issue)(working 100%)
-# AGENT_HEADER_MAPPING_PROMPT = (
-#     "Instructions: For each header in Output Field Specification (column 'Field Name', in exact order), attempt to map to one of the input headers using the following logic:\n"
-#     "When reading alias cells, treat comma-separated values as distinct aliases. Always preserve the original inputHeader exactly as received in the file, even if it matches one of the aliases.\n"
-#     "For each input header, find all alias lists for standardized headers under template column \"A8\" in \"Agent File Input Headers\".\n"
-#     "Check if input header exactly or fuzzily matches an alias for a standardized header.\n"
-#     "Confirm the standardized header exists in Output Field Specification under 'Field Name'.\n"
-#     "If found, map input header to this standardized header with confidenceScore 100 for exact, 80 for fuzzy.\n"
-#     "If no standardized header found via aliases, but input header is in 'Headers with data', then keep the mappedHeader as empty and fill inputHeader as same as inputHeader with conficence score 0.\n"
-#     "After mapping all standardized headers, add any unmapped standardized headers as placeholders where inputHeader =""(empty) and mappedHeader=""<Standardized_Header>"" with confidenceScore 0(int).\n"
-#     "Append any remaining unmapped input headers with data at the end as inputHeader=""<Incoming_Input_header>"" and mappedHeader=""(empty) with confidence score 0(int).\n"
-#     "Do not produce duplicate mappedHeader values in output.\n"
-#     "Output a JSON array ordered exactly as Output Field Specification 'Field Name' list, followed by any extra input headers.\n"
-#     "Respond ONLY with the JSON array, no explanations or extra text."
-# )	
-#(V1: Working with one issue)(working 100%)
-# AGENT_HEADER_MAPPING_PROMPT = (
-#     f"Instructions: For each header in Output Field Specification (column 'Field Name', in exact order), attempt to map to one of the input headers using the following logic:\n"
-#     f"When reading alias cells, treat comma-separated values as distinct aliases. Always preserve the original inputHeader exactly as received in the file, even if it matches one of the aliases.\n"
-#     f"Inside Agent File Input Headers File First row consist the Different File names and second row Consist the different Templates with it's data in column wise. \n"
-#     f"For each input header, find all alias lists for standardized headers under template column \"{HARD_CODED_TEMPLATE}\" in \"Agent File Input Headers\".\n"
-
-
-#Today updated when testing non generic files (worked for all except A10)
-# AGENT_HEADER_MAPPING_PROMPT = (
-#     f"Instructions: For each header in Output Field Specification (column 'Field Name', in exact order), attempt to map to one of the input headers using the following logic:\n"
-#     f"When reading alias cells, treat comma-separated values as distinct aliases. Always preserve the original inputHeader exactly as received in the file, even if it matches one of the aliases.\n"
-#     f"Inside Agent File Input Headers File, the first row consists of different file names and the second row consists of different templates with their data in column-wise format.\n"
-#     f"Step 1: For each input header, check if it exactly or fuzzily matches an alias for a standardized header under template column \"{HARD_CODED_TEMPLATE}\" in \"Agent File Input Headers\".\n"
-#     f"   - If found, and that standardized header exists in Output Field Specification, map it with confidenceScore 100 for exact, 80 for fuzzy.\n"
-#     f"   - Do not create a placeholder for that standardized header later.\n"
-#     f"Step 2: If an input header does not match any standardized header but is in 'Headers with data', map it as inputHeader=<same value>, mappedHeader=\"\" (empty), confidenceScore=0.\n"
-#     f"Step 3: After processing all input headers, add placeholders for any standardized headers from Output Field Specification that remain unmapped. For these, set inputHeader=\"\" (empty), mappedHeader=<Standardized_Header>, confidenceScore=0.\n"
-#     f"Step 4: Append any remaining unmapped input headers with data at the end as inputHeader=<Incoming_Input_header>, mappedHeader=\"\" (empty), confidenceScore=0.\n"
-#     f"Rules:\n"
-#     f"- Do not produce duplicate mappedHeader values in output.\n"
-#     f"- Do not map headers whose standardized output header is not found and which are not present in Headers with Data.\n"
-#     f"Output: Respond ONLY with the JSON array ordered exactly as Output Field Specification 'Field Name' list, followed by any extra input headers."
-# )
-
-# AGENT_HEADER_MAPPING_PROMPT = (
-#     f"Instructions: For each header in Output Field Specification (column 'Field Name', in exact order), attempt to map to one of the input headers using the following logic:\n"
-#     f"- When reading alias cells, treat comma-separated values as distinct aliases.\n"
-#     f"- Matching must be case-insensitive, but always preserve the original inputHeader exactly as received in the file.\n"
-#     f"- Inside Agent File Input Headers File, the first row consists of different file names and the second row consists of different templates with their data in column-wise format.\n\n"
-#     f"Step 1: For each input header, check if it exactly or fuzzily (case-insensitive) matches an alias for a standardized header under template column \"{HARD_CODED_TEMPLATE}\" in \"Agent File Input Headers\".\n"
-#     f"- If found, and that standardized header exists in Output Field Specification, map it with confidenceScore 100 for exact, 80 for fuzzy.\n"
-#     f"- Each standardized header (mappedHeader) must appear only once in the output. If multiple input headers match, pick the strongest (exact > fuzzy > first seen).\n"
-#     f"- Do not create a placeholder for that standardized header later.\n\n"
-#     f"Step 2: If an input header does not match any standardized header but is in 'Headers with data', map it as:\n"
-#     f'  {{\"inputHeader\": \"<same value>\", \"mappedHeader\": \"\", \"confidenceScore\": 0}}\n\n'
-#     f"Step 3: After processing all input headers, add placeholders for any standardized headers from Output Field Specification that remain unmapped. For these, set:\n"
-#     f'  {{\"inputHeader\": \"\", \"mappedHeader\": \"<Standardized_Header>\", \"confidenceScore\": 0}}\n\n'
-#     f"Step 4: Append any remaining unmapped input headers with data at the end as:\n"
-#     f'  {{\"inputHeader\": \"<Incoming_Input_header>\", \"mappedHeader\": \"\", \"confidenceScore\": 0}}\n\n'
-#     f"Rules:\n"
-#     f"- Do not produce duplicate mappedHeader values.\n"
-#     f"- Once a mappedHeader is used, it cannot appear again.\n"
-#     f"- Do not map headers whose standardized output header is not found and which are not present in Headers with Data.\n\n"
-#     f"Output: Respond ONLY with the JSON array ordered exactly as Output Field Specification 'Field Name' list, followed by any extra input headers."
-# )
-
-# AGENT_HEADER_MAPPING_PROMPT = (
-#     f"Instructions: For each header in Output Field Specification (column 'Field Name', in exact order), attempt to map to one of the input headers using the following logic:\n"
-#     f"- When reading alias cells, treat comma-separated values as distinct aliases.\n"
-#     f"- Matching must be case-insensitive, but always preserve the original inputHeader exactly as received in the file.\n"
-#     f"- Inside Agent File Input Headers File, the first row consists of different file names and the second row consists of different templates with their data in column-wise format.\n\n"
-#     f"Step 1: For each input header, check if it exactly or fuzzily (case-insensitive) matches an alias for a standardized header under template column \"{HARD_CODED_TEMPLATE}\" in \"Agent File Input Headers\".\n"
-#     f"- If found, and that standardized header exists in Output Field Specification, map it with confidenceScore 100 for exact, 80 for fuzzy.\n"
-#     f"- Each standardized header (mappedHeader) must appear only once in the output. If multiple input headers match, pick the strongest (exact > fuzzy > first seen).\n"
-#     f"- Do not create a placeholder for that standardized header later.\n\n"
-#     f"Step 2: If an input header does not match any standardized header but is in 'Headers with data', it MUST be preserved in the output exactly once. Map it as:\n"
-#     f'  {{\"inputHeader\": \"<same value>\", \"mappedHeader\": \"\", \"confidenceScore\": 0}}\n'
-#     f"- Do not skip or drop any header from 'Headers with data'.\n\n"
-#     f"Step 3: After processing all input headers, add placeholders for any standardized headers from Output Field Specification that remain unmapped. For these, set:\n"
-#     f'  {{\"inputHeader\": \"\", \"mappedHeader\": \"<Standardized_Header>\", \"confidenceScore\": 0}}\n\n'
-#     f"Step 4: After placeholders are added, append any remaining unmapped input headers with data (not already included in Step 2) at the end as:\n"
-#     f'  {{\"inputHeader\": \"<Incoming_Input_header>\", \"mappedHeader\": \"\", \"confidenceScore\": 0}}\n'
-#     f"- Ensure every header from 'Headers with data' is present at least once in the final JSON.\n\n"
-#     f"Rules:\n"
-#     f"- Do not produce duplicate mappedHeader values.\n"
-#     f"- Once a mappedHeader is used, it cannot appear again.\n"
-#     f"- Do not map headers whose standardized output header is not found and which are not present in Headers with Data.\n\n"
-#     f"Output: Respond ONLY with the JSON array ordered exactly as Output Field Specification 'Field Name' list, followed by any extra input headers."
-# )
-#ABove prompt updated with agent help working for A10 template with version 23
-# AGENT_HEADER_MAPPING_PROMPT = (
-#     f"Instructions: You MUST return a JSON array where:\n"
-#     f"- Every standardized header from Output Field Specification (column 'Field Name') appears exactly once, in the same order as in the specification.\n"
-#     f"- The total number of JSON objects MUST be >= the number of standardized headers present in outfiled specification file.\n"
-#     f"- If a standardized header cannot be mapped, you MUST include it as:\n"
-#     f'  {{\"inputHeader\": \"\", \"mappedHeader\": \"<Standardized_Header>\", \"confidenceScore\": 0}}\n'
-#     f"- Never skip, drop, or omit any standardized header, even if no input mapping exists.\n\n"
-#     f"Step 0: Build Checklists\n"
-#     f"- DATA_CHECKLIST = all 'Headers with data'\n"
-#     f"- SPEC_CHECKLIST = all standardized headers from Output Field Specification\n\n"
-#     f"Step 1: Alias Matching\n"
-#     f"- For each input header, check if it exactly or fuzzily matches an alias in template \"{HARD_CODED_TEMPLATE}\".\n"
-#     f"- Exact = confidenceScore 100, fuzzy = 80. Only one mappedHeader per spec header.\n\n"
-#     f"Step 2: Mandatory Data Header Inclusion\n"
-#     f"- Every input header from DATA_CHECKLIST MUST appear exactly once in the output.\n"
-#     f"- If it does not map to a standardized header, include it as:\n"
-#     f'  {{\"inputHeader\": \"<header>\", \"mappedHeader\": \"\", \"confidenceScore\": 0}}\n\n'
-#     f"Step 3: Placeholder Coverage\n"
-#     f"- After Step 1 and Step 2, ensure every header from SPEC_CHECKLIST is present in the JSON in correct order.\n"
-#     f"- If not mapped, add placeholder as described.\n\n"
-#     f"Step 4: Append Extras\n"
-#     f"- After placeholders, append any remaining headers from DATA_CHECKLIST not already included.\n\n"
-#     f"Final Verification (MANDATORY)\n"
-#     f"- Count entries. It MUST be >= the number of standardized headers present in outfiled specification file..\n"
-#     f"- Confirm every SPEC_CHECKLIST header appears once.\n"
-#     f"- Confirm every DATA_CHECKLIST header appears once.\n"
-#     f"- If any are missing, regenerate before responding.\n\n"
-#     f"Output: ONLY return the JSON array, in this order:\n"
-#     f"1) All standardized headers (SPEC_CHECKLIST) in correct order\n"
-#     f"2) Followed by any extra DATA_CHECKLIST headers."
-# )
-
-AGENT_HEADER_MAPPING_PROMPT = (
-    f"Instructions: You MUST return a JSON array where:\n"
-    f"- Every standardized header from Output Field Specification (column 'Field Name') appears exactly once, in the same order as in the specification.\n"
-    f"- The total number of JSON objects MUST be >= the number of standardized headers present in the output specification file.\n"
-    f"- If a standardized header cannot be mapped, you MUST include it as:\n"
-    f'  {{\"inputHeader\": \"\", \"mappedHeader\": \"<Standardized_Header>\", \"confidenceScore\": 0}}\n'
-    f"- Never skip, drop, or omit any standardized header, even if no input mapping exists.\n\n"
-    f"Step 0: Build Checklists\n"
-    f"- DATA_CHECKLIST = all 'Input headers with data'\n"
-    f"- SPEC_CHECKLIST = all standardized headers from Output Field Specification\n\n"
-    f"Step 1: Alias Matching\n"
-    f"- For each input header, check if it exactly or fuzzily matches an alias in template \"{HARD_CODED_TEMPLATE}\".\n"
-    f"- Exact = confidenceScore 100, fuzzy = 80. Only one mappedHeader per spec header.\n\n"
-    f"Step 2: Self-Mapping for Data Headers ONLY\n"
-    f"- For each input header in DATA_CHECKLIST:\n"
-    f"   - If it maps to a standardized header → output the mapping.\n"
-    f"    -if it does NOT map to any standardized header but the headers is in DATA_CHEKLIST or is in Input Headers with Data -> output:"   
-    f'     {{\"inputHeader\": \"<header>\", \"mappedHeader\": \"\", \"confidenceScore\": 0}}\n'
-    f"- IMPORTANT: Do NOT include any header that is not in DATA_CHECKLIST.\n\n"
-    f"Step 3: Placeholder Coverage\n"
-    f"- After Step 1 and Step 2, ensure every header from SPEC_CHECKLIST is present in the JSON in correct order.\n"
-    f"- If not mapped, add placeholder as described.\n\n"
-    f"Step 4: Append Extras\n"
-    f"- After placeholders, append any headers from DATA_CHECKLIST that were not already included.\n"
-    f"- Ignore all headers that are not in DATA_CHECKLIST.\n\n"
-    f"Final Verification (MANDATORY)\n"
-    f"- Count entries. It MUST be >= the number of standardized headers present in the specification file.\n"
-    f"- Confirm every SPEC_CHECKLIST header appears once.\n"
-    f"- Confirm every DATA_CHECKLIST header appears once.\n"
-    f"- Confirm NO header outside DATA_CHECKLIST is included unless it maps to a standardized header.\n"
-    f"- If any condition fails, regenerate before responding.\n\n"
-    f"Output: ONLY return the JSON array, in this order:\n"
-    f"1) All standardized headers (SPEC_CHECKLIST) in correct order\n"
-    f"2) Followed by any extra DATA_CHECKLIST headers."
-)
+# CSV/TXT parse engine of load_file_once: "c" (pandas' C parser) or "arrow" (pyarrow's multi-threaded
+# reader into Arrow-backed string columns; files it rejects, e.g. with ragged rows, fall back to "c",
+# before any Arrow parse when a ragged row is among the first ARROW_RAGGED_SAMPLE_BYTES)
+CSV_ENGINE = os.environ.get("CSV_ENGINE", "c").lower()
+# Leading bytes whose rows the arrow engine checks for ragged rows before parsing
+ARROW_RAGGED_SAMPLE_BYTES = 64 * 1024
+
+# Records of a batched S3/SQS event processed in parallel
+RECORD_WORKERS = int(os.environ.get("RECORD_WORKERS", 4))
 
 
 # ------------------- Functions -------------------
@@ -285,18 +152,117 @@ def detect_file_delimiter(file_bytes, sample_size=5000):
     logger.info(f"[INFO] Detected delimiter: '{detected}'")
     return detected
 
+# -------------------------------
+# Arrow CSV engine
+# -------------------------------
+def pandas_column_names(names):
+    """Header names as pandas' C parser makes them: blank -> 'Unnamed: <i>', repeats -> '<name>.<n>'."""
+    named = [i for i, name in enumerate(names) if name]
+    unnamed = [i for i, name in enumerate(names) if not name]
+    names = [name if name else f"Unnamed: {i}" for i, name in enumerate(names)]
+    header = set(names)
+    counts = {}
+    # Given names keep priority: blank columns are mangled after all the named ones
+    for i in named + unnamed:
+        name = names[i]
+        original, count = name, counts.get(name, 0)
+        while count > 0:
+            counts[original] = count + 1
+            name = f"{original}.{count}"
+            # Suffixed names also skip names that appear elsewhere in the header
+            count = count + 1 if name in header else counts.get(name, 0)
+        names[i] = name
+        counts[name] = count + 1
+    return names
+
+
+def read_csv_arrow(file_bytes, delimiter, usecols=None, nrows=None):
+    """
+    Parse delimited bytes with pyarrow's multi-threaded CSV reader into Arrow-backed string
+    columns, with the names and cells of the C parser path (dtype=str, keep_default_na=False):
+    every cell is a string and empty cells are "". Files the Arrow reader rejects (rows with a
+    different field count) raise ValueError when such a row is among the first
+    ARROW_RAGGED_SAMPLE_BYTES, before any parse, and pyarrow.ArrowInvalid after (part of) a
+    parse when it comes later.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    text = io.TextIOWrapper(BytesIO(file_bytes), encoding="utf-8-sig", newline="")
+    header = next(csv.reader(text, delimiter=delimiter), [])
+    positions = range(len(header)) if usecols is None else sorted(usecols)
+
+    sample = file_bytes[:ARROW_RAGGED_SAMPLE_BYTES].decode("utf-8-sig", errors="ignore")
+    sample_rows = list(csv.reader(io.StringIO(sample), delimiter=delimiter))
+    # The last row of a cut sample may be cut off itself
+    if len(file_bytes) > ARROW_RAGGED_SAMPLE_BYTES:
+        sample_rows = sample_rows[:-1]
+    for row_number, row in enumerate(sample_rows[1:], 1):
+        if row and len(row) != len(header):
+            raise ValueError(f"row {row_number} has {len(row)} fields, the header {len(header)}")
+
+    # The header row is parsed as a data row, so every column is typed string by position
+    column_names = [f"f{i}" for i in range(len(header))]
+    read_options = pa_csv.ReadOptions(column_names=column_names, use_threads=True)
+    parse_options = pa_csv.ParseOptions(delimiter=delimiter, newlines_in_values=True)
+    convert_options = pa_csv.ConvertOptions(
+        column_types={name: pa.large_string() for name in column_names},
+        include_columns=[column_names[i] for i in positions],
+        strings_can_be_null=False,
+    )
+    if nrows is None:
+        table = pa_csv.read_csv(BytesIO(file_bytes), read_options, parse_options, convert_options)
+    else:
+        reader = pa_csv.open_csv(BytesIO(file_bytes), read_options, parse_options, convert_options)
+        batches, rows = [], 0
+        for batch in reader:
+            batches.append(batch)
+            rows += batch.num_rows
+            if rows > nrows:
+                break
+        table = pa.Table.from_batches(batches, schema=reader.schema).slice(0, nrows + 1)
+
+    # pandas 3 reads dtype=str as its Arrow-backed "str" dtype; earlier versions get string[pyarrow]
+    if int(pd.__version__.split(".")[0]) >= 3:
+        string_dtype = pd.StringDtype("pyarrow", na_value=float("nan"))
+    else:
+        string_dtype = pd.StringDtype("pyarrow")
+    df = table.slice(1).to_pandas(types_mapper={pa.large_string(): string_dtype}.get)
+    names = pandas_column_names(header)
+    df.columns = [names[i] for i in positions]
+    return df
+
+
 # -------------------------------
 # Load file with dynamic delimiter
 # -------------------------------
-def load_file_once(file_bytes, file_extension):
+def load_file_once(file_bytes, file_extension, usecols=None, nrows=None):
+    """
+    Parse the file into an all-string DataFrame with stripped headers.
+    usecols (column positions) and nrows restrict the parse to part of the file.
+    CSV/TXT files are parsed by the CSV_ENGINE.
+    """
+    import pandas as pd
+
     try:
         if file_extension in ['.csv', '.txt']:
             # Detect delimiter dynamically
             detected_delim = detect_file_delimiter(file_bytes)
-            df = pd.read_csv(BytesIO(file_bytes), delimiter=detected_delim, dtype=str, keep_default_na=False)
+            df = None
+            if CSV_ENGINE == "arrow":
+                try:
+                    df = read_csv_arrow(file_bytes, detected_delim, usecols=usecols, nrows=nrows)
+                except Exception as e:
+                    logger.info("[INFO] Arrow CSV engine cannot read the file (%s), parsing with the C parser", summarize(str(e)))
+            if df is None:
+                df = pd.read_csv(
+                    BytesIO(file_bytes), delimiter=detected_delim, dtype=str, keep_default_na=False,
+                    usecols=usecols, nrows=nrows
+                )
 
         elif file_extension in ['.xls', '.xlsx']:
-            df = pd.read_excel(BytesIO(file_bytes), dtype=str)
+            df = pd.read_excel(BytesIO(file_bytes), dtype=str, usecols=usecols, nrows=nrows)
 
         else:
             raise ValueError(f"Unsupported file type: {file_extension}")
@@ -304,7 +270,7 @@ def load_file_once(file_bytes, file_extension):
         # Normalize headers
         headers = [str(col).strip() for col in df.columns]
         df.columns = headers
-        logger.info(f"[INFO] Extracted headers: {headers}")
+        logger.info("[INFO] Extracted %d headers: %s", len(headers), summarize(headers))
 
         return df, headers
 
@@ -313,29 +279,42 @@ def load_file_once(file_bytes, file_extension):
         raise
 
 
+def find_columns_with_data(df, positions=None, first_block_rows=1024, max_block_rows=65536):
+    """
+    Return the column positions that hold at least one non-empty, non-null value.
+    Rows are scanned in growing blocks over all still-empty columns at once; a column
+    drops out of the scan as soon as data is found, and the scan stops when none are left.
+    """
+    import pandas as pd
+
+    pending = list(range(df.shape[1])) if positions is None else list(positions)
+    found = []
+    start, block_rows = 0, first_block_rows
+    n_rows = len(df)
+
+    while pending and start < n_rows:
+        block = df.iloc[start:start + block_rows, pending].to_numpy(dtype=object)
+        cells = pd.Series(block.ravel(order="F"), dtype=object).fillna("").astype(str).str.strip()
+        non_empty = ((cells != "") & (cells != "nan")).to_numpy().reshape(len(pending), -1)
+        has_data = non_empty.any(axis=1)
+
+        found.extend(pos for pos, hit in zip(pending, has_data) if hit)
+        pending = [pos for pos, hit in zip(pending, has_data) if not hit]
+        start += block_rows
+        block_rows = min(block_rows * 4, max_block_rows)
+
+    return sorted(found)
+
+
 def extract_headers_with_data(df, headers):
     """Find headers that actually have non-empty, non-null data."""
-    headers_with_data = []
-    false_positives = []  # debug list
-
-    for col in headers:
-        series = (
-            df[col]
-            .astype(str)
-            .str.strip()
-            .replace("nan", "")
-            .replace("", pd.NA)
-        )
-
-        if series.notna().any():
-            headers_with_data.append(col)
-        else:
-            false_positives.append(col)
+    positions_with_data = set(find_columns_with_data(df))
+    headers_with_data = [col for i, col in enumerate(headers) if i in positions_with_data]
+    false_positives = [col for i, col in enumerate(headers) if i not in positions_with_data]  # debug list
 
     logger.info(f"Total headers: {len(headers)}")
     logger.info(f"Headers with data count: {len(headers_with_data)}")
-    logger.info(f"Headers with data: {headers_with_data}")
-    logger.info(f"Headers WITHOUT data (ignored): {false_positives}")
+    logger.info("Headers WITHOUT data (ignored): %s", summarize(false_positives))
 
     return headers_with_data
 
@@ -357,56 +336,134 @@ def extract_headers_with_data(df, headers):
 #         raise
 
 
-def invoke_agent(payload, session_id):
-    params = {
-        "agentId": AGENT_ID,
-        "agentAliasId": AGENT_ALIAS_ID,
-        "sessionId": session_id,
-        "inputText": payload
-    }
-    response = bedrock_agent_runtime.invoke_agent(**params)
-    chunks = []
-    for event in response.get("completion", []):
-        if "chunk" in event and "bytes" in event["chunk"]:
-            chunks.append(event["chunk"]["bytes"].decode("utf-8"))
-    full_output = "".join(chunks).strip()
-    logger.info(f"Raw agent response: {full_output}")
-    return full_output
+# -------------------------------
+# Two-phase load with column projection (CSV/TXT)
+# -------------------------------
+def scan_headers_with_data(file_bytes, file_extension, cancel_event=None):
+    """
+    Phase one: parse the header and the first PROBE_ROWS rows of every column. When the probe
+    covers the whole file, or leaves columns without data that only the rest of the file can
+    settle, the file is parsed whole once and that frame is also the output pass's input, so
+    no CSV is tokenized in full more than once.
+    Returns (headers, headers_with_data, df) with df None when the output pass still has to parse
+    the mapped columns (load_mapped_columns), or None once cancel_event is set after the probe.
+    """
+    probe_df, headers = load_file_once(file_bytes, file_extension, nrows=PROBE_ROWS)
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+    positions_with_data = set(find_columns_with_data(probe_df))
+    pending = [i for i in range(len(headers)) if i not in positions_with_data]
+
+    df = None
+    if len(probe_df) < PROBE_ROWS:
+        df = probe_df
+    elif pending:
+        df, _ = load_file_once(file_bytes, file_extension)
+        positions_with_data.update(find_columns_with_data(df, positions=pending))
+
+    headers_with_data = [col for i, col in enumerate(headers) if i in positions_with_data]
+    logger.info(f"Total headers: {len(headers)}")
+    logger.info(f"Headers with data count: {len(headers_with_data)}")
+    logger.info(
+        "Headers WITHOUT data (ignored): %s",
+        summarize([col for i, col in enumerate(headers) if i not in positions_with_data])
+    )
+    return headers, headers_with_data, df
 
 
-def create_output_excel(mappings, input_data_df):
-    """Ensure all standardized headers and all headers with data appear in output"""
-    df_out = pd.DataFrame()
-    seen_mapped = set()
+def load_mapped_columns(file_bytes, file_extension, headers, mappings):
+    """Phase two: full parse restricted to the input columns the mappings actually use."""
+    import pandas as pd
+
+    needed = {m.get("inputHeader", "").strip() for m in mappings} - {""}
+    usecols = [i for i, col in enumerate(headers) if col in needed]
+    if not usecols:
+        # Nothing to read: an empty frame with the file's row count keeps placeholder columns sized
+        row_count = len(load_file_once(file_bytes, file_extension, usecols=[0])[0])
+        return pd.DataFrame(index=pd.RangeIndex(row_count))
+
+    logger.info(f"Parsing {len(usecols)} of {len(headers)} columns used by the mapping")
+    input_data_df, _ = load_file_once(file_bytes, file_extension, usecols=usecols)
+    return input_data_df
+
+
+def invoke_agent(payload, session_id, deadline=None, metrics=NO_METRICS, expected_type=None, item_type=None):
+    """
+    Invoke the agent and parse its JSON output while the completion streams in.
+    Prose, code fences and JSON values other than the expected_type (with item_type elements,
+    for lists) around the answer are ignored.
+    Throttles and transient errors are retried with backoff, and the call gives up with
+    AgentDeadlineExceeded once the invocation deadline (time.monotonic()) has passed.
+    Latency and estimated token counts of the call (retries included) go to metrics.
+    Returns the parsed JSON, or None if the output held no complete JSON value.
+    """
+    def invoke_once(attempt_session_id):
+        params = {
+            "agentId": AGENT_ID,
+            "agentAliasId": AGENT_ALIAS_ID,
+            "sessionId": attempt_session_id,
+            "inputText": payload
+        }
+        response = bedrock_agent_runtime.invoke_agent(**params)
+        chunks = []
+        json_stream = AgentJsonStream(expected_type, item_type)
+        for text in iter_completion_text(response):
+            chunks.append(text)
+            json_stream.feed(text)
+        return "".join(chunks).strip(), json_stream
+
+    started = time.perf_counter()
+    full_output, json_stream = call_agent_with_retries(invoke_once, session_id, deadline)
+    metrics.record_agent_call(
+        (time.perf_counter() - started) * 1000, estimate_tokens(payload), estimate_tokens(full_output)
+    )
+    logger.info("Raw agent response (%d chars): %s", len(full_output), summarize(full_output))
+    debug_sampled(logger, "Full agent response: %s", summarize(full_output))
+    try:
+        return json_stream.finish()
+    except ValueError:
+        return None
+
 
-    # First, write all mapped columns (standardized headers or self-mapped)
+def build_output_frame(mappings, input_data_df, defaults=None):
+    """
+    Build the output DataFrame: all standardized headers and all headers with data.
+    Columns are collected first and the frame is constructed once; mapped input columns
+    are passed through without copying and constant columns are broadcast at construction.
+    Empty or missing columns take their value from defaults (the template's compiled spec).
+    """
+    import pandas as pd
+
+    defaults = OUTPUT_COLUMN_DEFAULTS if defaults is None else defaults
+    columns = {}
+
+    # First, collect all mapped columns (standardized headers or self-mapped)
     for m in mappings:
         input_header = m.get("inputHeader", "").strip()
         mapped_header = m.get("mappedHeader", "").strip()
 
         # Determine final column name
         col_name = mapped_header if mapped_header else input_header
-        if not col_name or col_name in seen_mapped:
+        if not col_name or col_name in columns:
             continue
-        seen_mapped.add(col_name)
 
+        default = defaults.get(col_name, "")
         # Pull data from input if exists
         if input_header in input_data_df.columns:
             col_data = input_data_df[input_header]
-            # default values for special columns
-            if col_name == "customerCountryCode":
-                col_data = col_data.replace("", pd.NA).fillna("USA")
-            elif col_name == "currencyCode":
-                col_data = col_data.replace("", pd.NA).fillna("USD")
-            df_out[col_name] = col_data
+            if default:
+                col_data = col_data.where(col_data.notna() & (col_data != ""), default)
+            columns[col_name] = col_data
         else:
             # Placeholder or unmapped data
-            if col_name == "customerCountryCode":
-                df_out[col_name] = "USA"
-            elif col_name == "currencyCode":
-                df_out[col_name] = "USD"
-            else:
-                df_out[col_name] = ""
+            columns[col_name] = default
+
+    return pd.DataFrame(columns, index=input_data_df.index, copy=False)
+
+
+def create_output_excel(mappings, input_data_df):
+    """Ensure all standardized headers and all headers with data appear in output"""
+    df_out = build_output_frame(mappings, input_data_df)
 
     output_stream = BytesIO()
     df_out.to_excel(output_stream, index=False, engine="openpyxl")
@@ -414,122 +471,531 @@ def create_output_excel(mappings, input_data_df):
     return output_stream
 
 
+# ------------------- Streaming Ingestion (large CSV/TXT) -------------------
+
+class S3BodyStream(io.RawIOBase):
+    """Raw file-like view over an S3 StreamingBody so pandas can parse it without a full read()."""
+
+    def __init__(self, body, cancel_event=None):
+        self._body = body
+        self._cancel_event = cancel_event
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._cancel_event is not None and self._cancel_event.is_set():
+            raise StreamCancelled()
+        data = self._body.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._body.close()
+        super().close()
+
+
+class StreamCancelled(Exception):
+    """Raised inside the streaming reader once the pipeline has been cancelled."""
+
+
+def open_streaming_csv(s3_obj, cancel_event=None):
+    """Open a buffered stream over the S3 body and detect its delimiter from the first bytes."""
+    stream = io.BufferedReader(S3BodyStream(s3_obj['Body'], cancel_event), buffer_size=S3_READ_CHUNK_SIZE)
+    detected_delim = detect_file_delimiter(stream.peek(5000))
+    return stream, detected_delim
+
+
+def iter_csv_chunks(stream, delimiter, usecols=None):
+    """Yield all-string DataFrame chunks with normalized (stripped) headers."""
+    import pandas as pd
+
+    reader = pd.read_csv(
+        stream, delimiter=delimiter, dtype=str, keep_default_na=False,
+        usecols=usecols, chunksize=STREAMING_CHUNK_ROWS
+    )
+    for chunk in reader:
+        chunk.columns = [str(col).strip() for col in chunk.columns]
+        yield chunk
+
+
+def scan_streaming_headers(s3_obj, cancel_event=None):
+    """
+    First pass over a streamed CSV/TXT: extract headers and headers with data chunk by chunk.
+    A column drops out of the scan once a non-empty value is seen, and the pass stops as
+    soon as every column has data, so memory stays bounded by one chunk.
+    Returns (headers, headers_with_data).
+    """
+    stream, detected_delim = open_streaming_csv(s3_obj, cancel_event)
+    headers = []
+    pending = None
+    try:
+        for chunk in iter_csv_chunks(stream, detected_delim):
+            if pending is None:
+                headers = list(chunk.columns)
+                pending = set(range(len(headers)))
+            pending -= set(find_columns_with_data(chunk, sorted(pending)))
+            if not pending:
+                break
+    finally:
+        stream.close()
+
+    pending = pending or set()
+    headers_with_data = [col for i, col in enumerate(headers) if i not in pending]
+    logger.info("[INFO] Extracted %d headers: %s", len(headers), summarize(headers))
+    logger.info(f"Headers with data count: {len(headers_with_data)}")
+    return headers, headers_with_data
+
+
+def iter_streaming_input(mappings, bucket, key):
+    """
+    Second pass over a streamed CSV/TXT: yield only the mapped input columns chunk by chunk.
+    """
+    needed = {m.get("inputHeader", "").strip() for m in mappings} - {""}
+    s3_obj = s3.get_object(Bucket=bucket, Key=key)
+    stream, detected_delim = open_streaming_csv(s3_obj)
+    try:
+        yield from iter_csv_chunks(stream, detected_delim, usecols=lambda col: str(col).strip() in needed)
+    finally:
+        stream.close()
+
+
+def select_output_format(template_name, input_size):
+    """Output format for a file: per-template override, else OUTPUT_FORMAT; 'auto' picks by input size."""
+    output_format = OUTPUT_FORMAT_BY_TEMPLATE.get(template_name, OUTPUT_FORMAT)
+    if output_format == "auto":
+        output_format = "xlsx" if input_size <= AUTO_XLSX_MAX_INPUT_BYTES else "csv.gz"
+    if output_format not in OUTPUT_EXTENSIONS:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    return output_format
+
+
+def write_output(mappings, input_frames, bucket, output_key, output_format="xlsx", defaults=None):
+    """
+    Map each input frame and stream the rows into the output format, uploaded to S3 by
+    multipart upload, so neither the output file nor its bytes are held in memory as a whole.
+    Returns (rows written, bytes uploaded).
+    """
+    import pandas as pd
+
+    upload = S3MultipartWriter(s3, bucket, output_key)
+    try:
+        writer = open_output_writer(output_format, upload)
+        for input_frame in input_frames:
+            writer.write_frame(build_output_frame(mappings, input_frame, defaults))
+        if not writer.header_written:
+            # Header-only output still lists every output column
+            writer.write_frame(build_output_frame(mappings, pd.DataFrame(), defaults))
+        writer.close()
+        upload.close()
+    except Exception:
+        upload.abort()
+        raise
+    logger.info(f"Wrote {writer.rows_written} rows to {output_key}")
+    return writer.rows_written, upload.bytes_written
+
+
+# ------------------- Pipeline Stages -------------------
+
+def validate_file_name(file_name, template_name, deadline=None, metrics=NO_METRICS):
+    """
+    Check whether the file name belongs to the template: against the template's specification
+    file names locally, and/or by asking the agent (FILENAME_VALIDATION). Templates without
+    specification file names (none in the sheet, or compiled without the artifact) leave local
+    rejections to the agent. Returns None on invalid JSON.
+    """
+    if FILENAME_VALIDATION in ("local", "hybrid"):
+        spec = get_compiled_spec(template_name)
+        with metrics.stage("Validation"):
+            validation_result = spec.file_validator.validate(file_name)
+        logger.info(f"Local filename validation: {validation_result}")
+        if validation_result["Validation"] == "Success" or (FILENAME_VALIDATION == "local" and spec.file_names):
+            metrics.set_property("ValidationSource", "local")
+            return validation_result
+        if not spec.file_names:
+            logger.info(f"[INFO] No specification file names for {template_name}, asking the agent")
+
+    metrics.set_property("ValidationSource", "agent")
+    validation_payload = render_prompt("filename_validation", file_name=file_name, template=template_name)
+    with metrics.stage("Validation"):
+        validation_result = invoke_agent(
+            validation_payload, str(uuid.uuid4()), deadline=deadline, metrics=metrics, expected_type=dict
+        )
+    if not isinstance(validation_result, dict):
+        logger.error("Invalid JSON from agent in validation step")
+        return None
+    return validation_result
+
+
+def read_s3_body(s3_obj, cancel_event=None):
+    """Read an S3 object body, stopping early (returns None) once cancel_event is set."""
+    parts = []
+    for part in s3_obj['Body'].iter_chunks(chunk_size=S3_READ_CHUNK_SIZE):
+        if cancel_event is not None and cancel_event.is_set():
+            s3_obj['Body'].close()
+            return None
+        parts.append(part)
+    return b"".join(parts)
+
+
+def read_header_row(bucket, key, ext, metrics=NO_METRICS):
+    """
+    Header row of a CSV/TXT object from a ranged GET of its first HEADER_PROBE_BYTES, for template
+    detection before the full load. None for xls/xlsx, whose header row needs the whole file.
+    """
+    if ext not in ['.csv', '.txt']:
+        return None
+    with metrics.stage("HeaderProbe"):
+        try:
+            s3_obj = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{HEADER_PROBE_BYTES - 1}")
+            sample = s3_obj['Body'].read()
+        except Exception as e:
+            # e.g. InvalidRange on an empty object; detection then abstains
+            logger.error(f"[ERROR] Reading the header row of {key} failed: {e}")
+            return []
+    try:
+        delimiter = detect_file_delimiter(sample)
+    except ValueError:
+        delimiter = ","
+    row = next(csv.reader(io.StringIO(sample.decode("utf-8-sig", errors="ignore")), delimiter=delimiter), [])
+    if len(sample) >= HEADER_PROBE_BYTES and b"\n" not in sample:
+        # The row goes on past the probe: its last header may be cut off
+        row = row[:-1]
+    return [header.strip() for header in row if header.strip()]
+
+
+def load_input_file(bucket, key, ext, cancel_event=None, metrics=NO_METRICS):
+    """
+    Download the input file and find its headers and the headers with data.
+    Returns a dict with "headers", "headers_with_data" and the data source for the output pass,
+    or None if cancelled in between steps:
+      - "df": the parsed DataFrame (xls/xlsx, which have to be parsed whole anyway, and CSV/TXT
+        files the header scan already parsed whole)
+      - "file_bytes": the raw CSV/TXT, parsed again later for the mapped columns only
+      - neither, for streamed inputs whose rows are only read again by the output pass
+    Download, Parse and HeadersWithData stage times go to metrics.
+    """
+    s3_obj = s3.get_object(Bucket=bucket, Key=key)
+    loaded = {
+        "df": None, "file_bytes": None, "headers": [], "headers_with_data": [],
+        "size": s3_obj.get('ContentLength', 0)
+    }
+    metrics.set("BytesRead", loaded["size"])
+
+    if ext in ['.csv', '.txt'] and s3_obj.get('ContentLength', 0) > STREAMING_THRESHOLD_BYTES:
+        # Large delimited file: scan headers in a bounded pass, the output pass streams it again
+        logger.info(f"Streaming {key} ({s3_obj['ContentLength']} bytes) in chunks of {STREAMING_CHUNK_ROWS} rows")
+        try:
+            # Download and parsing overlap in the streaming scan, so it is timed as one stage
+            with metrics.stage("HeadersWithData"):
+                loaded["headers"], loaded["headers_with_data"] = scan_streaming_headers(s3_obj, cancel_event)
+        except StreamCancelled:
+            logger.info(f"Load of {key} cancelled during streaming scan")
+            return None
+        return None if cancel_event is not None and cancel_event.is_set() else loaded
+
+    with metrics.stage("Download"):
+        file_bytes = read_s3_body(s3_obj, cancel_event)
+    if file_bytes is None or (cancel_event is not None and cancel_event.is_set()):
+        logger.info(f"Load of {key} cancelled during download")
+        return None
+
+    if ext in ['.csv', '.txt']:
+        with metrics.stage("HeadersWithData"):
+            scanned = scan_headers_with_data(file_bytes, ext, cancel_event)
+        if scanned is None or (cancel_event is not None and cancel_event.is_set()):
+            logger.info(f"Load of {key} cancelled during header scan")
+            return None
+        loaded["headers"], loaded["headers_with_data"], loaded["df"] = scanned
+        if loaded["df"] is None:
+            loaded["file_bytes"] = file_bytes
+        return loaded
+
+    with metrics.stage("Parse"):
+        input_data_df, headers = load_file_once(file_bytes, ext)
+    del file_bytes
+    if cancel_event is not None and cancel_event.is_set():
+        logger.info(f"Load of {key} cancelled after parsing")
+        return None
+
+    loaded["df"] = input_data_df
+    loaded["headers"] = headers
+    if headers:
+        with metrics.stage("HeadersWithData"):
+            loaded["headers_with_data"] = extract_headers_with_data(input_data_df, headers)
+    return loaded
+
+
+def validate_and_load_concurrently(file_name, template_name, bucket, key, ext, deadline=None, metrics=NO_METRICS):
+    """
+    Run filename validation alongside download + parsing. As soon as validation fails
+    or raises, the load is cancelled and the handler returns without waiting for it.
+    Returns (validation_result, loaded) where loaded is None unless validation succeeded.
+    """
+    cancel_event = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        validation_future = executor.submit(validate_file_name, file_name, template_name, deadline, metrics)
+        load_future = executor.submit(load_input_file, bucket, key, ext, cancel_event, metrics)
+
+        validation_result = validation_future.result()
+        if not validation_result or validation_result.get("Validation") != "Success":
+            load_future.cancel()
+            return validation_result, None
+
+        return validation_result, load_future.result()
+    finally:
+        # Also when validation raised (agent error, deadline): a load still running is not needed.
+        # Once the load has returned, setting the event changes nothing.
+        cancel_event.set()
+        executor.shutdown(wait=False)
+
+
 # ------------------- Lambda Handler -------------------
 
+def extract_s3_records(event):
+    """
+    Flatten the event into (message_id, s3_record) pairs. S3 notifications delivered
+    directly have no message id; SQS messages are unwrapped into the S3 records they carry.
+    A message whose body is not an S3 notification comes back as (message_id, None).
+    """
+    s3_records = []
+    for record in event.get('Records', []):
+        if record.get('eventSource') == 'aws:sqs':
+            try:
+                message_records = json.loads(record['body']).get('Records', [])
+            except Exception as e:
+                logger.error(f"[ERROR] Unreadable SQS message {record.get('messageId')}: {e}")
+                s3_records.append((record.get('messageId'), None))
+                continue
+            # s3:TestEvent and other messages without records are skipped
+            for s3_record in message_records:
+                s3_records.append((record['messageId'], s3_record))
+        else:
+            s3_records.append((None, record))
+    return s3_records
+
+
 def lambda_handler(event, context):
+    """
+    Process every S3 record in the event on a bounded worker pool sharing the module's
+    boto3 clients. A single direct S3 record returns its own result as before; batches
+    return per-record results, and for SQS the messages of failed records are reported
+    in batchItemFailures so only those are retried.
+    Agent calls of every record share one deadline taken from the Lambda context.
+    """
+    deadline = deadline_from_context(context)
+    try:
+        s3_records = extract_s3_records(event)
+    except Exception as e:
+        logger.error(f"Error reading event records: {e}", exc_info=True)
+        return {'statusCode': 500, 'body': str(e)}
+
+    if len(s3_records) == 1 and s3_records[0][0] is None:
+        return process_record(s3_records[0][1], deadline)
+
+    def run_item(item):
+        message_id, s3_record = item
+        if s3_record is None:
+            # Reported in batchItemFailures like any failed record; the queue's redrive policy parks it
+            return {'statusCode': 500, 'body': f"Unreadable SQS message {message_id}"}
+        return process_record(s3_record, deadline)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(RECORD_WORKERS, len(s3_records)))) as executor:
+        results = list(executor.map(run_item, s3_records))
+
+    # Validation and file-type rejections (4xx) are final; only server-side failures are retried
+    failed_messages = []
+    for (message_id, _), result in zip(s3_records, results):
+        if message_id and result['statusCode'] >= 500 and message_id not in failed_messages:
+            failed_messages.append(message_id)
+
+    logger.info(f"Processed {len(results)} records, {sum(r['statusCode'] == 200 for r in results)} succeeded")
+    return {
+        'statusCode': 200 if all(r['statusCode'] == 200 for r in results) else 207,
+        'body': json.dumps(results),
+        'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failed_messages]
+    }
+
+
+def process_record(record, deadline=None):
+    """
+    Validate, map and write the output for one S3 object record; agent calls stop at deadline.
+    One metrics record with the stage timings of the file is emitted on every outcome.
+    """
+    metrics = FileMetrics()
+    result = {'statusCode': 500, 'body': 'Record not processed'}
+    try:
+        result = run_record_pipeline(record, deadline, metrics)
+        return result
+    finally:
+        metrics.emit(StatusCode=result['statusCode'])
+
+
+def run_record_pipeline(record, deadline, metrics):
     try:
-        record = event['Records'][0]
         bucket = record['s3']['bucket']['name']
         key = urllib.parse.unquote_plus(record['s3']['object']['key'])
         file_name = os.path.basename(key)
-        template_name = HARD_CODED_TEMPLATE
+        metrics.set_property("Bucket", bucket)
+        metrics.set_property("FileKey", key)
 
         logger.info(f"Triggered by file: {key} in bucket: {bucket}")
 
-        # Step 0: Validate file via agent
-        validation_payload = f"File Name: {file_name}\nTemplate: {template_name}\n{AGENT_FILENAME_VALIDATION_PROMPT}"
-        validation_response = invoke_agent(validation_payload, str(uuid.uuid4()))
-        try:
-            validation_result = json.loads(validation_response)
-        except json.JSONDecodeError:
-            logger.error("Invalid JSON from agent in validation step")
-            return {'statusCode': 500, 'body': 'Invalid JSON from agent'}
-
-        if validation_result.get("Validation") != "Success":
-            logger.error(f"File validation failed for {file_name}.")
-            return {'statusCode': 400, 'body': f"File validation failed for {file_name}"}
-
-        # Step 1: Load file
         _, ext = os.path.splitext(key)
         ext = ext.lower()
         if ext not in ['.csv', '.xls', '.xlsx', '.txt']:
             return {'statusCode': 400, 'body': f"Unsupported file type {ext}"}
 
-        s3_obj = s3.get_object(Bucket=bucket, Key=key)
-        file_bytes = s3_obj['Body'].read()
-        input_data_df, headers = load_file_once(file_bytes, ext)
-        if not headers:
-            return {'statusCode': 400, 'body': 'No headers extracted'}
-
-        # Step 2: Extract headers with actual data
-        headers_with_data = extract_headers_with_data(input_data_df, headers)
-        logger.info(f"Headers with data: {headers_with_data}")
-
-        # Step 3: Invoke agent for header mapping
-        mapping_payload = (
-            f"Template: {template_name}\n"
-            f"Input headers: {json.dumps(headers)}\n"
-            f"Input headers with data: {json.dumps(headers_with_data)}\n"
-            f"{AGENT_HEADER_MAPPING_PROMPT}"
+        template_name, template_source = route_template(
+            s3, bucket, key, use_default=TEMPLATE_DETECTION not in ("fallback", "verify")
         )
+        loaded = None
+        if template_name is None and TEMPLATE_DETECTION in ("fallback", "verify"):
+            # No route for the key: narrow the templates by file name, then detect from the header row
+            # only, so validation and the full load below still overlap and a rejection skips the download
+            candidates = templates_for_file_name(file_name)
+            named = bool(candidates)
+            if not candidates and FILENAME_VALIDATION == "local":
+                # Only templates without specification file names are left, for the agent to validate
+                candidates = templates_without_file_names()
+                if not candidates:
+                    logger.error(f"File validation failed for {file_name}: no template has a matching file name.")
+                    return {'statusCode': 400, 'body': f"File validation failed for {file_name}"}
+            if named and len(candidates) == 1:
+                template_name, template_source = candidates[0], "filename"
+            else:
+                headers = read_header_row(bucket, key, ext, metrics)
+                if headers is None:
+                    # xls/xlsx: loaded whole once here and reused below
+                    loaded = load_input_file(bucket, key, ext, metrics=metrics)
+                    headers = loaded["headers"]
+                guess = detect_template(headers, templates=candidates or None)
+                metrics.set_property("DetectedTemplate", guess["template"])
+                template_name, template_source = guess["template"], "headers"
+                if template_name is None and DEFAULT_TEMPLATE and (not candidates or DEFAULT_TEMPLATE in candidates):
+                    template_name, template_source = DEFAULT_TEMPLATE, "default"
+                if template_name is None:
+                    return {'statusCode': 400, 'body': f"No template detected for {key}: {json.dumps(guess)}"}
+        if template_name is None:
+            return {'statusCode': 400, 'body': f"No template configured for {key}"}
+        metrics.template_name = template_name
+        metrics.set_property("TemplateSource", template_source)
+        spec = get_compiled_spec(template_name)
+        metrics.set_property("SpecVersion", spec.version)
+
+        # Step 0 + 1 + 2: Validate file via agent, load file and extract headers with actual data.
+        # Validation that stays local takes microseconds, so the load only overlaps an agent call
+        # and a rejected name never starts the download.
+        if loaded is not None:
+            validation_result = validate_file_name(file_name, template_name, deadline, metrics)
+        elif CONCURRENT_STAGES and (FILENAME_VALIDATION != "local" or not spec.file_names):
+            validation_result, loaded = validate_and_load_concurrently(
+                file_name, template_name, bucket, key, ext, deadline, metrics
+            )
+        else:
+            validation_result = validate_file_name(file_name, template_name, deadline, metrics)
+            if validation_result and validation_result.get("Validation") == "Success":
+                loaded = load_input_file(bucket, key, ext, metrics=metrics)
 
-        logger.info(f"Sending payload to agent:\n{mapping_payload.encode('unicode_escape').decode()}")
-        mapping_response = invoke_agent(mapping_payload, str(uuid.uuid4()))
-        try:
-            mappings = json.loads(mapping_response)
-        except json.JSONDecodeError:
-            logger.error("Invalid JSON from agent in mapping step")
+        if validation_result is None:
             return {'statusCode': 500, 'body': 'Invalid JSON from agent'}
+        if validation_result.get("Validation") != "Success":
+            logger.error(f"File validation failed for {file_name}.")
+            return {'statusCode': 400, 'body': f"File validation failed for {file_name}"}
 
-        logger.info(f"Parsed {len(mappings)} mappings")
-
-        # Step 4: Post-processing corrected mappings
-        # --- Post-processing of agent mappings ---
-        corrected_mappings = []
-        seen_input_headers = set()
-        seen_mapped_headers = set()
-
-        # Step 1: Keep valid agent mappings
-        for m in mappings:
-            input_header = m.get("inputHeader", "").strip()
-            mapped_header = m.get("mappedHeader", "").strip()
-
-            # Skip only if both inputHeader and mappedHeader are empty
-            # AND inputHeader is not in headers_with_data
-            if not input_header and not mapped_header:
-                continue
-            if input_header and input_header not in headers_with_data and not mapped_header:
-                continue
-
-            # Skip duplicates
-            if mapped_header and mapped_header in seen_mapped_headers:
-                continue
-            if input_header and input_header in seen_input_headers:
-                continue
+        headers, headers_with_data = loaded["headers"], loaded["headers_with_data"]
+        if not headers:
+            return {'statusCode': 400, 'body': 'No headers extracted'}
 
-            corrected_mappings.append(m)
-            if input_header:
-                seen_input_headers.add(input_header)
-            if mapped_header:
-                seen_mapped_headers.add(mapped_header)
-
-        # Step 2: Add missing headers with data (not present in agent output)
-        for h in headers_with_data:
-            if h not in seen_input_headers:
-                corrected_mappings.append({
-                    "inputHeader": h,
-                    "mappedHeader": "",
-                    "confidenceScore": 0
-                })
-                seen_input_headers.add(h)
+        if TEMPLATE_DETECTION == "verify" and template_source != "headers":
+            # A file routed to the wrong template is rejected before the mapping call
+            guess = detect_template(headers)
+            metrics.set_property("DetectedTemplate", guess["template"])
+            if guess["template"] is not None and guess["template"] != template_name:
+                logger.error(f"Headers of {file_name} match template {guess['template']}, not {template_name}")
+                return {'statusCode': 400, 'body': f"Headers of {file_name} match template {guess['template']}, "
+                                                   f"not {template_name}: {json.dumps(guess)}"}
+        logger.info("Headers with data: %s", summarize(headers_with_data))
+        metrics.set("InputColumns", len(headers))
+        metrics.set("HeadersWithData", len(headers_with_data))
+
+        # Step 3: Reuse cached mappings for a known header signature
+        with metrics.stage("Mapping"):
+            cache_key = mapping_cache_key(template_name, AGENT_ALIAS_ID, headers, headers_with_data)
+            corrected_mappings = get_cached_mappings(cache_key)
+            metrics.set_property("MappingSource", "cache")
+
+            if corrected_mappings is None:
+                # Resolve headers from the local alias index, invoke agent only if needed
+                mappings, unresolved_headers = resolve_headers_locally(
+                    headers, headers_with_data, template_name, index=spec.alias_index, spec_fields=spec.spec_fields,
+                    matcher=spec.matcher,
+                )
+                if mappings is not None:
+                    logger.info("All headers resolved from local alias index, skipping agent mapping call")
+                    metrics.set_property("MappingSource", "local")
+                else:
+                    mapping_payload = render_prompt(
+                        "header_mapping", template=template_name, headers=headers, headers_with_data=headers_with_data
+                    )
+
+                    logger.info("Sending mapping payload to agent: %s", summarize(mapping_payload))
+                    debug_sampled(logger, "Full mapping payload: %s", summarize(mapping_payload))
+                    metrics.set_property("MappingSource", "agent")
+                    mappings = invoke_agent(
+                        mapping_payload, str(uuid.uuid4()), deadline=deadline, metrics=metrics,
+                        expected_type=list, item_type=dict,
+                    )
+                    if not isinstance(mappings, list):
+                        logger.error("Invalid JSON from agent in mapping step")
+                        return {'statusCode': 500, 'body': 'Invalid JSON from agent'}
+
+                logger.info(f"Parsed {len(mappings)} mappings")
+
+                # Step 4: Enforce the spec and data checklists locally (order, placeholders, duplicates)
+                corrected_mappings, _ = MappingReconciler(
+                    headers, headers_with_data, spec_fields=spec.spec_fields
+                ).reconcile(mappings)
+                put_cached_mappings(cache_key, corrected_mappings)
 
         logger.info(f"Corrected mappings count: {len(corrected_mappings)}")
 
-        # Step 5: Generate output Excel
-        output_stream = create_output_excel(corrected_mappings, input_data_df)
+        # Step 5: Generate output file
+        output_format = select_output_format(template_name, loaded["size"])
+        metrics.set_property("OutputFormat", output_format)
         base_name = os.path.basename(key)
         name_split = base_name.rsplit('.', 1)
         # output_file = f"{name_split[0]}_final.{name_split[1]}" if len(name_split) == 2 else f"{base_name}_final.xlsx"
         # output_key = f"output/{output_file}"
-        # Always save as .xlsx regardless of input
-        output_file = f"{name_split[0]}_final.xlsx"
+        # Output extension follows the selected output format regardless of input
+        output_file = f"{name_split[0]}_final{OUTPUT_EXTENSIONS[output_format]}"
         output_key = f"output/{output_file}"
 
-        s3.put_object(Bucket=bucket, Key=output_key, Body=output_stream.getvalue())
+        with metrics.stage("Output"):
+            if loaded["df"] is None and loaded["file_bytes"] is None:
+                input_frames = iter_streaming_input(corrected_mappings, bucket, key)
+            else:
+                input_data_df = loaded["df"]
+                if input_data_df is None:
+                    input_data_df = load_mapped_columns(loaded["file_bytes"], ext, headers, corrected_mappings)
+                input_frames = [input_data_df]
+            rows_written, bytes_written = write_output(
+                corrected_mappings, input_frames, bucket, output_key, output_format, spec.defaults
+            )
+        metrics.set("Rows", rows_written)
+        metrics.set("BytesWritten", bytes_written)
+        output_columns = {
+            m.get("mappedHeader", "").strip() or m.get("inputHeader", "").strip() for m in corrected_mappings
+        }
+        metrics.set("OutputColumns", len(output_columns - {""}))
         logger.info(f"Output saved to {output_key}")
 
         return {'statusCode': 200, 'body': f"Processed {key}, output saved to {output_key}"}
 
+    except AgentDeadlineExceeded as e:
+        logger.error(f"Agent call timed out: {e}")
+        return {'statusCode': 504, 'body': str(e)}
     except Exception as e:
         logger.error(f"Error processing file: {e}", exc_info=True)
         return {'statusCode': 500, 'body': str(e)}
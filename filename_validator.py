@@ -0,0 +1,149 @@
+import datetime
+import fnmatch
+import json
+import os
+import re
+import threading
+
+# "local": validate file names against the 'Agent File Specification' names without the agent,
+# "hybrid": ask the agent only about names the local rules reject, "agent": always ask the agent
+FILENAME_VALIDATION = os.environ.get("FILENAME_VALIDATION", "local").lower()
+# Extra file name rules per template on top of the sheet, e.g. {"A8": ["feed_*.csv", "re:^dlr\\d+\\.csv$"]}
+FILENAME_RULES = json.loads(os.environ.get("FILENAME_RULES", "{}"))
+# Answers remembered per validator (the same names arrive again and again)
+FILENAME_RESULT_CACHE_SIZE = 4096
+
+REGEX_RULE_PREFIX = "re:"
+GLOB_CHARS = ("*", "?", "[")
+
+_MONTHS = (
+    "january|february|march|april|may|june|july|august|september|october|november|december|"
+    "jan|feb|mar|apr|jun|jul|aug|sep|oct|nov|dec"
+)
+# Date stamps recognized in specification file names: (pattern, strptime formats with {sep} for the
+# separator group). The stamp becomes a slot that takes any valid date in one of the formats that
+# parse the stamp of the specification name ('hyundai_b2b_20250911.csv' -> hyundai_b2b_<%Y%m%d>.csv)
+DATE_STAMPS = (
+    (re.compile(r"(?<!\d)\d{4}([.\-_])\d{2}\1\d{2}(?!\d)"), ("%Y{sep}%m{sep}%d",)),
+    (
+        re.compile(r"(?<!\d)\d{1,2}([.\-_])\d{1,2}\1(?:\d{4}|\d{2})(?!\d)"),
+        ("%m{sep}%d{sep}%y", "%m{sep}%d{sep}%Y", "%d{sep}%m{sep}%y", "%d{sep}%m{sep}%Y"),
+    ),
+    (re.compile(r"(?<!\d)\d{8}(?!\d)"), ("%Y%m%d", "%m%d%Y", "%d%m%Y")),
+    (
+        re.compile(rf"(?<![a-z])(?:{_MONTHS})([ _\-]?)(?:\d{{4}}|\d{{2}})(?!\d)", re.IGNORECASE),
+        ("%B{sep}%Y", "%b{sep}%Y", "%B{sep}%y", "%b{sep}%y"),
+    ),
+)
+
+
+def _parses(text, fmt):
+    try:
+        datetime.datetime.strptime(text, fmt)
+        return True
+    except ValueError:
+        return False
+
+
+def _date_slot_pattern(stamp, separator):
+    """Regex for any stamp of the same shape: digits stay digits, a month name any month name."""
+    if stamp[0].isalpha():
+        sep = re.escape(separator)
+        return rf"(?:{_MONTHS}){sep}\d{{{len(stamp) - len(stamp.rstrip('0123456789'))}}}"
+    return "".join(r"\d" if c.isdigit() else re.escape(c) for c in stamp)
+
+
+def compile_file_name_rule(spec_name):
+    """
+    A rule for one 'File Name' cell: {"name", "kind", "regex", "date_formats"}.
+    kind is "regex" ('re:' prefix), "glob" (*, ? or [ in the name), "date" (the name holds date
+    stamps; date_formats lists the accepted formats per stamp) or "exact". Matching ignores case.
+    """
+    if spec_name.startswith(REGEX_RULE_PREFIX):
+        return {"name": spec_name, "kind": "regex", "date_formats": [],
+                "regex": re.compile(spec_name[len(REGEX_RULE_PREFIX):], re.IGNORECASE)}
+    if any(c in spec_name for c in GLOB_CHARS):
+        return {"name": spec_name, "kind": "glob", "date_formats": [],
+                "regex": re.compile(fnmatch.translate(spec_name), re.IGNORECASE)}
+
+    stamps = []  # (start, end, formats)
+    for pattern, formats in DATE_STAMPS:
+        for match in pattern.finditer(spec_name):
+            if any(start < match.end() and match.start() < end for start, end, _ in stamps):
+                continue
+            separator = match.group(1) if pattern.groups else ""
+            parsed = [f.format(sep=separator) for f in formats if _parses(match.group(0), f.format(sep=separator))]
+            # 'July 2025' in the sheet also admits 'Aug 2025', and the other way round
+            parsed += [f.replace("%B", "%b") for f in parsed if "%B" in f]
+            parsed += [f.replace("%b", "%B") for f in parsed if "%b" in f]
+            parsed = list(dict.fromkeys(parsed))
+            if parsed:
+                stamps.append((match.start(), match.end(), parsed))
+    stamps.sort()
+
+    parts, position = [], 0
+    for start, end, formats in stamps:
+        stamp = spec_name[start:end]
+        separator = next((c for c in stamp if not c.isalnum()), "")
+        parts.append(re.escape(spec_name[position:start]))
+        parts.append(f"({_date_slot_pattern(stamp, separator)})")
+        position = end
+    parts.append(re.escape(spec_name[position:]))
+    return {
+        "name": spec_name,
+        "kind": "date" if stamps else "exact",
+        "regex": re.compile("".join(parts), re.IGNORECASE),
+        "date_formats": [formats for _, _, formats in stamps],
+    }
+
+
+def rule_matches(rule, file_name):
+    match = rule["regex"].fullmatch(file_name)
+    if match is None:
+        return False
+    return all(
+        any(_parses(stamp, fmt) for fmt in formats)
+        for stamp, formats in zip(match.groups(), rule["date_formats"])
+    )
+
+
+class FileNameValidator:
+    """
+    Local stand-in for the filename validation agent call of one template: a file name is valid
+    when it equals (ignoring case) or matches one of the template's 'Agent File Specification'
+    file names, read as exact names, date-stamped names, globs or 're:' regexes.
+    """
+
+    def __init__(self, spec_names):
+        self.rules = [compile_file_name_rule(name.strip()) for name in spec_names if name and name.strip()]
+        self._exact = {rule["name"].casefold(): rule["name"] for rule in self.rules if rule["kind"] != "regex"}
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, file_name):
+        """The specification file name that file_name matches, or None."""
+        spec_name = self._exact.get(file_name.casefold())
+        if spec_name is not None:
+            return spec_name
+        return next((rule["name"] for rule in self.rules if rule_matches(rule, file_name)), None)
+
+    def validate(self, file_name):
+        """The filename validation answer in the agent's format."""
+        result = self._results.get(file_name)
+        if result is not None:
+            return result
+
+        spec_name = self.match(file_name)
+        result = {
+            "Validation": "Success" if spec_name else "Failed",
+            "InputFileName": file_name,
+            "SpecifcationFileName": spec_name or "",
+        }
+        with self._lock:
+            if len(self._results) >= FILENAME_RESULT_CACHE_SIZE:
+                self._results.clear()
+            self._results[file_name] = result
+        return result
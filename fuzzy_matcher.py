@@ -0,0 +1,254 @@
+import functools
+import os
+import re
+import threading
+from collections import defaultdict
+
+from alias_index import FUZZY_MATCH_SCORE, header_key, match_header, normalize_header
+
+# Lowest similarity (0-1) accepted as a fuzzy match at confidenceScore 80. Calibrated with
+# benchmarks/calibrate_fuzzy.py: wrong-field matches stay under 1% from 0.82 up (2.2% at 0.80),
+# 0.84 keeps one step of margin at ~79% recall on misspelled/abbreviated aliases
+FUZZY_MATCH_THRESHOLD = float(os.environ.get("FUZZY_MATCH_THRESHOLD", 0.84))
+# A runner-up field scoring within this margin of the best makes the header ambiguous (left to the agent)
+FUZZY_AMBIGUITY_MARGIN = float(os.environ.get("FUZZY_AMBIGUITY_MARGIN", 0.04))
+# Candidates taken from the n-gram index, by n-gram overlap, before the finer scoring
+FUZZY_CANDIDATES = int(os.environ.get("FUZZY_CANDIDATES", 6))
+NGRAM_SIZE = 3
+NGRAM_MIN_DICE = 0.3
+# N-grams found in more than this share of the aliases carry little signal and are not looked up
+NGRAM_MAX_POSTING_SHARE = 0.05
+# Lowest score the edit distance is computed exactly for, unless the caller sets a higher one
+EDIT_RATIO_FLOOR = 0.6
+# Headers whose result is remembered per matcher (headers repeat across files of a feed)
+FUZZY_RESULT_CACHE_SIZE = 4096
+
+
+def ngrams(key):
+    """Character n-grams of a header key, with boundary markers so short keys still have some."""
+    padded = f"#{key}#"
+    return {padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)}
+
+
+DIGITS_PATTERN = re.compile(r"\d+")
+# Words that tell sibling fields apart (customerFirstName / customerLastName); a header and an
+# alias that disagree on any of them are never similar, however close the rest of the text is
+SIBLING_MARKERS = ("first", "last", "middle", "fname", "lname", "home", "work", "mobile", "cell")
+
+
+def edit_ratio(a, b, floor=0.0):
+    """
+    1 - Levenshtein distance / length of the longer string, or 0.0 when that is below floor.
+    The distance is computed bit-parallel (Hyyro's variant of Myers' algorithm): one column of
+    the edit matrix per character of the longer string, as a few integer operations.
+    """
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    if len(a) < len(b):
+        a, b = b, a
+    max_distance = int((1.0 - floor) * len(a) + 1e-9)
+    if max_distance == 0 or len(a) - len(b) > max_distance:
+        return 0.0
+
+    # Bit i of match_masks[c] is set where b[i] == c; column i of the matrix is bit i
+    match_masks = {}
+    for i, char_b in enumerate(b):
+        match_masks[char_b] = match_masks.get(char_b, 0) | (1 << i)
+    all_bits = (1 << len(b)) - 1
+    last_bit = 1 << (len(b) - 1)
+    positive, negative = all_bits, 0  # vertical +1/-1 deltas
+    distance = len(b)
+    for char_a in a:
+        match = match_masks.get(char_a, 0)
+        x_vertical = match | negative
+        x_horizontal = (((match & positive) + positive) ^ positive) | match
+        h_positive = negative | ~(x_horizontal | positive)
+        h_negative = positive & x_horizontal
+        if h_positive & last_bit:
+            distance += 1
+        elif h_negative & last_bit:
+            distance -= 1
+        h_positive = (h_positive << 1) | 1
+        h_negative <<= 1
+        positive = (h_negative | ~(x_vertical | h_positive)) & all_bits
+        negative = h_positive & x_vertical & all_bits
+    return 1.0 - distance / len(a) if distance <= max_distance else 0.0
+
+
+@functools.lru_cache(maxsize=65536)
+def _token_similarity(a, b):
+    if a == b:
+        return 1.0
+    # Abbreviations: 'cust' for 'customer', 'addr' for 'address'
+    short, long = (a, b) if len(a) <= len(b) else (b, a)
+    if 3 <= len(short) <= 5 and len(long) >= len(short) + 2 and long.startswith(short) and short.isalpha():
+        return 0.85
+    return edit_ratio(a, b, floor=0.8)
+
+
+def token_set_similarity(tokens_a, tokens_b):
+    """Dice coefficient of two token lists, where tokens match exactly, by prefix or by small typos."""
+    if not tokens_a or not tokens_b:
+        return 0.0
+    shorter, longer = (tokens_a, tokens_b) if len(tokens_a) <= len(tokens_b) else (tokens_b, tokens_a)
+    remaining = list(longer)
+    matched = 0.0
+    for token in shorter:
+        best, best_idx = 0.0, None
+        for idx, other in enumerate(remaining):
+            similarity = _token_similarity(token, other)
+            if similarity > best:
+                best, best_idx = similarity, idx
+        if best_idx is not None:
+            matched += best
+            remaining.pop(best_idx)
+    return 2 * matched / (len(tokens_a) + len(tokens_b))
+
+
+def similarity(key, tokens, alias_key, alias_tokens, floor=EDIT_RATIO_FLOOR):
+    """
+    Header similarity (0-1): the better of token-set and whole-key edit similarity.
+    Numbers and SIBLING_MARKERS must agree. An edit similarity below floor is not computed,
+    so scores under floor may come out lower than they are.
+    """
+    if DIGITS_PATTERN.findall(key) != DIGITS_PATTERN.findall(alias_key):
+        return 0.0
+    if any((marker in key) != (marker in alias_key) for marker in SIBLING_MARKERS):
+        return 0.0
+    token_score = token_set_similarity(tokens, alias_tokens)
+    if token_score >= 1.0:
+        return token_score
+    # The edit distance only matters when it can beat the token score
+    return max(token_score, edit_ratio(key, alias_key, floor=max(floor, token_score)))
+
+
+class FuzzyHeaderMatcher:
+    """
+    Local header matcher over the alias index of one template, in the agent's confidence bands:
+      - 100: the header is an alias verbatim
+      - 80: same header key ('Dealer_No' == 'Dealer No'), or a fuzzy match at or above
+        FUZZY_MATCH_THRESHOLD ('Dealr Number', 'Cust Last Name')
+      - 0: unknown, ambiguous, or best fuzzy score below the threshold
+    Fuzzy candidates come from a character n-gram inverted index over the alias keys and are
+    ranked by the better of token-set and edit-distance similarity. N-grams shared by more
+    than NGRAM_MAX_POSTING_SHARE of the aliases are skipped while a query has rarer ones.
+    """
+
+    def __init__(self, alias_index):
+        self.alias_index = alias_index
+        self._aliases = []  # (key, tokens, mapped header)
+        self._postings = defaultdict(list)
+        self._ngram_counts = []
+        seen = set()
+        for alias, mapped_header in alias_index["exact"].items():
+            key = header_key(alias)
+            if not mapped_header or not key or (key, mapped_header) in seen:
+                continue
+            seen.add((key, mapped_header))
+            alias_id = len(self._aliases)
+            grams = ngrams(key)
+            self._aliases.append((key, normalize_header(alias).split(), mapped_header))
+            self._ngram_counts.append(len(grams))
+            for gram in grams:
+                self._postings[gram].append(alias_id)
+        self._max_posting = max(int(len(self._aliases) * NGRAM_MAX_POSTING_SHARE), 50)
+        self._arrays = None
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._aliases)
+
+    def _posting_arrays(self):
+        """
+        The postings and n-gram counts as numpy arrays, built on the first fuzzy lookup (after
+        the input file is parsed, so numpy is loaded by then and not on the early rejection path).
+        """
+        if self._arrays is None:
+            import numpy as np
+
+            with self._lock:
+                if self._arrays is None:
+                    postings = {gram: np.array(ids, dtype=np.int64) for gram, ids in self._postings.items()}
+                    self._arrays = (postings, np.array(self._ngram_counts, dtype=np.int64))
+        return self._arrays
+
+    def candidates(self, header, limit=None, min_score=EDIT_RATIO_FLOOR):
+        """
+        [(similarity, alias key, mapped header)] best first, for the fuzzy stage. Similarities
+        below min_score are only lower bounds (see similarity).
+        """
+        import numpy as np
+
+        key = header_key(header)
+        if not key:
+            return []
+        grams = ngrams(key)
+        posting_arrays, sizes = self._posting_arrays()
+        postings = [posting_arrays[gram] for gram in grams if gram in posting_arrays]
+        if not postings:
+            return []
+        rare = [posting for posting in postings if len(posting) <= self._max_posting]
+        overlaps = np.bincount(np.concatenate(rare or postings), minlength=len(self._aliases))
+
+        # Dice of the n-gram sets, counting skipped common n-grams as shared by every alias
+        skipped = len(postings) - len(rare) if rare else 0
+        totals = len(grams) + sizes
+        # Dice >= NGRAM_MIN_DICE as a bound on the overlap: 2 * (overlap + skipped) >= NGRAM_MIN_DICE * (query + alias)
+        half_min = NGRAM_MIN_DICE / 2
+        alias_ids = np.flatnonzero((overlaps > 0) & (overlaps + skipped >= half_min * totals))
+        dice = 2 * (overlaps[alias_ids] + skipped) / totals[alias_ids]
+        # Best first, ties to the later alias
+        order = np.lexsort((alias_ids, dice))[::-1][:limit or FUZZY_CANDIDATES]
+        shortlisted = zip(dice[order].tolist(), alias_ids[order].tolist())
+
+        tokens = normalize_header(header).split()
+        scored = []
+        for dice, alias_id in shortlisted:
+            alias_key, alias_tokens, mapped_header = self._aliases[alias_id]
+            scored.append((similarity(key, tokens, alias_key, alias_tokens, min_score), alias_key, mapped_header))
+        scored.sort(reverse=True)
+        return scored
+
+    def rank_fields(self, header, min_score=EDIT_RATIO_FLOOR):
+        """[(mapped header, best similarity of its aliases)] best first; exact from min_score up."""
+        best = {}
+        for similarity, _, mapped_header in self.candidates(header, min_score=min_score):
+            best.setdefault(mapped_header, similarity)
+        return sorted(best.items(), key=lambda item: -item[1])
+
+    def fuzzy_match(self, header, threshold=None):
+        """(mapped header, similarity) of the best fuzzy candidate, or (None, similarity) if ambiguous or too weak."""
+        threshold = FUZZY_MATCH_THRESHOLD if threshold is None else threshold
+        # Scores under threshold - margin can neither be accepted nor make the best one ambiguous
+        ranked = self.rank_fields(header, min_score=threshold - FUZZY_AMBIGUITY_MARGIN)
+        if not ranked:
+            return None, 0.0
+        mapped_header, similarity = ranked[0]
+        if len(ranked) > 1 and ranked[1][1] >= similarity - FUZZY_AMBIGUITY_MARGIN:
+            return None, similarity
+        if similarity < threshold:
+            return None, similarity
+        return mapped_header, similarity
+
+    def match(self, header):
+        """Return (mappedHeader, confidenceScore) for an input header, like alias_index.match_header."""
+        result = self._results.get(header)
+        if result is not None:
+            return result
+
+        mapped_header, score = match_header(header, self.alias_index)
+        if not mapped_header and header not in self.alias_index["exact"] \
+                and header_key(header) not in self.alias_index["normalized"]:
+            # Headers that are ambiguous aliases (verbatim or by key) stay with the agent
+            mapped_header, _ = self.fuzzy_match(header)
+            score = FUZZY_MATCH_SCORE if mapped_header else 0
+        result = (mapped_header, score)
+
+        with self._lock:
+            if len(self._results) >= FUZZY_RESULT_CACHE_SIZE:
+                self._results.clear()
+            self._results[header] = result
+        return result
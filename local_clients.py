@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+from template_specs import get_compiled_spec
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Local S3 root: one directory per bucket, object keys are relative paths inside it
+LOCAL_S3_ROOT = os.environ.get("LOCAL_S3_ROOT", os.path.join(tempfile.gettempdir(), "local-s3"))
+
+# Local agent behaviour
+LOCAL_AGENT_LATENCY_MS = float(os.environ.get("LOCAL_AGENT_LATENCY_MS", 0))
+LOCAL_AGENT_CHUNK_BYTES = int(os.environ.get("LOCAL_AGENT_CHUNK_BYTES", 64))
+LOCAL_AGENT_THROTTLE_RATE = float(os.environ.get("LOCAL_AGENT_THROTTLE_RATE", 0))
+
+
+class LocalClientError(Exception):
+    """Shaped like botocore's ClientError: the error code is in response["Error"]["Code"]."""
+
+    def __init__(self, code, message, operation_name):
+        super().__init__(f"An error occurred ({code}) when calling the {operation_name} operation: {message}")
+        self.response = {"Error": {"Code": code, "Message": message}}
+        self.operation_name = operation_name
+
+
+class _LocalS3Exceptions:
+    class NoSuchKey(LocalClientError):
+        pass
+
+    class NoSuchUpload(LocalClientError):
+        pass
+
+
+# -------------------------------
+# Filesystem-backed S3
+# -------------------------------
+class LocalStreamingBody:
+    """The parts of botocore's StreamingBody the handlers use, over a local file."""
+
+    def __init__(self, path, start=0, length=None):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        # Bytes left in a ranged GET, None for the whole object
+        self._remaining = length
+
+    def read(self, amt=None):
+        if self._remaining is not None:
+            amt = self._remaining if amt is None or amt < 0 else min(amt, self._remaining)
+            self._remaining -= amt
+        return self._file.read() if amt is None or amt < 0 else self._file.read(amt)
+
+    def iter_chunks(self, chunk_size=1024):
+        try:
+            while True:
+                chunk = self.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self._file.close()
+
+    def close(self):
+        self._file.close()
+
+
+class LocalS3Client:
+    """
+    In-process S3 stand-in storing objects as files under root/<bucket>/<key>.
+    Supports the calls the handlers make: get/put/head/delete object, list_objects_v2
+    and multipart uploads (parts are kept under root/.multipart/<upload id>/).
+    """
+
+    exceptions = _LocalS3Exceptions
+
+    def __init__(self, root=None):
+        self.root = root or LOCAL_S3_ROOT
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, bucket, key):
+        path = os.path.normpath(os.path.join(self.root, bucket, key))
+        if not path.startswith(os.path.normpath(os.path.join(self.root, bucket)) + os.sep):
+            raise LocalClientError("InvalidObjectName", f"Key escapes the bucket: {key}", "PutObject")
+        return path
+
+    def _write_atomic(self, path, write):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        data = Body.encode("utf-8") if isinstance(Body, str) else Body
+        if hasattr(data, "read"):
+            data = data.read()
+        self._write_atomic(self._path(Bucket, Key), lambda f: f.write(data))
+        return {"ETag": f'"{uuid.uuid4().hex}"'}
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise self.exceptions.NoSuchKey("NoSuchKey", "The specified key does not exist.", "GetObject")
+        size = os.path.getsize(path)
+        if Range:
+            # "bytes=<first>-<last>", clipped to the object like S3 does
+            first, last = (int(n) for n in Range[len("bytes="):].split("-"))
+            length = max(0, min(last, size - 1) - first + 1)
+            return {"Body": LocalStreamingBody(path, first, length), "ContentLength": length, "Metadata": {}}
+        return {"Body": LocalStreamingBody(path), "ContentLength": size, "Metadata": {}}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise LocalClientError("404", "Not Found", "HeadObject")
+        return {"ContentLength": os.path.getsize(path), "Metadata": {}}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        path = self._path(Bucket, Key)
+        if os.path.isfile(path):
+            os.remove(path)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix="", **kwargs):
+        bucket_dir = os.path.join(self.root, Bucket)
+        contents = []
+        for dir_path, _, file_names in os.walk(bucket_dir):
+            for name in file_names:
+                key = os.path.relpath(os.path.join(dir_path, name), bucket_dir).replace(os.sep, "/")
+                if key.startswith(Prefix) and not key.endswith(".tmp"):
+                    contents.append({"Key": key, "Size": os.path.getsize(os.path.join(dir_path, name))})
+        contents.sort(key=lambda item: item["Key"])
+        return {"Contents": contents, "KeyCount": len(contents), "IsTruncated": False}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.root, ".multipart", upload_id))
+        return {"Bucket": Bucket, "Key": Key, "UploadId": upload_id}
+
+    def _upload_dir(self, upload_id):
+        upload_dir = os.path.join(self.root, ".multipart", upload_id)
+        if not os.path.isdir(upload_dir):
+            raise self.exceptions.NoSuchUpload("NoSuchUpload", "The specified upload does not exist.", "UploadPart")
+        return upload_dir
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        with open(os.path.join(self._upload_dir(UploadId), f"{PartNumber:05d}"), "wb") as f:
+            f.write(Body)
+        return {"ETag": f'"{UploadId}-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        upload_dir = self._upload_dir(UploadId)
+
+        def write(f):
+            for part in sorted(MultipartUpload["Parts"], key=lambda p: p["PartNumber"]):
+                with open(os.path.join(upload_dir, f"{part['PartNumber']:05d}"), "rb") as part_file:
+                    shutil.copyfileobj(part_file, f)
+
+        self._write_atomic(self._path(Bucket, Key), write)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        return {"Bucket": Bucket, "Key": Key}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        shutil.rmtree(os.path.join(self.root, ".multipart", UploadId), ignore_errors=True)
+        return {}
+
+
+# -------------------------------
+# Bedrock agent runtime
+# -------------------------------
+class LocalAgentClient:
+    """
+    In-process stand-in for bedrock-agent-runtime invoke_agent.
+
+    Answers are deterministic and computed from the alias CSV: filename validation always
+    succeeds, header mapping returns the alias matches of the prompt's input headers
+    (the matches-only contract; MappingReconciler fills in the rest).
+    latency_ms is spread over the completion chunks of chunk_bytes bytes each, and
+    throttle_rate is the share of calls that fail with ThrottlingException.
+    """
+
+    def __init__(self, latency_ms=None, chunk_bytes=None, throttle_rate=None, seed=None):
+        self.latency_ms = LOCAL_AGENT_LATENCY_MS if latency_ms is None else latency_ms
+        self.chunk_bytes = max(LOCAL_AGENT_CHUNK_BYTES if chunk_bytes is None else chunk_bytes, 1)
+        self.throttle_rate = LOCAL_AGENT_THROTTLE_RATE if throttle_rate is None else throttle_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+
+    @staticmethod
+    def _prompt_value(text, label):
+        match = re.search(rf"^{re.escape(label)}: (.*)$", text, re.MULTILINE)
+        return match.group(1).strip() if match else None
+
+    def answer(self, input_text):
+        """The JSON text the agent returns for a rendered prompt."""
+        template_name = self._prompt_value(input_text, "Template")
+        file_name = self._prompt_value(input_text, "File Name")
+        if file_name is not None:
+            return json.dumps({"Validation": "Success", "InputFileName": file_name, "SpecifcationFileName": file_name})
+
+        headers = json.loads(self._prompt_value(input_text, "Input headers") or "[]")
+        matcher = get_compiled_spec(template_name).matcher
+        best = {}
+        for header in headers:
+            mapped_header, score = matcher.match(header)
+            if mapped_header and score > best.get(mapped_header, ("", -1))[1]:
+                best[mapped_header] = (header, score)
+        return json.dumps([
+            {"inputHeader": input_header, "mappedHeader": mapped_header, "confidenceScore": score}
+            for mapped_header, (input_header, score) in best.items()
+        ])
+
+    def invoke_agent(self, agentId, agentAliasId, sessionId, inputText, **kwargs):
+        with self._lock:
+            self.calls += 1
+            throttled = self._random.random() < self.throttle_rate
+            if throttled:
+                self.throttled += 1
+        if throttled:
+            raise LocalClientError("ThrottlingException", "Rate exceeded", "InvokeAgent")
+
+        body = self.answer(inputText).encode("utf-8")
+        chunks = [body[i:i + self.chunk_bytes] for i in range(0, len(body), self.chunk_bytes)]
+        delay = self.latency_ms / 1000 / max(len(chunks), 1)
+
+        def completion():
+            for chunk in chunks:
+                if delay:
+                    time.sleep(delay)
+                yield {"chunk": {"bytes": chunk}}
+
+        return {"completion": completion(), "sessionId": sessionId, "contentType": "application/json"}
+
+
+LOCAL_CLIENT_FACTORIES = {
+    "s3": lambda **kwargs: LocalS3Client(),
+    "bedrock-agent-runtime": lambda **kwargs: LocalAgentClient(),
+}
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+
+# Longest payload (prompt, agent response, header list) rendered into a normal log line
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get("LOG_PAYLOAD_MAX_CHARS", 512))
+# Longest log message of any kind; longer ones are cut by the governor filter
+LOG_MESSAGE_MAX_CHARS = int(os.environ.get("LOG_MESSAGE_MAX_CHARS", 4096))
+# Share of sampled debug logs that are written, with payloads up to LOG_DEBUG_MAX_CHARS
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", 0))
+LOG_DEBUG_MAX_CHARS = int(os.environ.get("LOG_DEBUG_MAX_CHARS", 65536))
+
+# Runs of base64 this long are page images or file content, never worth logging
+BASE64_MIN_RUN = 200
+BASE64_RUN_PATTERN = re.compile(rf"(?:data:[\w/+.-]+;base64,)?[A-Za-z0-9+/]{{{BASE64_MIN_RUN},}}={{0,2}}")
+# Longest note truncate_text appends to a cut text
+TRUNCATION_NOTE_MAX_CHARS = 80
+
+
+def short_hash(text):
+    """First 12 hex digits of the sha256 of text, to correlate payloads across log lines."""
+    return hashlib.sha256(text.encode("utf-8", "replace")).hexdigest()[:12]
+
+
+def scrub_base64(text):
+    """Replace base64 runs with their length and hash."""
+    return BASE64_RUN_PATTERN.sub(
+        lambda m: f"<base64 {len(m.group(0))} chars sha256:{short_hash(m.group(0))}>", text
+    )
+
+
+def payload_text(value):
+    """Loggable text of a payload: JSON for containers, a size note for binary content."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes binary>"
+    if isinstance(value, str):
+        return value
+    try:
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=payload_text)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def truncate_text(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... (+{len(text) - max_chars} chars, {len(text)} total, sha256:{short_hash(text)})"
+
+
+class LogPayload:
+    """
+    A payload for a %-style log argument: it is only rendered when the record is written,
+    with base64 removed and the text cut to max_chars (length and hash of the whole kept).
+    The rendered text is kept, so a record formatted again does not redo the work.
+    """
+
+    __slots__ = ("value", "max_chars", "_text")
+
+    def __init__(self, value, max_chars=None):
+        self.value = value
+        self.max_chars = LOG_PAYLOAD_MAX_CHARS if max_chars is None else max_chars
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            self._text = truncate_text(scrub_base64(payload_text(self.value)), self.max_chars)
+        return self._text
+
+
+def summarize(value, max_chars=None):
+    """Wrap a payload for logging: logger.info("Agent response: %s", summarize(output))."""
+    return LogPayload(value, max_chars)
+
+
+def debug_sampled(log, message, *args):
+    """
+    Write a debug log for LOG_DEBUG_SAMPLE_RATE of calls (all of them with the logger at DEBUG).
+    It is written at INFO so sampled lines show up under the Lambda's INFO level; args are
+    only formatted when the line is written, LogPayload args up to LOG_DEBUG_MAX_CHARS.
+    """
+    if not log.isEnabledFor(logging.DEBUG) and not (
+        LOG_DEBUG_SAMPLE_RATE and random.random() < LOG_DEBUG_SAMPLE_RATE
+    ):
+        return
+    args = tuple(
+        LogPayload(arg.value, max(arg.max_chars, LOG_DEBUG_MAX_CHARS)) if isinstance(arg, LogPayload) else arg
+        for arg in args
+    )
+    log.info(f"[DEBUG] {message}", *args)
+
+
+# -------------------------------
+# Governor filter
+# -------------------------------
+class LogGovernorFilter(logging.Filter):
+    """
+    Safety net for log calls that still format whole payloads: messages are stripped of
+    base64 and cut to LOG_MESSAGE_MAX_CHARS before any handler writes them. Records that
+    cannot need it (see is_governed) are passed on without formatting them here.
+    """
+
+    def filter(self, record):
+        if self.is_governed(record):
+            return True
+        message = record.getMessage()
+        governed = truncate_text(scrub_base64(message), LOG_MESSAGE_MAX_CHARS)
+        if governed != message:
+            record.msg, record.args = governed, None
+        return True
+
+    @staticmethod
+    def is_governed(record):
+        """
+        True when the formatted record can neither hold a base64 run nor exceed
+        LOG_MESSAGE_MAX_CHARS: its args are LogPayloads (scrubbed and cut on their own) or
+        scalars, and the plain text around them is shorter than a base64 run.
+        """
+        args = record.args or ()
+        if not isinstance(record.msg, str) or not isinstance(args, tuple):
+            return False
+        plain_chars = len(record.msg)
+        payload_chars = 0
+        for arg in args:
+            if isinstance(arg, LogPayload):
+                payload_chars += arg.max_chars + TRUNCATION_NOTE_MAX_CHARS
+            elif isinstance(arg, (str, int, float)) or arg is None:
+                plain_chars += len(str(arg))
+            else:
+                return False
+        return plain_chars < BASE64_MIN_RUN and plain_chars + payload_chars <= LOG_MESSAGE_MAX_CHARS
+
+
+def install_log_governor(log=None):
+    """Add the governor filter to the logger (the root logger by default) once."""
+    log = log or logging.getLogger()
+    if not any(isinstance(f, LogGovernorFilter) for f in log.filters):
+        log.addFilter(LogGovernorFilter())
+    return log
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from alias_index import ALIAS_CSV_PATH
+from aws_clients import LazyClient
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Durable tier: "s3://bucket/prefix" or a local directory; empty keeps the cache in memory only
+MAPPING_CACHE_LOCATION = os.environ.get("MAPPING_CACHE_LOCATION", "")
+MAPPING_CACHE_TTL_SECONDS = int(os.environ.get("MAPPING_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+MAPPING_CACHE_MAX_ENTRIES = int(os.environ.get("MAPPING_CACHE_MAX_ENTRIES", 256))
+MAPPING_CACHE_MAX_FILES = int(os.environ.get("MAPPING_CACHE_MAX_FILES", 5000))
+
+# Files whose content defines the spec; any change invalidates cached mappings
+SPEC_WORKBOOK_PATH = os.environ.get(
+    "SPEC_WORKBOOK_PATH",
+    os.path.join(BASE_DIR, "SG_ingest_training_data(with all templates)(16.09.2025).xlsx")
+)
+TRAINING_DATA_DIR = os.environ.get("TRAINING_DATA_DIR", os.path.join(BASE_DIR, "Training Data"))
+
+# In-memory LRU tier, lives across warm invocations: key -> (stored_at, corrected_mappings)
+_memory_cache = OrderedDict()
+# Records of one batch run on worker threads; the memory tier is only touched under this lock
+_memory_cache_lock = threading.Lock()
+_spec_version = None
+_spec_stamp = None
+_s3_client = LazyClient("s3")
+
+
+# -------------------------------
+# Cache key
+# -------------------------------
+def spec_source_paths():
+    """The spec workbook, the alias file and the training workbooks, in hashing order."""
+    paths = [SPEC_WORKBOOK_PATH, ALIAS_CSV_PATH]
+    if os.path.isdir(TRAINING_DATA_DIR):
+        paths += sorted(
+            os.path.join(TRAINING_DATA_DIR, name) for name in os.listdir(TRAINING_DATA_DIR) if name.endswith(".xlsx")
+        )
+    return paths
+
+
+def _spec_source_stamp(paths):
+    stamp = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamp.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamp.append((path, None, None))
+    return tuple(stamp)
+
+
+def get_spec_version():
+    """
+    Content hash of the spec source files (spec_source_paths). It is recomputed only when
+    one of them changes (mtime or size), so warm containers pick up a replaced spec file.
+    Without any source file it is the version the spec artifact was built from.
+    """
+    global _spec_version, _spec_stamp
+    paths = spec_source_paths()
+    stamp = _spec_source_stamp(paths)
+    if all(size is None for _, _, size in stamp):
+        # Deployments may ship only the compiled artifact, which records the version it was built from
+        from spec_artifact import load_spec_artifact
+        artifact = load_spec_artifact()
+        if artifact is not None:
+            return artifact["specVersion"]
+    if _spec_version is None or stamp != _spec_stamp:
+        digest = hashlib.sha256()
+        for path in paths:
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+            digest.update(b"\0")
+        _spec_version, _spec_stamp = digest.hexdigest()[:16], stamp
+    return _spec_version
+
+
+def mapping_cache_key(template_name, agent_alias_id, headers, headers_with_data):
+    """Hash of (template, agent alias, spec version, ordered headers, headers with data)."""
+    signature = json.dumps(
+        [template_name, agent_alias_id, get_spec_version(), list(headers), list(headers_with_data)],
+        separators=(",", ":")
+    )
+    return hashlib.sha256(signature.encode("utf-8")).hexdigest()
+
+
+# -------------------------------
+# Durable tier (S3 or local directory)
+# -------------------------------
+def _split_s3_location(location):
+    bucket, _, prefix = location[len("s3://"):].partition("/")
+    return bucket, prefix.strip("/")
+
+
+def _read_durable(key):
+    if not MAPPING_CACHE_LOCATION:
+        return None
+    try:
+        if MAPPING_CACHE_LOCATION.startswith("s3://"):
+            bucket, prefix = _split_s3_location(MAPPING_CACHE_LOCATION)
+            obj_key = f"{prefix}/{key}.json" if prefix else f"{key}.json"
+            try:
+                body = _s3_client.get_object(Bucket=bucket, Key=obj_key)["Body"].read()
+            except _s3_client.exceptions.NoSuchKey:
+                return None
+        else:
+            path = os.path.join(MAPPING_CACHE_LOCATION, f"{key}.json")
+            if not os.path.exists(path):
+                return None
+            with open(path, "rb") as f:
+                body = f.read()
+        return json.loads(body)
+    except Exception as e:
+        logger.error(f"[ERROR] Reading mapping cache entry {key} failed: {e}")
+        return None
+
+
+def _write_durable(key, entry):
+    if not MAPPING_CACHE_LOCATION:
+        return
+    body = json.dumps(entry).encode("utf-8")
+    try:
+        if MAPPING_CACHE_LOCATION.startswith("s3://"):
+            # Size eviction for the S3 tier is left to a bucket lifecycle rule on the prefix
+            bucket, prefix = _split_s3_location(MAPPING_CACHE_LOCATION)
+            obj_key = f"{prefix}/{key}.json" if prefix else f"{key}.json"
+            _s3_client.put_object(Bucket=bucket, Key=obj_key, Body=body)
+        else:
+            os.makedirs(MAPPING_CACHE_LOCATION, exist_ok=True)
+            tmp_path = os.path.join(MAPPING_CACHE_LOCATION, f"{key}.json.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, os.path.join(MAPPING_CACHE_LOCATION, f"{key}.json"))
+            _evict_local_files()
+    except Exception as e:
+        logger.error(f"[ERROR] Writing mapping cache entry {key} failed: {e}")
+
+
+def _evict_local_files():
+    """Keep the local cache directory under MAPPING_CACHE_MAX_FILES, dropping the oldest entries."""
+    entries = [
+        os.path.join(MAPPING_CACHE_LOCATION, name)
+        for name in os.listdir(MAPPING_CACHE_LOCATION)
+        if name.endswith(".json")
+    ]
+    if len(entries) <= MAPPING_CACHE_MAX_FILES:
+        return
+    entries.sort(key=os.path.getmtime)
+    for path in entries[:len(entries) - MAPPING_CACHE_MAX_FILES]:
+        os.remove(path)
+
+
+# -------------------------------
+# Public API
+# -------------------------------
+def _is_fresh(stored_at):
+    return time.time() - stored_at <= MAPPING_CACHE_TTL_SECONDS
+
+
+def get_cached_mappings(key):
+    """Return cached corrected_mappings for a key, or None on miss/expiry."""
+    with _memory_cache_lock:
+        cached = _memory_cache.get(key)
+        if cached is not None:
+            if _is_fresh(cached[0]):
+                _memory_cache.move_to_end(key)
+            else:
+                _memory_cache.pop(key, None)
+                cached = None
+    if cached is not None:
+        logger.info(f"[INFO] Mapping cache hit (memory): {key[:12]}")
+        return cached[1]
+
+    entry = _read_durable(key)
+    if entry and entry.get("specVersion") == get_spec_version() and _is_fresh(entry.get("storedAt", 0)):
+        logger.info(f"[INFO] Mapping cache hit (durable): {key[:12]}")
+        _put_memory(key, entry["storedAt"], entry["correctedMappings"])
+        return entry["correctedMappings"]
+
+    logger.info(f"[INFO] Mapping cache miss: {key[:12]}")
+    return None
+
+
+def put_cached_mappings(key, corrected_mappings):
+    """Store corrected_mappings in the memory tier and, if configured, the durable tier."""
+    stored_at = time.time()
+    _put_memory(key, stored_at, corrected_mappings)
+    _write_durable(key, {
+        "specVersion": get_spec_version(),
+        "storedAt": stored_at,
+        "correctedMappings": corrected_mappings
+    })
+
+
+def _put_memory(key, stored_at, mappings):
+    with _memory_cache_lock:
+        _memory_cache[key] = (stored_at, mappings)
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > MAPPING_CACHE_MAX_ENTRIES:
+            _memory_cache.popitem(last=False)
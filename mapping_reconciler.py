@@ -0,0 +1,142 @@
+import logging
+
+from alias_index import OUTPUT_FIELD_SPECIFICATION, header_key
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class MappingReconciler:
+    """
+    Turn agent (or cached/local) mappings into the canonical mapping list:
+
+      1. every spec header exactly once, in spec order (SPEC_CHECKLIST), with a placeholder
+         {"inputHeader": "", "mappedHeader": <spec header>, "confidenceScore": 0} where unmapped
+      2. then every header with data that maps to no spec header (DATA_CHECKLIST), in file order,
+         as {"inputHeader": <header>, "mappedHeader": "", "confidenceScore": 0}
+
+    Agent output only has to contain the matches; anything missing, duplicated, out of order
+    or naming headers that do not exist is repaired here and listed in the report.
+    All lookups are dict/set based, so reconciling is linear in headers + mappings.
+    """
+
+    def __init__(self, headers, headers_with_data, spec_fields=None):
+        self.spec_fields = list(spec_fields or OUTPUT_FIELD_SPECIFICATION)
+        self.headers = list(headers)
+        self.headers_with_data = list(headers_with_data)
+
+        self._spec_set = set(self.spec_fields)
+        self._spec_by_key = {header_key(f): f for f in self.spec_fields}
+
+        self._input_set = set(self.headers)
+        self._input_by_stripped = {}
+        self._input_by_key = {}
+        for header in self.headers:
+            self._input_by_stripped.setdefault(str(header).strip(), header)
+            key = header_key(header)
+            # Keys shared by several input headers are ambiguous and never used for repairs
+            self._input_by_key[key] = header if key not in self._input_by_key else None
+
+    def _resolve_input(self, input_header):
+        """Actual input header named by the agent, tolerating whitespace/case drift; None if unknown."""
+        if input_header in self._input_set:
+            return input_header
+        stripped = input_header.strip()
+        if stripped in self._input_by_stripped:
+            return self._input_by_stripped[stripped]
+        return self._input_by_key.get(header_key(stripped)) if stripped else None
+
+    def _resolve_spec(self, mapped_header):
+        if mapped_header in self._spec_set:
+            return mapped_header
+        return self._spec_by_key.get(header_key(mapped_header)) if mapped_header.strip() else None
+
+    @staticmethod
+    def _score(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return 0
+
+    def reconcile(self, mappings):
+        """Return (reconciled_mappings, report); report lists every repair that was made."""
+        report = {
+            "unknownInputHeaders": [],
+            "unknownMappedHeaders": [],
+            "renamedHeaders": [],
+            "duplicatesDropped": [],
+            "placeholdersAdded": [],
+            "dataHeadersAdded": [],
+            "reordered": False,
+        }
+
+        best = {}  # spec header -> (inputHeader, score)
+        used_inputs = {}  # input header -> spec header it is mapped to
+        agent_order = []  # spec headers in the order the agent listed them
+        mentioned_inputs = set()
+
+        for m in mappings if isinstance(mappings, list) else []:
+            if not isinstance(m, dict):
+                continue
+            raw_input = str(m.get("inputHeader") or "")
+            raw_mapped = str(m.get("mappedHeader") or "")
+
+            mapped_header = self._resolve_spec(raw_mapped) if raw_mapped.strip() else None
+            if raw_mapped.strip() and mapped_header is None:
+                report["unknownMappedHeaders"].append(raw_mapped)
+            if mapped_header is not None:
+                agent_order.append(mapped_header)
+
+            input_header = self._resolve_input(raw_input) if raw_input.strip() else None
+            if raw_input.strip() and input_header is None:
+                report["unknownInputHeaders"].append(raw_input)
+                continue
+            if input_header is not None:
+                mentioned_inputs.add(input_header)
+                if input_header != raw_input:
+                    report["renamedHeaders"].append(f"{raw_input} -> {input_header}")
+            if mapped_header is not None and mapped_header != raw_mapped:
+                report["renamedHeaders"].append(f"{raw_mapped} -> {mapped_header}")
+
+            # Placeholders and self-mapped data headers are rebuilt below
+            if input_header is None or mapped_header is None:
+                continue
+
+            score = self._score(m.get("confidenceScore"))
+            current = best.get(mapped_header)
+            if input_header in used_inputs and used_inputs[input_header] != mapped_header:
+                report["duplicatesDropped"].append([input_header, mapped_header])
+                continue
+            if current is not None:
+                if score <= current[1]:
+                    report["duplicatesDropped"].append([input_header, mapped_header])
+                    continue
+                report["duplicatesDropped"].append([current[0], mapped_header])
+                del used_inputs[current[0]]
+            best[mapped_header] = (input_header, score)
+            used_inputs[input_header] = mapped_header
+
+        agent_specs = set(agent_order)
+        reconciled = []
+        for field in self.spec_fields:
+            if field in best:
+                input_header, score = best[field]
+                reconciled.append({"inputHeader": input_header, "mappedHeader": field, "confidenceScore": score})
+            else:
+                reconciled.append({"inputHeader": "", "mappedHeader": field, "confidenceScore": 0})
+                if field not in agent_specs:
+                    report["placeholdersAdded"].append(field)
+
+        for header in self.headers_with_data:
+            if header not in used_inputs:
+                reconciled.append({"inputHeader": header, "mappedHeader": "", "confidenceScore": 0})
+                if header not in mentioned_inputs:
+                    report["dataHeadersAdded"].append(header)
+
+        first_seen = list(dict.fromkeys(agent_order))
+        report["reordered"] = first_seen != [f for f in self.spec_fields if f in agent_specs]
+
+        repairs = {k: len(v) for k, v in report.items() if isinstance(v, list) and v}
+        if repairs or report["reordered"]:
+            logger.info(f"[INFO] Reconciled mappings: {repairs}, reordered={report['reordered']}")
+        return reconciled, report
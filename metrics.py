@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# CloudWatch embedded metric format (EMF) settings
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "FileFeed/Mapping")
+# "stdout" prints one EMF JSON line per file (picked up from the Lambda log stream); "off" disables
+METRICS_SINK = os.environ.get("METRICS_SINK", "stdout")
+
+# Metrics that are published to CloudWatch, with their EMF units; other fields stay log properties
+METRIC_UNITS = {
+    "TotalMs": "Milliseconds",
+    "ValidationMs": "Milliseconds",
+    "DownloadMs": "Milliseconds",
+    "ParseMs": "Milliseconds",
+    "HeadersWithDataMs": "Milliseconds",
+    "MappingMs": "Milliseconds",
+    "OutputMs": "Milliseconds",
+    "AgentLatencyMs": "Milliseconds",
+    "AgentCalls": "Count",
+    "AgentInputTokens": "Count",
+    "AgentOutputTokens": "Count",
+    "BytesRead": "Bytes",
+    "BytesWritten": "Bytes",
+    "Rows": "Count",
+    "InputColumns": "Count",
+    "HeadersWithData": "Count",
+    "OutputColumns": "Count",
+    "PeakMemoryMB": "Megabytes",
+}
+
+
+def _print_sink(record):
+    # EMF has to be the whole log line, so it is printed rather than sent through the logger
+    sys.stdout.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+    sys.stdout.flush()
+
+
+_sink = _print_sink
+
+
+class MemoryMetricsSink:
+    """Collects emitted records in memory, for tests and local runs."""
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        with self._lock:
+            self.records.append(record)
+
+
+def set_metrics_sink(sink):
+    """Send metric records to sink(record) instead of stdout; None restores stdout. Returns the sink."""
+    global _sink
+    _sink = sink or _print_sink
+    return _sink
+
+
+def peak_memory_mb():
+    """Process high-water mark of resident memory (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# -------------------------------
+# Per-file metrics record
+# -------------------------------
+class FileMetrics:
+    """
+    Metrics of one processed file, emitted as one EMF record with Template as dimension.
+    Stage timers and counters may be updated from the worker threads of the same file.
+    """
+
+    def __init__(self, template_name="", **properties):
+        self.template_name = template_name
+        self.properties = dict(properties)
+        self.values = {}
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._emitted = False
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block into <name>Ms; repeated stages add up."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(f"{name}Ms", (time.perf_counter() - started) * 1000)
+
+    def add(self, name, value):
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + value
+
+    def set(self, name, value):
+        with self._lock:
+            self.values[name] = value
+
+    def set_property(self, name, value):
+        with self._lock:
+            self.properties[name] = value
+
+    def record_agent_call(self, latency_ms, input_tokens, output_tokens):
+        with self._lock:
+            for name, value in (
+                ("AgentCalls", 1), ("AgentLatencyMs", latency_ms),
+                ("AgentInputTokens", input_tokens), ("AgentOutputTokens", output_tokens),
+            ):
+                self.values[name] = self.values.get(name, 0) + value
+
+    def to_record(self):
+        with self._lock:
+            values = dict(self.values)
+            properties = dict(self.properties)
+        values["TotalMs"] = (time.perf_counter() - self._started) * 1000
+        values["PeakMemoryMB"] = peak_memory_mb()
+        values = {k: round(v, 1) if isinstance(v, float) else v for k, v in values.items()}
+
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["Template"]],
+                    "Metrics": [{"Name": name, "Unit": METRIC_UNITS[name]} for name in values if name in METRIC_UNITS],
+                }],
+            },
+            "Template": self.template_name,
+        }
+        record.update(properties)
+        record.update(values)
+        return record
+
+    def emit(self, **properties):
+        """Emit the record once (later calls are ignored); properties are added to it first."""
+        if self._emitted or (_sink is _print_sink and METRICS_SINK == "off"):
+            return
+        self._emitted = True
+        for name, value in properties.items():
+            self.set_property(name, value)
+        try:
+            _sink(self.to_record())
+        except Exception as e:
+            logger.error(f"[ERROR] Emitting metrics failed: {e}")
+
+
+class NullMetrics:
+    """Stand-in for FileMetrics when a stage function is called without one; records nothing."""
+
+    def stage(self, name):
+        return nullcontext()
+
+    def add(self, name, value):
+        pass
+
+    def set(self, name, value):
+        pass
+
+    def set_property(self, name, value):
+        pass
+
+    def record_agent_call(self, latency_ms, input_tokens, output_tokens):
+        pass
+
+    def emit(self, **properties):
+        pass
+
+
+NO_METRICS = NullMetrics()
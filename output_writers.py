@@ -0,0 +1,223 @@
+import gzip
+import importlib.util
+import logging
+import os
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# S3 multipart parts must be at least 5 MB (except the last one)
+S3_UPLOAD_PART_SIZE = max(int(os.environ.get("S3_UPLOAD_PART_SIZE", 8 * 1024 * 1024)), 5 * 1024 * 1024)
+
+# Rows serialized per slice by the CSV/Parquet writers, bounding the text/arrow copy of a frame
+OUTPUT_SLICE_ROWS = 50000
+
+# Sheet limit is 1,048,576 rows including the header row
+XLSX_MAX_DATA_ROWS = 1048575
+
+OUTPUT_EXTENSIONS = {
+    "xlsx": ".xlsx",
+    "csv": ".csv",
+    "csv.gz": ".csv.gz",
+    "parquet": ".parquet",
+}
+
+
+# -------------------------------
+# S3 multipart upload as a write-only file
+# -------------------------------
+class S3MultipartWriter:
+    """
+    Write-only, non-seekable file object that uploads to S3 as bytes arrive.
+    Data is sent in S3_UPLOAD_PART_SIZE parts; outputs smaller than one part are
+    sent with a single put_object on close. Call abort() if the output is incomplete.
+    """
+
+    def __init__(self, s3_client, bucket, key, part_size=S3_UPLOAD_PART_SIZE):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self.closed = False
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def write(self, data):
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def tell(self):
+        return self.bytes_written
+
+    def flush(self):
+        pass
+
+    def _upload_part(self, body):
+        if self._upload_id is None:
+            self._upload_id = self.s3.create_multipart_upload(Bucket=self.bucket, Key=self.key)["UploadId"]
+        part_number = len(self._parts) + 1
+        response = self.s3.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+            PartNumber=part_number, Body=body
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self._upload_id is None:
+            self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer))
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts}
+            )
+        self._buffer = bytearray()
+        logger.info(f"Uploaded {self.bytes_written} bytes to s3://{self.bucket}/{self.key} in {max(len(self._parts), 1)} part(s)")
+
+    def abort(self):
+        self.closed = True
+        self._buffer = bytearray()
+        if self._upload_id is not None:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            logger.info(f"Aborted multipart upload of s3://{self.bucket}/{self.key}")
+
+
+# -------------------------------
+# Streaming XLSX writer
+# -------------------------------
+class XlsxOutputWriter:
+    """
+    Write output frames to an xlsx file object with openpyxl's write-only mode.
+    Rows are serialized as they are appended (openpyxl spools them to a temp file),
+    so no cell objects are kept for the whole workbook.
+    """
+
+    def __init__(self, fileobj):
+        from openpyxl import Workbook
+
+        self.fileobj = fileobj
+        self.rows_written = 0
+        self._workbook = Workbook(write_only=True)
+        self._worksheet = self._workbook.create_sheet()
+        self.header_written = False
+
+    def write_frame(self, df_out):
+        # Missing values are written as empty cells, as DataFrame.to_excel does
+        na_columns = df_out.columns[df_out.isna().any()]
+        if len(na_columns):
+            df_out = df_out.copy(deep=False)
+            for col in na_columns:
+                df_out[col] = df_out[col].astype(object).where(df_out[col].notna(), None)
+
+        if self.rows_written + len(df_out) > XLSX_MAX_DATA_ROWS:
+            raise ValueError(
+                f"Output exceeds the xlsx limit of {XLSX_MAX_DATA_ROWS} rows; use the csv, csv.gz or parquet output format"
+            )
+
+        if not self.header_written:
+            self._worksheet.append(list(df_out.columns))
+            self.header_written = True
+        for row in df_out.itertuples(index=False, name=None):
+            self._worksheet.append(row)
+        self.rows_written += len(df_out)
+
+    def close(self):
+        self._workbook.save(self.fileobj)
+
+
+# -------------------------------
+# Streaming CSV / gzip CSV writer
+# -------------------------------
+class CsvOutputWriter:
+    """Write output frames as UTF-8 CSV, optionally gzip-compressed, slice by slice."""
+
+    def __init__(self, fileobj, compress=False):
+        self.fileobj = fileobj
+        self.rows_written = 0
+        self.header_written = False
+        self._gzip = gzip.GzipFile(fileobj=fileobj, mode="wb") if compress else None
+
+    def write_frame(self, df_out):
+        target = self._gzip or self.fileobj
+        for start in range(0, max(len(df_out), 1), OUTPUT_SLICE_ROWS):
+            df_slice = df_out.iloc[start:start + OUTPUT_SLICE_ROWS]
+            if len(df_slice) == 0 and self.header_written:
+                break
+            target.write(df_slice.to_csv(index=False, header=not self.header_written).encode("utf-8"))
+            self.header_written = True
+        self.rows_written += len(df_out)
+
+    def close(self):
+        if self._gzip is not None:
+            # Closing the GzipFile writes the trailer but leaves fileobj open
+            self._gzip.close()
+
+
+# -------------------------------
+# Columnar Parquet writer
+# -------------------------------
+class ParquetOutputWriter:
+    """
+    Write output frames as Parquet row groups with all-string columns.
+    Requires pyarrow, which is only imported when this format is selected.
+    """
+
+    def __init__(self, fileobj):
+        # Checked without importing pyarrow, which write_frame imports on first use
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ValueError("Parquet output requires the pyarrow package")
+
+        self.fileobj = fileobj
+        self.rows_written = 0
+        self.header_written = False
+        self._writer = None
+        self._schema = None
+
+    def write_frame(self, df_out):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            self._schema = pa.schema([(str(col), pa.string()) for col in df_out.columns])
+            self._writer = pq.ParquetWriter(self.fileobj, self._schema)
+            self.header_written = True
+
+        for start in range(0, len(df_out), OUTPUT_SLICE_ROWS):
+            df_slice = df_out.iloc[start:start + OUTPUT_SLICE_ROWS].astype(object)
+            df_slice = df_slice.where(df_slice.notna(), None)
+            table = pa.Table.from_pandas(df_slice, schema=self._schema, preserve_index=False)
+            self._writer.write_table(table)
+        self.rows_written += len(df_out)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_output_writer(output_format, fileobj):
+    """Return the streaming writer for an output format ('xlsx', 'csv', 'csv.gz' or 'parquet')."""
+    if output_format == "xlsx":
+        return XlsxOutputWriter(fileobj)
+    if output_format == "csv":
+        return CsvOutputWriter(fileobj)
+    if output_format == "csv.gz":
+        return CsvOutputWriter(fileobj, compress=True)
+    if output_format == "parquet":
+        return ParquetOutputWriter(fileobj)
+    raise ValueError(f"Unsupported output format: {output_format}")
@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import string
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Active version per prompt; set e.g. PROMPT_VERSION_HEADER_MAPPING=v1 to roll back
+PROMPT_VERSIONS = {
+    "filename_validation": os.environ.get("PROMPT_VERSION_FILENAME_VALIDATION", "v2"),
+    "header_mapping": os.environ.get("PROMPT_VERSION_HEADER_MAPPING", "v3"),
+}
+
+# Rough average for English prompt text; good enough to compare prompt versions
+BYTES_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return max(1, round(len(text.encode("utf-8")) / BYTES_PER_TOKEN)) if text else 0
+
+
+# -------------------------------
+# Prompt template
+# -------------------------------
+class PromptTemplate:
+    """
+    A versioned prompt: per-file variable lines followed by a static instruction block.
+    The text is a str.format template ({template}, {headers}, ...; literal braces doubled).
+    List and dict variables are rendered as compact JSON.
+    """
+
+    def __init__(self, name, version, variables, instructions):
+        self.name = name
+        self.version = version
+        self.text = variables + instructions
+        self.fields = list(dict.fromkeys(field for _, field, _, _ in string.Formatter().parse(self.text) if field))
+        static_text = "".join(literal for literal, _, _, _ in string.Formatter().parse(self.text))
+        self.static_bytes = len(static_text.encode("utf-8"))
+        self.static_tokens = estimate_tokens(static_text)
+
+    def render(self, **values):
+        missing = [field for field in self.fields if field not in values]
+        if missing:
+            raise ValueError(f"Prompt {self.name}/{self.version} is missing values for {missing}")
+        values = {
+            key: json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+            if isinstance(value, (list, tuple, dict)) else value
+            for key, value in values.items()
+        }
+        text = self.text.format(**values)
+        logger.info(
+            f"[INFO] Prompt {self.name}/{self.version}: {len(text.encode('utf-8'))} bytes, "
+            f"~{estimate_tokens(text)} tokens ({self.static_bytes} bytes static)"
+        )
+        return text
+
+
+# -------------------------------
+# Filename validation prompts
+# -------------------------------
+_FILENAME_VALIDATION_VARIABLES = "File Name: {file_name}\nTemplate: {template}\n"
+
+# v1: original instructions
+_FILENAME_VALIDATION_V1 = (
+    "You will receive a file name and a template name. "
+    "Your task is to validate whether the file name exists for the given template "
+    "With same Agent (Template) multiple files will associated with it, so first look for the file name under column 'File Name' inside 'Agent File Specification' "
+    "in the 'Agent File Specification' sheet under the 'File Name' column.Go through full column to match the file name"
+    "If the file name matches for the template, return JSON: "
+    '{{"Validation": "Success", "InputFileName": "<the incoming file name>", "SpecifcationFileName": "<the file name from Agent File Specification>"}} '
+    "If not, return JSON: "
+    '{{"Validation": "Failed", "InputFileName": "<the incoming file name>", "SpecifcationFileName": "<the file name from Agent File Specification>"}} '
+    "Do not return any extra text or explanation."
+)
+
+# v2: same answer format, without the repeated sheet/column wording
+_FILENAME_VALIDATION_V2 = (
+    "Check whether this file name is listed for the template in the 'File Name' column of the "
+    "'Agent File Specification' sheet (a template can have several files; check the whole column). "
+    "Return ONLY JSON: "
+    '{{"Validation": "Success" or "Failed", "InputFileName": "<the incoming file name>", '
+    '"SpecifcationFileName": "<the matching file name from Agent File Specification>"}}'
+)
+
+
+# -------------------------------
+# Header mapping prompts
+# -------------------------------
+_HEADER_MAPPING_VARIABLES = (
+    "Template: {template}\n"
+    "Input headers: {headers}\n"
+    "Input headers with data: {headers_with_data}\n"
+)
+
+# v1: checklist instructions with mandatory self-verification
+_HEADER_MAPPING_V1 = (
+    "Instructions: You MUST return a JSON array where:\n"
+    "- Every standardized header from Output Field Specification (column 'Field Name') appears exactly once, in the same order as in the specification.\n"
+    "- The total number of JSON objects MUST be >= the number of standardized headers present in the output specification file.\n"
+    "- If a standardized header cannot be mapped, you MUST include it as:\n"
+    '  {{\"inputHeader\": \"\", \"mappedHeader\": \"<Standardized_Header>\", \"confidenceScore\": 0}}\n'
+    "- Never skip, drop, or omit any standardized header, even if no input mapping exists.\n\n"
+    "Step 0: Build Checklists\n"
+    "- DATA_CHECKLIST = all 'Input headers with data'\n"
+    "- SPEC_CHECKLIST = all standardized headers from Output Field Specification\n\n"
+    "Step 1: Alias Matching\n"
+    "- For each input header, check if it exactly or fuzzily matches an alias in template \"{template}\".\n"
+    "- Exact = confidenceScore 100, fuzzy = 80. Only one mappedHeader per spec header.\n\n"
+    "Step 2: Self-Mapping for Data Headers ONLY\n"
+    "- For each input header in DATA_CHECKLIST:\n"
+    "   - If it maps to a standardized header → output the mapping.\n"
+    "    -if it does NOT map to any standardized header but the headers is in DATA_CHEKLIST or is in Input Headers with Data -> output:"   
+    '     {{\"inputHeader\": \"<header>\", \"mappedHeader\": \"\", \"confidenceScore\": 0}}\n'
+    "- IMPORTANT: Do NOT include any header that is not in DATA_CHECKLIST.\n\n"
+    "Step 3: Placeholder Coverage\n"
+    "- After Step 1 and Step 2, ensure every header from SPEC_CHECKLIST is present in the JSON in correct order.\n"
+    "- If not mapped, add placeholder as described.\n\n"
+    "Step 4: Append Extras\n"
+    "- After placeholders, append any headers from DATA_CHECKLIST that were not already included.\n"
+    "- Ignore all headers that are not in DATA_CHECKLIST.\n\n"
+    "Final Verification (MANDATORY)\n"
+    "- Count entries. It MUST be >= the number of standardized headers present in the specification file.\n"
+    "- Confirm every SPEC_CHECKLIST header appears once.\n"
+    "- Confirm every DATA_CHECKLIST header appears once.\n"
+    "- Confirm NO header outside DATA_CHECKLIST is included unless it maps to a standardized header.\n"
+    "- If any condition fails, regenerate before responding.\n\n"
+    "Output: ONLY return the JSON array, in this order:\n"
+    "1) All standardized headers (SPEC_CHECKLIST) in correct order\n"
+    "2) Followed by any extra DATA_CHECKLIST headers."
+)
+
+# v2: same output contract in about a third of the bytes; ordering and coverage are
+# enforced again locally by MappingReconciler, so the self-verification steps are dropped
+_HEADER_MAPPING_V2 = (
+    "Map the input headers to the Output Field Specification 'Field Name' list using the aliases "
+    "of template column \"{template}\" in 'Agent File Input Headers' (comma-separated values in a cell are distinct aliases).\n"
+    'Return ONLY a JSON array of {{"inputHeader": "", "mappedHeader": "", "confidenceScore": 0}} objects:\n'
+    "1. Every Field Name exactly once, in specification order. If matched: inputHeader exactly as received, "
+    "confidenceScore 100 for an exact alias match, 80 for a fuzzy one. If not: inputHeader \"\", confidenceScore 0.\n"
+    "2. A Field Name takes at most one input header (exact > fuzzy > first seen).\n"
+    "3. Then each input header with data that matched no Field Name, with mappedHeader \"\" and confidenceScore 0. "
+    "Leave out unmatched headers without data."
+)
+
+# v3: matches only; MappingReconciler adds placeholders and unmatched headers with data
+_HEADER_MAPPING_V3 = (
+    "Match the input headers to the Output Field Specification 'Field Name' list using the aliases "
+    "of template column \"{template}\" in 'Agent File Input Headers' (comma-separated values in a cell are distinct aliases).\n"
+    'Return ONLY a JSON array with one {{"inputHeader": "", "mappedHeader": "", "confidenceScore": 0}} object per match: '
+    "inputHeader exactly as received, mappedHeader the Field Name, confidenceScore 100 for an exact alias match, "
+    "80 for a fuzzy one. A Field Name takes at most one input header (exact > fuzzy > first seen). "
+    "Leave out unmatched headers and Field Names."
+)
+
+
+PROMPTS = {
+    ("filename_validation", "v1"): PromptTemplate(
+        "filename_validation", "v1", _FILENAME_VALIDATION_VARIABLES, _FILENAME_VALIDATION_V1
+    ),
+    ("filename_validation", "v2"): PromptTemplate(
+        "filename_validation", "v2", _FILENAME_VALIDATION_VARIABLES, _FILENAME_VALIDATION_V2
+    ),
+    ("header_mapping", "v1"): PromptTemplate(
+        "header_mapping", "v1", _HEADER_MAPPING_VARIABLES, _HEADER_MAPPING_V1
+    ),
+    ("header_mapping", "v2"): PromptTemplate(
+        "header_mapping", "v2", _HEADER_MAPPING_VARIABLES, _HEADER_MAPPING_V2
+    ),
+    ("header_mapping", "v3"): PromptTemplate(
+        "header_mapping", "v3", _HEADER_MAPPING_VARIABLES, _HEADER_MAPPING_V3
+    ),
+}
+
+
+def get_prompt(name, version=None):
+    """Return the PromptTemplate for name at version (default: the active version in PROMPT_VERSIONS)."""
+    version = version or PROMPT_VERSIONS[name]
+    try:
+        return PROMPTS[(name, version)]
+    except KeyError:
+        raise ValueError(f"Unknown prompt {name}/{version}") from None
+
+
+def render_prompt(name, version=None, **values):
+    return get_prompt(name, version).render(**values)
@@ -0,0 +1,267 @@
+"""
+Compiled spec artifact: the spec workbook, the alias CSV and the training workbooks
+compiled into one JSON file the Lambda loads with a single read.
+
+    python spec_artifact.py            # build spec_artifact.json from the source files
+    python spec_artifact.py --check    # exit 1 if the artifact is missing or out of date
+
+The artifact holds, per template, the ordered output fields, the alias index (exact and
+normalized keys, as alias_index.build_alias_index builds it), the column defaults of the
+Output Field Specification and the file names of the 'Agent File Specification' sheet.
+"specVersion" is the content hash of the source files (mapping_cache.get_spec_version)
+and "contentHash" the hash of the compiled data, so a mapping can be traced to the exact
+spec it was produced with.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SPEC_ARTIFACT_PATH = os.environ.get("SPEC_ARTIFACT_PATH", os.path.join(BASE_DIR, "spec_artifact.json"))
+ARTIFACT_FORMAT = 1
+
+TEMPLATE_NAME_PATTERN = re.compile(r"^A\d+$")
+# Training workbook cells like "{input : Dealerid},{output:Dealer #}"
+TRAINING_PAIR_PATTERN = re.compile(r"\{\s*input\s*:\s*([^}]*?)\s*\}\s*,\s*\{\s*output\s*:\s*([^}]*?)\s*\}")
+
+# path -> ((mtime_ns, size), artifact)
+_loaded_artifacts = {}
+
+
+# -------------------------------
+# Loader
+# -------------------------------
+def load_spec_artifact(path=None):
+    """
+    The parsed artifact, or None if there is none. It is read once per warm container
+    and again only when the file changes.
+    """
+    path = path or SPEC_ARTIFACT_PATH
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    loaded = _loaded_artifacts.get(path)
+    if loaded is not None and loaded[0] == stamp:
+        return loaded[1]
+
+    with open(path, "rb") as f:
+        artifact = json.loads(f.read())
+    if artifact.get("format") != ARTIFACT_FORMAT:
+        logger.error(f"[ERROR] Spec artifact {path} has format {artifact.get('format')}, expected {ARTIFACT_FORMAT}")
+        return None
+    _loaded_artifacts[path] = (stamp, artifact)
+    logger.info(
+        f"[INFO] Loaded spec artifact {artifact['contentHash']} (spec {artifact['specVersion']}, "
+        f"{len(artifact['templates'])} templates)"
+    )
+    return artifact
+
+
+def content_hash(data):
+    """Hash of the compiled data, independent of key order."""
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+# -------------------------------
+# Workbook readers
+# -------------------------------
+def _sheet_rows(workbook, sheet_name):
+    if sheet_name not in workbook.sheetnames:
+        return []
+    return [
+        [("" if c is None else str(c).strip()) for c in row]
+        for row in workbook[sheet_name].iter_rows(values_only=True)
+        if any(c is not None and str(c).strip() for c in row)
+    ]
+
+
+def _header_row(rows, *names):
+    """Index of the first row holding all column names, and the name -> column index map."""
+    for i, row in enumerate(rows):
+        if all(name in row for name in names):
+            return i, {name: row.index(name) for name in row if name}
+    return None, {}
+
+
+def read_output_fields(workbook):
+    """(ordered field names, {field: default}) of the 'Output Field Specification' sheet."""
+    rows = _sheet_rows(workbook, "Output Field Specification")
+    start, columns = _header_row(rows, "Field Name")
+    if start is None:
+        return [], {}
+    fields, defaults = [], {}
+    for row in rows[start + 1:]:
+        field = row[columns["Field Name"]] if columns["Field Name"] < len(row) else ""
+        if not field or field in fields:
+            continue
+        fields.append(field)
+        default_col = columns.get("Default Value")
+        if default_col is not None and default_col < len(row) and row[default_col]:
+            defaults[field] = row[default_col]
+    return fields, defaults
+
+
+def read_alias_sheet(workbook):
+    """{template: [alias cells]} of the 'Agent File Input Headers' sheet (template names in a header row)."""
+    rows = _sheet_rows(workbook, "Agent File Input Headers")
+    for i, row in enumerate(rows):
+        names = [c for c in row if c]
+        if names and all(TEMPLATE_NAME_PATTERN.match(c) for c in names):
+            return {
+                name: [r[col] for r in rows[i + 1:] if col < len(r) and r[col]]
+                for col, name in enumerate(row) if name
+            }
+    return {}
+
+
+def read_file_names(workbook):
+    """{template: [file names or patterns]} of the 'Agent File Specification' sheet."""
+    rows = _sheet_rows(workbook, "Agent File Specification")
+    start, columns = _header_row(rows, "Agent", "File Name")
+    file_names = {}
+    if start is None:
+        return file_names
+    for row in rows[start + 1:]:
+        agent = row[columns["Agent"]] if columns["Agent"] < len(row) else ""
+        file_name = row[columns["File Name"]] if columns["File Name"] < len(row) else ""
+        if agent and file_name and file_name not in file_names.get(agent, []):
+            file_names.setdefault(agent, []).append(file_name)
+    return file_names
+
+
+def read_training_pairs(workbook):
+    """{template: [(input header, output header)]} from the {input},{output} cells of training sheets."""
+    pairs = {}
+    for sheet_name in workbook.sheetnames:
+        for row in _sheet_rows(workbook, sheet_name):
+            if not row or not TEMPLATE_NAME_PATTERN.match(row[0]):
+                continue
+            for cell in row[1:]:
+                for input_header, output_header in TRAINING_PAIR_PATTERN.findall(cell):
+                    if input_header and output_header:
+                        pairs.setdefault(row[0], []).append((input_header, output_header))
+    return pairs
+
+
+def read_alias_csv(csv_path, spec_fields=None):
+    """{template: [alias cells]} of the alias CSV, each cell naming its row's spec field."""
+    from alias_index import list_alias_templates, read_alias_cells
+
+    return {name: read_alias_cells(name, csv_path, spec_fields) for name in list_alias_templates(csv_path)}
+
+
+# -------------------------------
+# Build
+# -------------------------------
+def build_spec_artifact():
+    """Compile the spec source files into the artifact dict."""
+    import openpyxl
+
+    from alias_index import ALIAS_CSV_PATH, OUTPUT_FIELD_SPECIFICATION, build_alias_index, match_header
+    from mapping_cache import SPEC_WORKBOOK_PATH, TRAINING_DATA_DIR, get_spec_version, spec_source_paths
+
+    spec_workbook = openpyxl.load_workbook(SPEC_WORKBOOK_PATH, read_only=True, data_only=True)
+    try:
+        fields, field_defaults = read_output_fields(spec_workbook)
+        sheet_cells = read_alias_sheet(spec_workbook)
+        file_names = read_file_names(spec_workbook)
+    finally:
+        spec_workbook.close()
+    fields = fields or list(OUTPUT_FIELD_SPECIFICATION)
+
+    # Alias cells per template: the CSV first, then the workbook sheet
+    alias_cells = read_alias_csv(ALIAS_CSV_PATH, fields)
+    for name, cells in sheet_cells.items():
+        alias_cells.setdefault(name, []).extend(cells)
+
+    # Training pairs name old-style output headers ("Dealer #"); they become aliases of the
+    # spec field that header resolves to, first in the template's own index, else in any template's
+    training_pairs = {}
+    training_paths = [p for p in spec_source_paths() if p.startswith(TRAINING_DATA_DIR)]
+    for path in training_paths:
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            for name, pairs in read_training_pairs(workbook).items():
+                training_pairs.setdefault(name, []).extend(p for p in pairs if p not in training_pairs.get(name, []))
+        finally:
+            workbook.close()
+    global_index = build_alias_index([c for cells in alias_cells.values() for c in cells], fields)
+    skipped_pairs = 0
+    for name, pairs in training_pairs.items():
+        own_index = build_alias_index(alias_cells.get(name, []), fields)
+        for input_header, output_header in pairs:
+            field = match_header(output_header, own_index)[0] or match_header(output_header, global_index)[0]
+            if field:
+                alias_cells.setdefault(name, []).append(f"{input_header}, {field}")
+            else:
+                skipped_pairs += 1
+
+    templates = {}
+    for name in sorted(set(alias_cells) | set(file_names), key=lambda n: (len(n), n)):
+        templates[name] = {
+            "fields": fields,
+            "aliases": build_alias_index(alias_cells.get(name, []), fields),
+            "defaults": field_defaults,
+            "fileNames": file_names.get(name, []),
+        }
+
+    data = {"fields": fields, "templates": templates}
+    artifact = {
+        "format": ARTIFACT_FORMAT,
+        "specVersion": get_spec_version(),
+        "contentHash": content_hash(data),
+        "sources": [os.path.relpath(p, BASE_DIR) for p in spec_source_paths() if os.path.exists(p)],
+    }
+    artifact.update(data)
+    logger.info(
+        f"[INFO] Built spec artifact {artifact['contentHash']} for {len(templates)} templates "
+        f"({skipped_pairs} training pairs without a spec field skipped)"
+    )
+    return artifact
+
+
+def write_spec_artifact(artifact, path=None):
+    path = path or SPEC_ARTIFACT_PATH
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, separators=(",", ":"), ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the compiled spec artifact")
+    parser.add_argument("--check", action="store_true", help="verify the artifact is up to date instead")
+    parser.add_argument("--output", default=SPEC_ARTIFACT_PATH)
+    args = parser.parse_args(argv)
+    logging.basicConfig(format="%(message)s")
+
+    artifact = build_spec_artifact()
+    if args.check:
+        current = load_spec_artifact(args.output)
+        if current is None or current["contentHash"] != artifact["contentHash"] \
+                or current["specVersion"] != artifact["specVersion"]:
+            print(f"{args.output} is out of date, rebuild with: python spec_artifact.py")
+            return 1
+        print(f"{args.output} is up to date ({artifact['contentHash']})")
+        return 0
+
+    path = write_spec_artifact(artifact, args.output)
+    print(f"Wrote {path}: {os.path.getsize(path)} bytes, content {artifact['contentHash']}, "
+          f"spec {artifact['specVersion']}, templates {', '.join(artifact['templates'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
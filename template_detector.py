@@ -0,0 +1,159 @@
+import logging
+import math
+import os
+import threading
+from collections import defaultdict
+
+from alias_index import header_key, list_alias_templates
+from mapping_cache import get_spec_version
+from spec_artifact import load_spec_artifact
+from template_specs import get_compiled_spec
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# "fallback": detect the template from the headers when no key/metadata route applies,
+# "verify": also reject routed files whose headers clearly belong to another template, "off"
+TEMPLATE_DETECTION = os.environ.get("TEMPLATE_DETECTION", "fallback").lower()
+# A guess is confident when its score reaches TEMPLATE_DETECT_MIN_SCORE, it leads the runner-up by
+# TEMPLATE_DETECT_MIN_MARGIN and at least TEMPLATE_DETECT_MIN_HEADERS headers are known aliases
+TEMPLATE_DETECT_MIN_SCORE = float(os.environ.get("TEMPLATE_DETECT_MIN_SCORE", 0.6))
+TEMPLATE_DETECT_MIN_MARGIN = float(os.environ.get("TEMPLATE_DETECT_MIN_MARGIN", 0.15))
+TEMPLATE_DETECT_MIN_HEADERS = int(os.environ.get("TEMPLATE_DETECT_MIN_HEADERS", 3))
+# Templates listed in a detection result
+TEMPLATE_RANKING_SIZE = 3
+
+# (spec version, TemplateDetector) of this container
+_detector = None
+_detector_lock = threading.Lock()
+
+
+class TemplateDetector:
+    """
+    Inverted index from normalized alias (alias_index.header_key) to the templates whose
+    column in the alias list holds it. A file's headers score each template by the weighted
+    share of its known headers that are aliases of that template; an alias found in fewer
+    templates weighs more (log(1 + templates / templates with the alias)), so the spec field
+    names every template shares barely count and template specific headers decide.
+    """
+
+    def __init__(self, alias_keys_by_template):
+        self.templates = list(alias_keys_by_template)
+        self._templates_by_key = defaultdict(set)
+        for template_name, keys in alias_keys_by_template.items():
+            for key in keys:
+                if key:
+                    self._templates_by_key[key].add(template_name)
+        count = len(self.templates)
+        self._weights = {key: math.log(1 + count / len(names)) for key, names in self._templates_by_key.items()}
+
+    def __len__(self):
+        return len(self._templates_by_key)
+
+    def rank(self, headers, templates=None):
+        """
+        ([(template, score)] best first, number of known headers). Scores are 0-1.
+        templates limits the ranking, and the headers counted as known, to those templates.
+        """
+        totals = defaultdict(float)
+        known_weight = 0.0
+        known = 0
+        for key in {header_key(h) for h in headers}:
+            names = self._templates_by_key.get(key)
+            if names and templates is not None:
+                names = names.intersection(templates)
+            if not names:
+                continue
+            weight = self._weights[key]
+            known += 1
+            known_weight += weight
+            for template_name in names:
+                totals[template_name] += weight
+        if not known:
+            return [], 0
+        ranking = sorted(
+            ((name, total / known_weight) for name, total in totals.items()),
+            key=lambda item: (-item[1], len(item[0]), item[0]),
+        )
+        return ranking, known
+
+    def detect(self, headers, min_score=None, min_margin=None, min_headers=None, templates=None):
+        """
+        Ranked template guess for a header list:
+        {"template", "score", "margin", "candidates", "knownHeaders", "headers", "ranking": [(template, score)]}.
+        "template" is None unless the best guess is confident (see TEMPLATE_DETECT_MIN_*);
+        "candidates" are the templates scoring within min_margin of the best, e.g. every
+        template whose alias list holds all the headers when one list contains another.
+        templates restricts the guess to those templates (see rank).
+        """
+        min_score = TEMPLATE_DETECT_MIN_SCORE if min_score is None else min_score
+        min_margin = TEMPLATE_DETECT_MIN_MARGIN if min_margin is None else min_margin
+        min_headers = TEMPLATE_DETECT_MIN_HEADERS if min_headers is None else min_headers
+
+        ranking, known = self.rank(headers, templates)
+        best_name, best_score = ranking[0] if ranking else (None, 0.0)
+        margin = best_score - (ranking[1][1] if len(ranking) > 1 else 0.0)
+        confident = best_name is not None and best_score >= min_score and margin >= min_margin \
+            and known >= min_headers
+        return {
+            "template": best_name if confident else None,
+            "score": round(best_score, 4),
+            "margin": round(margin, 4),
+            "candidates": [name for name, score in ranking if score >= best_score - min_margin],
+            "knownHeaders": known,
+            "headers": len(headers),
+            "ranking": [(name, round(score, 4)) for name, score in ranking[:TEMPLATE_RANKING_SIZE]],
+        }
+
+
+def build_template_detector():
+    """A detector over the alias indexes of every template of the spec artifact (or the alias CSV)."""
+    artifact = load_spec_artifact()
+    templates = list(artifact["templates"]) if artifact is not None else list_alias_templates()
+    return TemplateDetector({
+        name: get_compiled_spec(name).alias_index["normalized"].keys() for name in templates
+    })
+
+
+def get_template_detector():
+    """The template detector, cached across warm invocations and rebuilt when the spec version changes."""
+    global _detector
+    version = get_spec_version()
+    detector = _detector
+    if detector is not None and detector[0] == version:
+        return detector[1]
+
+    with _detector_lock:
+        if _detector is None or _detector[0] != version:
+            _detector = (version, build_template_detector())
+            logger.info(
+                f"[INFO] Built template detector for spec {version}: "
+                f"{len(_detector[1])} aliases over {len(_detector[1].templates)} templates"
+            )
+        return _detector[1]
+
+
+def templates_for_file_name(file_name):
+    """Templates whose 'Agent File Specification' file names (and FILENAME_RULES) accept file_name."""
+    return [
+        name for name in get_template_detector().templates
+        if get_compiled_spec(name).file_validator.match(file_name) is not None
+    ]
+
+
+def templates_without_file_names():
+    """Templates with no specification file names, whose file names only the agent can validate."""
+    return [name for name in get_template_detector().templates if not get_compiled_spec(name).file_names]
+
+
+def detect_template(headers, templates=None):
+    """
+    Ranked template guess for a file's headers (see TemplateDetector.detect), before any agent call.
+    templates restricts the guess, e.g. to the templates whose file names the file matches.
+    """
+    guess = get_template_detector().detect(headers, templates=templates)
+    logger.info(
+        f"[INFO] Template detection: {guess['template']} (score {guess['score']}, margin {guess['margin']}, "
+        f"{guess['knownHeaders']}/{guess['headers']} known headers, ranking {guess['ranking']})"
+    )
+    return guess
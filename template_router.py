@@ -0,0 +1,101 @@
+import fnmatch
+import json
+import logging
+import os
+import re
+
+from alias_index import list_alias_templates
+from spec_artifact import load_spec_artifact
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Template used when no route matches; empty rejects such files
+DEFAULT_TEMPLATE = os.environ.get("DEFAULT_TEMPLATE", "A10")
+# Ordered routing rules, first match wins, e.g.
+#   [{"prefix": "input/hyundai/", "template": "A1"}, {"pattern": "original*.csv", "template": "A8"}]
+# "prefix" matches the start of the object key, "pattern" the file name (glob, case-insensitive)
+TEMPLATE_ROUTES = json.loads(os.environ.get("TEMPLATE_ROUTES", "[]"))
+# S3 object metadata key naming the template (x-amz-meta-<key>), e.g. "template". Off by default:
+# the lookup costs a HEAD request for every key no prefix or pattern rule routes
+TEMPLATE_METADATA_KEY = os.environ.get("TEMPLATE_METADATA_KEY", "")
+
+_compiled_routes = None
+
+
+def _compile_routes(routes):
+    compiled = []
+    for route in routes:
+        template_name = route.get("template")
+        if not template_name or not (route.get("prefix") or route.get("pattern")):
+            raise ValueError(f"Template route needs a template and a prefix or pattern: {route}")
+        pattern = route.get("pattern")
+        compiled.append({
+            "template": template_name,
+            "prefix": route.get("prefix"),
+            "pattern": re.compile(fnmatch.translate(pattern), re.IGNORECASE) if pattern else None,
+        })
+    return compiled
+
+
+def _get_routes():
+    global _compiled_routes
+    if _compiled_routes is None:
+        _compiled_routes = _compile_routes(TEMPLATE_ROUTES)
+    return _compiled_routes
+
+
+def template_from_key(key, known_templates=None):
+    """
+    Route by object key: the first TEMPLATE_ROUTES rule whose prefix or file name pattern
+    matches, else a folder of the key named like a template (e.g. input/A8/file.csv).
+    Returns (template, source) or (None, None).
+    """
+    file_name = os.path.basename(key)
+    for route in _get_routes():
+        if route["prefix"] and not key.startswith(route["prefix"]):
+            continue
+        if route["pattern"] and not route["pattern"].match(file_name):
+            continue
+        return route["template"], "pattern" if route["pattern"] else "prefix"
+
+    if known_templates is None:
+        artifact = load_spec_artifact()
+        known_templates = artifact["templates"] if artifact is not None else list_alias_templates()
+    for folder in key.split("/")[:-1]:
+        if folder in known_templates:
+            return folder, "prefix"
+    return None, None
+
+
+def template_from_metadata(s3_client, bucket, key):
+    """Template named in the object's TEMPLATE_METADATA_KEY metadata, or None (one HEAD request)."""
+    if not TEMPLATE_METADATA_KEY:
+        return None
+    try:
+        metadata = s3_client.head_object(Bucket=bucket, Key=key).get("Metadata", {})
+    except Exception as e:
+        logger.error(f"[ERROR] Reading metadata of {key} failed: {e}")
+        return None
+    return (metadata.get(TEMPLATE_METADATA_KEY) or "").strip() or None
+
+
+def route_template(s3_client, bucket, key, use_default=True):
+    """
+    Pick the template of an input object: key prefix or file name rules first (free), then the
+    object metadata (if TEMPLATE_METADATA_KEY is set), then the default template (unless use_default is False, for callers that
+    detect the template from the file's headers first). Returns (template, source), where source
+    is "prefix", "pattern", "metadata" or "default"; template is None if nothing applies.
+    """
+    template_name, source = template_from_key(key)
+    if template_name is None:
+        template_name = template_from_metadata(s3_client, bucket, key)
+        source = "metadata" if template_name else None
+    if template_name is None and not use_default:
+        logger.info(f"[INFO] No template route for {key}")
+        return None, None
+    if template_name is None:
+        template_name = DEFAULT_TEMPLATE or None
+        source = "default" if template_name else None
+    logger.info(f"[INFO] Template for {key}: {template_name} ({source})")
+    return template_name, source
@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import threading
+
+from alias_index import OUTPUT_FIELD_SPECIFICATION, build_alias_index, read_alias_cells
+from filename_validator import FILENAME_RULES, FileNameValidator
+from fuzzy_matcher import FuzzyHeaderMatcher
+from mapping_cache import get_spec_version
+from spec_artifact import SPEC_ARTIFACT_PATH, load_spec_artifact
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Defaults for standardized columns that are empty or missing in the input
+OUTPUT_COLUMN_DEFAULTS = {
+    "customerCountryCode": "USA",
+    "currencyCode": "USD",
+}
+# Per-template default overrides, e.g. {"A1": {"dealerCode": "HMA01", "dealerName": "HMA"}}
+TEMPLATE_DEFAULTS = json.loads(os.environ.get("TEMPLATE_DEFAULTS", "{}"))
+# A spec artifact built from other spec sources than the deployed ones: "fail" stops the cold start,
+# "fallback" compiles the templates from the alias CSV (without their specification file names)
+SPEC_ARTIFACT_STALE = os.environ.get("SPEC_ARTIFACT_STALE", "fail").lower()
+
+# Compiled specs of the templates this container has served: template -> CompiledSpec
+_compiled_specs = {}
+_compiled_specs_lock = threading.Lock()
+
+
+class SpecArtifactStale(RuntimeError):
+    pass
+
+
+class CompiledSpec:
+    """
+    Everything the pipeline needs to know about one template, built once per spec version:
+    the ordered output fields, the alias index of the template column (and the fuzzy
+    matcher over it), the column defaults and the file names of the template (and their
+    FILENAME_RULES additions, compiled into the file name validator). content_hash is that of
+    the spec artifact it came from (None when compiled from the alias CSV).
+    """
+
+    def __init__(self, template_name, version, spec_fields, alias_index, defaults, file_names=(), content_hash=None):
+        self.template_name = template_name
+        self.version = version
+        self.spec_fields = tuple(spec_fields)
+        self.alias_index = alias_index
+        self.matcher = FuzzyHeaderMatcher(alias_index)
+        self.defaults = dict(defaults)
+        self.file_names = tuple(file_names)
+        self.file_validator = FileNameValidator(self.file_names + tuple(FILENAME_RULES.get(template_name, [])))
+        self.content_hash = content_hash
+
+    def __repr__(self):
+        return (
+            f"CompiledSpec({self.template_name!r}, version={self.version!r}, artifact={self.content_hash!r}, "
+            f"{len(self.spec_fields)} fields, {len(self.alias_index['exact'])} aliases)"
+        )
+
+
+def _template_defaults(template_name, spec_defaults=None):
+    defaults = dict(OUTPUT_COLUMN_DEFAULTS)
+    defaults.update(spec_defaults or {})
+    defaults.update(TEMPLATE_DEFAULTS.get(template_name, {}))
+    return defaults
+
+
+def compile_spec(template_name, version=None):
+    """
+    The compiled spec of a template: taken from the spec artifact when it was built from the
+    current spec version, else built from the alias CSV and the output field specification.
+    """
+    version = version or get_spec_version()
+    artifact = load_spec_artifact()
+    if artifact is not None and artifact["specVersion"] == version and template_name in artifact["templates"]:
+        entry = artifact["templates"][template_name]
+        return CompiledSpec(
+            template_name, version, entry["fields"], entry["aliases"],
+            _template_defaults(template_name, entry["defaults"]), entry["fileNames"], artifact["contentHash"]
+        )
+    if artifact is not None and artifact["specVersion"] != version:
+        logger.info(
+            f"[INFO] Spec artifact {SPEC_ARTIFACT_PATH} was built from spec {artifact['specVersion']}, "
+            f"current spec is {version}; compiling {template_name} from the alias CSV"
+        )
+
+    alias_index = build_alias_index(read_alias_cells(template_name), OUTPUT_FIELD_SPECIFICATION)
+    return CompiledSpec(
+        template_name, version, OUTPUT_FIELD_SPECIFICATION, alias_index, _template_defaults(template_name)
+    )
+
+
+def check_spec_artifact():
+    """
+    Cold start check that the spec artifact was built from the current spec sources. A stale one
+    raises SpecArtifactStale (SPEC_ARTIFACT_STALE=fail) or is logged and bypassed ("fallback").
+    """
+    artifact = load_spec_artifact()
+    if artifact is None:
+        return
+    version = get_spec_version()
+    if artifact["specVersion"] == version:
+        return
+    message = (
+        f"Spec artifact {SPEC_ARTIFACT_PATH} was built from spec {artifact['specVersion']}, current spec is "
+        f"{version}; rebuild it with: python spec_artifact.py"
+    )
+    if SPEC_ARTIFACT_STALE == "fail":
+        raise SpecArtifactStale(message)
+    logger.error(f"[ERROR] {message}")
+
+
+def get_compiled_spec(template_name):
+    """
+    The compiled spec of a template, cached across warm invocations and rebuilt when the
+    spec version (content hash of the spec source files) changes.
+    """
+    version = get_spec_version()
+    spec = _compiled_specs.get(template_name)
+    if spec is not None and spec.version == version:
+        return spec
+
+    with _compiled_specs_lock:
+        spec = _compiled_specs.get(template_name)
+        if spec is None or spec.version != version:
+            spec = compile_spec(template_name, version)
+            _compiled_specs[template_name] = spec
+            logger.info(f"[INFO] Compiled spec for template {template_name}: {spec!r}")
+    return spec
+
+
+def clear_compiled_specs():
+    """Drop every compiled spec; the next lookups compile them again."""
+    with _compiled_specs_lock:
+        _compiled_specs.clear()